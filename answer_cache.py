@@ -0,0 +1,276 @@
+"""
+Semantic cache for /api/search answers.
+
+A query whose embedding is within a cosine-similarity threshold of a cached
+query, with the same search options, gets the cached answer and results back
+without another vector search or chat completion. Entries expire after a TTL,
+the least recently used one is evicted when the cache is full, and everything
+is dropped when the index changes: either the indexer on this host bumps the
+index generation file, or a background check sees a new live index version or
+document count, as after a rebuild or an ingest run on another host.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import ANSWER_CACHE_DISABLED
+
+logger = logging.getLogger(__name__)
+
+
+def bump_index_generation(path):
+    """
+    Marks the index as changed so servers drop their cached answers.
+
+    Args:
+        path (str): The generation file shared with the servers.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+def read_index_generation(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def cache_scope(options):
+    """
+    Returns the key a query's options must match for a cached answer to apply.
+    """
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+class AnswerCache:
+    """
+    A bounded, in-memory cache of answers keyed by query embedding.
+
+    Vectors are kept normalized in one preallocated matrix, so a lookup is a
+    single matrix-vector product over the live entries. A query embedding of a
+    different dimension disables the cache instead of failing the request.
+
+    Args:
+        dim (int): Dimension of the query embeddings, or None to take it from
+            the first vector stored.
+        threshold (float): Minimum cosine similarity for a hit.
+        ttl_s (float): Seconds an entry stays valid.
+        max_entries (int): Entries kept before the least recently used is evicted.
+        generation_path (str): File the indexer rewrites after changing the index.
+        index_version (callable): Returns a value that changes with the index,
+            polled every `version_check_s` seconds on a background thread.
+        version_check_s (float): Seconds between `index_version` polls.
+    """
+
+    def __init__(self, dim=None, threshold=0.95, ttl_s=3600.0, max_entries=1000, generation_path=None,
+                 index_version=None, version_check_s=30.0):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.generation_path = generation_path
+
+        self._lock = threading.Lock()
+        self.dim = dim
+        self.disabled = False
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32) if dim else None
+        self._live = np.zeros(max_entries, dtype=bool)
+        self._entries = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._generation = read_index_generation(generation_path) if generation_path else None
+        self._generation_mtime = self._mtime()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0,
+                         "invalidations": 0, "latency_saved_s": 0.0}
+        ANSWER_CACHE_DISABLED.set(0)
+
+        self.index_version = index_version
+        self.version_check_s = version_check_s
+        self._index_version = None
+        if index_version is not None:
+            # Polled off the request path, so neither startup nor queries wait on it.
+            threading.Thread(target=self._watch_index_version, name="answer-cache-version", daemon=True).start()
+
+    @classmethod
+    def from_config(cls, config, backend=None):
+        """
+        Builds the cache from configuration, or returns None when disabled.
+
+        Args:
+            config (dict): The application configuration.
+            backend (RetrievalBackend): When given, its live version and
+                document count are polled to notice index changes made
+                elsewhere.
+        """
+        if config.get("ANSWER_CACHE_MAX_ENTRIES", 0) <= 0:
+            return None
+        # The dimension comes from the first query: ada-002 ignores EMBED_DIM and
+        # other providers may return vectors of their own size.
+        return cls(
+            threshold=config.get("ANSWER_CACHE_THRESHOLD", 0.95),
+            ttl_s=config.get("ANSWER_CACHE_TTL_S", 3600.0),
+            max_entries=config["ANSWER_CACHE_MAX_ENTRIES"],
+            generation_path=config.get("INDEX_GENERATION_PATH"),
+            index_version=(lambda: (backend.live_version(), backend.count())) if backend else None,
+            version_check_s=config.get("ANSWER_CACHE_VERSION_CHECK_S", 30.0),
+        )
+
+    def _poll_index_version(self):
+        try:
+            return self.index_version()
+        except Exception as e:
+            logger.warning("Could not check the index version for the answer cache: %s", e)
+            return None
+
+    def _watch_index_version(self):
+        while True:
+            version = self._poll_index_version()
+            if version is not None:
+                with self._lock:
+                    if version != self._index_version:
+                        # The first version read is the baseline; later changes clear the cache.
+                        if self._index_version is not None:
+                            self._clear()
+                            self.counters["invalidations"] += 1
+                        self._index_version = version
+            time.sleep(self.version_check_s)
+
+    def _mtime(self):
+        try:
+            return os.stat(self.generation_path).st_mtime_ns if self.generation_path else None
+        except FileNotFoundError:
+            return None
+
+    def _check_generation(self):
+        """
+        Clears the cache if the indexer has bumped the generation. Caller holds the lock.
+        """
+        mtime = self._mtime()
+        if mtime == self._generation_mtime:
+            return
+        self._generation_mtime = mtime
+        generation = read_index_generation(self.generation_path)
+        if generation != self._generation:
+            self._generation = generation
+            self._clear()
+            self.counters["invalidations"] += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._live[:] = False
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _drop(self, slot):
+        del self._entries[slot]
+        self._live[slot] = False
+        self._free.append(slot)
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _accepts(self, query):
+        """
+        Checks a query's dimension against the matrix, disabling the cache on a
+        mismatch. Caller holds the lock.
+        """
+        if self.disabled:
+            return False
+        if query.ndim == 1 and (self.dim is None or query.shape[0] == self.dim):
+            return True
+        self.disabled = True
+        self._clear()
+        ANSWER_CACHE_DISABLED.set(1)
+        logger.warning("Disabling answer cache: got a query embedding of shape %s, cache expects (%s,).",
+                       query.shape, self.dim)
+        return False
+
+    def lookup(self, vector, scope):
+        """
+        Finds the most similar cached query with the same scope.
+
+        Args:
+            vector (list): The query embedding.
+            scope (str): The query options from `cache_scope()`.
+
+        Returns:
+            dict or None: The cached response, or None on a miss.
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            if not self._accepts(query):
+                self.counters["misses"] += 1
+                return None
+            self._check_generation()
+            if self._entries:
+                similarities = self._vectors @ query
+                similarities[~self._live] = -1.0
+                # Only the few entries above the threshold are ranked.
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                for slot in candidates[np.argsort(-similarities[candidates], kind="stable")]:
+                    slot = int(slot)
+                    entry = self._entries[slot]
+                    if entry["scope"] != scope:
+                        continue
+                    if time.monotonic() - entry["stored_at"] > self.ttl_s:
+                        self._drop(slot)
+                        self.counters["expirations"] += 1
+                        continue
+                    self._entries.move_to_end(slot)
+                    self.counters["hits"] += 1
+                    self.counters["latency_saved_s"] += entry["latency_s"]
+                    return entry["response"]
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, vector, scope, response, latency_s=0.0):
+        """
+        Caches a response for a query.
+
+        Args:
+            vector (list): The query embedding.
+            scope (str): The query options from `cache_scope()`.
+            response (dict): The response body to replay on a hit.
+            latency_s (float): How long producing the response took.
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            if not self._accepts(query):
+                return
+            if self._vectors is None:
+                self.dim = query.shape[0]
+                self._vectors = np.zeros((self.max_entries, self.dim), dtype=np.float32)
+            self._check_generation()
+            if not self._free:
+                self._drop(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+            slot = self._free.pop()
+            self._vectors[slot] = query
+            self._live[slot] = True
+            self._entries[slot] = {"scope": scope, "response": response,
+                                   "stored_at": time.monotonic(), "latency_s": latency_s}
+            self.counters["stores"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "disabled": self.disabled,
+            })
+            return stats
@@ -0,0 +1,444 @@
+"""
+Async (ASGI) variant of search_server.py built on Quart.
+
+Each worker serves many requests concurrently on one event loop. Calls to
+Azure AI Search and OpenAI go through shared keep-alive connection pools with
+per-upstream timeouts, and chat completions are capped by a semaphore so slow
+generations cannot starve embedding and search traffic.
+
+Run with an ASGI server, for example:
+
+    hypercorn async_search_server:app --bind 0.0.0.0:5000 --workers 2
+"""
+import time
+
+# Taken before the other imports so the startup time includes them.
+STARTED = time.perf_counter()
+
+import asyncio
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from quart import Quart, Response, g, jsonify, make_response, request, send_from_directory
+from quart_cors import cors
+
+from answer_cache import AnswerCache, cache_scope
+from embedding_batcher import EmbeddingMicroBatcher
+from embedding_cache import get_embedding_cache
+from embedding_pipeline import embedding_request_options
+from embedding_providers import get_embedding_client
+from metrics import CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, StartupClock, stage_timer
+from retrieval import get_retrieval_backend
+from text_preprocessor import TextPreprocessor
+from infra.utils.azure_util import load_config
+from search_core import (
+    FALLBACK_ANSWER,
+    SECRET_CONFIG_KEYS,
+    SSE_HEADERS,
+    SearchRequestError,
+    build_context,
+    build_search_payload,
+    chat_request,
+    is_exact_lookup,
+    load_prompt_template,
+    parse_search_options,
+    search_headers,
+    search_url,
+    sse_event
+)
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*")  # Enable CORS for all routes, as flask_cors does
+startup_clock = StartupClock("search", STARTED)
+startup_clock.mark("imports")
+
+load_dotenv()
+config_data = load_config()
+startup_clock.mark("config")
+embed_model = config_data["OPENAI_EMBED_MODEL"]
+embed_options = embedding_request_options(embed_model, config_data["EMBED_DIM"])
+embedding_cache = get_embedding_cache(config_data)
+# Azure AI Search is queried over the async client below; other backends search
+# in-process on a worker thread.
+retrieval_backend = get_retrieval_backend(config_data) if config_data["RETRIEVAL_BACKEND"] != "azure" else None
+# The cache polls the live index version from its own thread, so it gets a
+# synchronous backend even when queries use the async Azure client.
+answer_cache = AnswerCache.from_config(config_data, retrieval_backend or get_retrieval_backend(config_data))
+PROMPT_TEMPLATE = load_prompt_template()
+# Local embedding providers run in-process, on a worker thread per query.
+local_embedding_client = (get_embedding_client(config_data)
+                          if config_data["EMBED_PROVIDER"] != "openai" else None)
+# Concurrent query embeddings share batched upstream calls. The batcher sends
+# them from its own threads, so it has a process-wide synchronous client rather
+# than the per-loop async one.
+embed_batcher = None
+if config_data["EMBED_COALESCE_WINDOW_MS"] > 0:
+    batch_openai_client = local_embedding_client or openai.OpenAI(
+        api_key=config_data["OPENAI_KEY"],
+        timeout=config_data["OPENAI_TIMEOUT_S"],
+        http_client=openai.DefaultHttpxClient(limits=httpx.Limits(
+            max_connections=config_data["EMBED_COALESCE_CONCURRENCY"],
+            max_keepalive_connections=config_data["EMBED_COALESCE_CONCURRENCY"]
+        ))
+    )
+
+    def _embed_texts(texts):
+        """
+        Embeds a batch of coalesced queries with one upstream call.
+        """
+        response = batch_openai_client.embeddings.create(input=texts, model=embed_model, **embed_options)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    embed_batcher = EmbeddingMicroBatcher.from_config(config_data, _embed_texts)
+startup_clock.mark("clients")
+if config_data["HYBRID_SEARCH"] and config_data["RETRIEVAL_BACKEND"] == "local":
+    # The local BM25 index drops stopwords from queries. Load them now, so a
+    # missing NLTK corpus fails the start instead of the first query.
+    TextPreprocessor.stopword_set()
+    startup_clock.mark("nltk")
+print(startup_clock.finish())
+
+# Created per event loop in startup(), shared by all requests on that loop.
+search_client = None
+openai_client = None
+completion_slots = None
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=config_data["UPSTREAM_MAX_CONNECTIONS"],
+        max_keepalive_connections=config_data["UPSTREAM_MAX_CONNECTIONS"]
+    )
+
+
+@app.before_serving
+async def startup():
+    global search_client, openai_client, completion_slots
+    search_client = httpx.AsyncClient(
+        headers=search_headers(config_data),
+        limits=_limits(),
+        timeout=httpx.Timeout(config_data["SEARCH_TIMEOUT_S"])
+    )
+    openai_client = openai.AsyncOpenAI(
+        api_key=config_data["OPENAI_KEY"],
+        timeout=config_data["OPENAI_TIMEOUT_S"],
+        http_client=openai.DefaultAsyncHttpxClient(limits=_limits())
+    )
+    completion_slots = asyncio.Semaphore(config_data["COMPLETION_CONCURRENCY"])
+
+
+@app.after_serving
+async def shutdown():
+    await search_client.aclose()
+    await openai_client.close()
+
+
+@app.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+    g.timer = stage_timer("search", config_data["METRICS_ENABLED"])
+
+
+@app.after_request
+async def record_timing(response):
+    if config_data["METRICS_ENABLED"] and "timer" in g:
+        total = time.perf_counter() - g.started
+        timing = g.timer.server_timing()
+        response.headers["Server-Timing"] = f"{timing + ', ' if timing else ''}total;dur={total * 1000:.1f}"
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(total, request.method, route, str(response.status_code))
+    return response
+
+
+@app.route('/config', methods=['GET'])
+async def get_config():
+    # Never echo credentials back to the client.
+    return jsonify({key: value for key, value in config_data.items() if key not in SECRET_CONFIG_KEYS})
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """
+    Serves request and stage latency histograms in the Prometheus text format.
+    """
+    if not config_data["METRICS_ENABLED"]:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+@app.route('/')
+async def serve_index():
+    return await send_from_directory('dist', 'index.html')
+
+
+@app.route('/<path:path>')
+async def serve_static(path):
+    return await send_from_directory('dist', path)
+
+
+async def _embed_query(text):
+    """
+    Embeds a query, serving repeated queries from the embedding cache.
+    """
+    key = embedding_cache.key(embed_model, text) if embedding_cache else None
+    embedding = embedding_cache.get(key) if key else None
+    if embedding is None:
+        started = time.perf_counter()
+        with g.timer.stage("embed"):
+            if embed_batcher:
+                embedding = await asyncio.wrap_future(embed_batcher.submit(text))
+            elif local_embedding_client:
+                response = await asyncio.to_thread(
+                    local_embedding_client.embeddings.create, input=text, model=embed_model, **embed_options)
+                embedding = response.data[0].embedding
+            else:
+                response = await openai_client.embeddings.create(input=text, model=embed_model, **embed_options)
+                embedding = response.data[0].embedding
+        if key:
+            embedding_cache.observe_upstream_latency(time.perf_counter() - started)
+            embedding_cache.put(key, embedding, text)
+    return embedding
+
+
+@app.route('/api/embed', methods=['POST'])
+async def embed_text():
+    """
+    Endpoint to generate an embedding for a given text with the configured provider.
+    """
+    data = await request.get_json()
+    text = data.get("text")
+
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+
+    try:
+        return jsonify({"embedding": await _embed_query(text)})
+    except Exception as e:
+        print(f"Error generating embedding: {e}")
+        return jsonify({"error": "Failed to generate embedding"}), 500
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+async def cache_stats():
+    """
+    Returns hit/miss counters for the server's caches and the embedding
+    batcher's coalescing counters.
+    """
+    return jsonify({
+        "embedding": embedding_cache.stats() if embedding_cache else None,
+        "answer": answer_cache.stats() if answer_cache else None,
+        "embed_batcher": embed_batcher.stats() if embed_batcher else None,
+    })
+
+
+async def _generate_answer(query, retrieved_chunks, structured_records):
+    """
+    Generates an answer, waiting at most COMPLETION_QUEUE_TIMEOUT_S for a free
+    completion slot before giving up with the fallback answer.
+    """
+    try:
+        await asyncio.wait_for(completion_slots.acquire(), config_data["COMPLETION_QUEUE_TIMEOUT_S"])
+    except asyncio.TimeoutError:
+        print("All completion slots busy; returning the fallback answer.")
+        return FALLBACK_ANSWER
+
+    try:
+        response = await openai_client.chat.completions.create(
+            **chat_request(PROMPT_TEMPLATE, query, retrieved_chunks, structured_records)
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        print(f"Error generating answer from OpenAI: {e}")
+        return FALLBACK_ANSWER
+    finally:
+        completion_slots.release()
+
+
+async def _stream_answer(query, retrieved_chunks, structured_records):
+    """
+    Yields the answer text as the model generates it, holding a completion
+    slot for the length of the stream.
+    """
+    try:
+        await asyncio.wait_for(completion_slots.acquire(), config_data["COMPLETION_QUEUE_TIMEOUT_S"])
+    except asyncio.TimeoutError:
+        print("All completion slots busy; returning the fallback answer.")
+        yield FALLBACK_ANSWER
+        return
+
+    try:
+        stream = await openai_client.chat.completions.create(
+            stream=True,
+            **chat_request(PROMPT_TEMPLATE, query, retrieved_chunks, structured_records)
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        completion_slots.release()
+
+
+async def _search(vector, options, text=None, payload=None):
+    """
+    Queries the retrieval backend, or sends `payload` as a raw Azure request.
+    """
+    if retrieval_backend:
+        with g.timer.stage("search"):
+            return await asyncio.to_thread(retrieval_backend.search, vector, text=text, **options)
+    if payload is None:
+        payload = build_search_payload(vector, text=text, **options)
+    try:
+        with g.timer.stage("search"):
+            response = await search_client.post(search_url(config_data), json=payload)
+    except httpx.TimeoutException:
+        raise SearchRequestError("Search request timed out.", 504)
+    if response.is_error:
+        raise SearchRequestError(response.text, response.status_code)
+    return response.json().get("value", [])
+
+
+async def _retrieve(data):
+    """
+    Validates a search request and runs the search, unless the answer cache
+    already holds a response for the query.
+
+    Accepts the query text and options, embedding it server-side, or a raw
+    "searchPayload" as in search_server.py.
+
+    Returns:
+        dict: "query", "cached" (a cached response body or None), "results"
+              and "cache_entry" (what `_cache_answer` needs to store the answer).
+
+    Raises:
+        SearchRequestError: If the request is invalid or the search fails.
+    """
+    search_payload = data.get('searchPayload')
+    query = data.get('query')
+
+    if not query:
+        raise SearchRequestError("No query provided.")
+
+    if search_payload:
+        if retrieval_backend:
+            raise SearchRequestError("searchPayload requires the azure retrieval backend.")
+        results = await _search(None, None, payload=search_payload)
+        return {"query": query, "cached": None, "results": results, "cache_entry": None}
+
+    try:
+        options = parse_search_options(data)
+    except ValueError as e:
+        raise SearchRequestError(str(e))
+
+    text = query if config_data["HYBRID_SEARCH"] else None
+    if text and is_exact_lookup(TextPreprocessor.search_tokens(query, drop_stopwords=False)):
+        # Identifier lookups resolve lexically, without embedding the query.
+        results = await _search(None, options, text)
+        if results:
+            return {"query": query, "cached": None, "results": results, "cache_entry": None}
+
+    query_vector = await _embed_query(query)
+    cache_entry = None
+    if answer_cache:
+        scope = cache_scope(options)
+        with g.timer.stage("cache"):
+            cached = answer_cache.lookup(query_vector, scope)
+        if cached:
+            return {"query": query, "cached": cached}
+        cache_entry = (query_vector, scope, time.perf_counter())
+
+    results = await _search(query_vector, options, text)
+    return {"query": query, "cached": None, "results": results, "cache_entry": cache_entry}
+
+
+def _cache_answer(retrieval, body):
+    if retrieval["cache_entry"] and body["answer"] != FALLBACK_ANSWER:
+        query_vector, scope, started = retrieval["cache_entry"]
+        answer_cache.store(query_vector, scope, body, time.perf_counter() - started)
+
+
+@app.route('/api/search', methods=['POST'])
+async def search_documents():
+    """
+    Performs a vector search on the Azure AI Search index and answers the query.
+    """
+    try:
+        retrieval = await _retrieve(await request.get_json())
+        if retrieval["cached"]:
+            return jsonify(retrieval["cached"])
+
+        results = retrieval["results"]
+        with g.timer.stage("context"):
+            retrieved_chunks, structured_records, citations = build_context(results, config_data["CONTEXT_TOKEN_BUDGET"])
+
+        with g.timer.stage("chat"):
+            final_answer = await _generate_answer(retrieval["query"], retrieved_chunks, structured_records)
+
+        body = {"answer": final_answer, "results": results, "citations": citations}
+        _cache_answer(retrieval, body)
+        return jsonify(body)
+
+    except SearchRequestError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/search/stream', methods=['POST'])
+async def search_documents_stream():
+    """
+    Streaming variant of /api/search using Server-Sent Events; see
+    search_server.py for the event format.
+    """
+    try:
+        retrieval = await _retrieve(await request.get_json())
+    except SearchRequestError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Server-Timing is sent before generation; see search_server.py.
+    timer = g.timer
+
+    async def events():
+        cached = retrieval["cached"]
+        if cached:
+            yield sse_event("results", cached["results"])
+            yield sse_event("token", cached["answer"])
+            yield sse_event("done", {"answer": cached["answer"], "citations": cached.get("citations", [])})
+            return
+
+        results = retrieval["results"]
+        yield sse_event("results", results)
+        with timer.stage("context"):
+            retrieved_chunks, structured_records, citations = build_context(results, config_data["CONTEXT_TOKEN_BUDGET"])
+
+        answer = ""
+        failed = False
+        started = time.perf_counter()
+        try:
+            async for text in _stream_answer(retrieval["query"], retrieved_chunks, structured_records):
+                if not answer:
+                    timer.record("chat_first_token", time.perf_counter() - started)
+                answer += text
+                yield sse_event("token", text)
+            timer.record("chat", time.perf_counter() - started)
+        except Exception as e:
+            print(f"Error streaming answer from OpenAI: {e}")
+            failed = True
+            if not answer:
+                answer = FALLBACK_ANSWER
+                yield sse_event("token", answer)
+
+        if not failed:
+            _cache_answer(retrieval, {"answer": answer, "results": results, "citations": citations})
+        yield sse_event("done", {"answer": answer, "citations": citations})
+
+    response = await make_response(events(), 200, SSE_HEADERS)
+    # Generation can outlast Quart's default response timeout.
+    response.timeout = None
+    return response
+
+
+if __name__ == '__main__':
+    app.run(port=5000)
@@ -0,0 +1,64 @@
+"""
+Compares one-request-per-document embedding against the batched pipeline.
+
+Runs entirely offline against FakeOpenAIClient:
+
+    python -m benchmarks.bench_embeddings --docs 5000 --latency 0.05
+"""
+import argparse
+import time
+
+from benchmarks.fakes import FakeOpenAIClient
+from embedding_pipeline import BatchEmbedder
+
+
+def _synthetic_texts(count):
+    return [f"document {i} about tents, backpacks and travel reimbursement policy" for i in range(count)]
+
+
+def bench_sequential(client, texts, model_name):
+    start = time.perf_counter()
+    for text in texts:
+        client.embeddings.create(input=text, model=model_name)
+    return time.perf_counter() - start
+
+
+def bench_batched(client, texts, model_name, batch_size, concurrency):
+    embedder = BatchEmbedder(client, model_name, max_batch_size=batch_size, concurrency=concurrency)
+    start = time.perf_counter()
+    embedder.embed_many(texts)
+    return time.perf_counter() - start, embedder.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--sequential-docs", type=int, default=100,
+                        help="Documents for the sequential baseline, extrapolated to --docs.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request.")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rps-limit", type=float, default=None, help="Simulated requests/sec limit.")
+    args = parser.parse_args()
+
+    model_name = "text-embedding-3-small"
+    texts = _synthetic_texts(args.docs)
+
+    client = FakeOpenAIClient(dim=args.dim, latency_s=args.latency)
+    sample = texts[:args.sequential_docs]
+    seq_elapsed = bench_sequential(client, sample, model_name)
+    seq_rate = len(sample) / seq_elapsed
+
+    client = FakeOpenAIClient(dim=args.dim, latency_s=args.latency, max_requests_per_s=args.rps_limit)
+    batch_elapsed, stats = bench_batched(client, texts, model_name, args.batch_size, args.concurrency)
+    batch_rate = len(texts) / batch_elapsed
+
+    print(f"sequential: {seq_rate:,.1f} docs/sec ({len(sample)} docs in {seq_elapsed:.2f}s)")
+    print(f"batched:    {batch_rate:,.1f} docs/sec ({len(texts)} docs in {batch_elapsed:.2f}s, "
+          f"{stats['requests']} requests, {stats['retries']} retries, {stats['throttled']} throttled)")
+    print(f"speedup:    {batch_rate / seq_rate:,.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures TextPreprocessor throughput in docs/sec against the original implementation.
+
+Uses the sample CSV descriptions and PDF text in data/, repeated to the requested
+corpus size. Requires the NLTK punkt and stopwords data:
+
+    python -m benchmarks.bench_preprocessor --docs 2000 --workers 4
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from PyPDF2 import PdfReader
+
+from text_preprocessor import TextPreprocessor
+
+
+def legacy_preprocess(text):
+    """
+    The original implementation, which rebuilds the stopword list for every token.
+    """
+    text = text.lower()
+    tokens = word_tokenize(text)
+    tokens = [t for t in tokens if t.isalpha()]
+    tokens = [t for t in tokens if t not in stopwords.words("english")]
+    return " ".join(tokens)
+
+
+def sample_texts(data_dir="data"):
+    """
+    Returns the CSV descriptions and PDF pages shipped with the repo.
+    """
+    texts = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "csvs", "*.csv"))):
+        with open(path, newline="", encoding="utf-8") as f:
+            texts.extend(row["description"] for row in csv.DictReader(f) if row.get("description"))
+    for path in sorted(glob.glob(os.path.join(data_dir, "pdfs", "*.pdf"))):
+        texts.extend(page.extract_text() or "" for page in PdfReader(path).pages)
+    return texts
+
+
+def _rate(func, texts):
+    start = time.perf_counter()
+    func(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--legacy-docs", type=int, default=100,
+                        help="Documents for the slow original implementation.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    base = sample_texts()
+    texts = (base * (args.docs // len(base) + 1))[:args.docs]
+    TextPreprocessor.stopword_set()  # load outside the timed region
+
+    results = {
+        "legacy": _rate(lambda ts: [legacy_preprocess(t) for t in ts], texts[:args.legacy_docs]),
+        "nltk": _rate(lambda ts: TextPreprocessor.preprocess_many(ts), texts),
+        "fast": _rate(lambda ts: TextPreprocessor.preprocess_many(ts, fast=True), texts),
+        f"nltk x{args.workers} procs": _rate(
+            lambda ts: TextPreprocessor.preprocess_many(ts, workers=args.workers), texts),
+        f"fast x{args.workers} procs": _rate(
+            lambda ts: TextPreprocessor.preprocess_many(ts, fast=True, workers=args.workers), texts),
+    }
+    for name, rate in results.items():
+        print(f"{name:>18}: {rate:>10,.1f} docs/sec  ({rate / results['legacy']:,.1f}x legacy)")
+
+    # The fast tokenizer should agree with word_tokenize on our corpus.
+    nltk_out = TextPreprocessor.preprocess_many(base)
+    fast_out = TextPreprocessor.preprocess_many(base, fast=True)
+    same = sum(a == b for a, b in zip(nltk_out, fast_out))
+    print(f"fast/nltk agreement: {same}/{len(base)} documents identical")
+
+
+if __name__ == "__main__":
+    main()
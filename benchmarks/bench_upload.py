@@ -0,0 +1,39 @@
+"""
+Measures BulkUploader docs/sec against a local stand-in for the search service.
+
+    python -m benchmarks.bench_upload --docs 20000 --workers 4 --doc-failure-rate 0.01
+"""
+import argparse
+
+from benchmarks.fakes import FakeSearchService, fake_vector
+from search_uploader import BulkUploader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request.")
+    parser.add_argument("--doc-failure-rate", type=float, default=0.0)
+    parser.add_argument("--request-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    vector = fake_vector("benchmark", args.dim)
+    with FakeSearchService(latency_s=args.latency, doc_failure_rate=args.doc_failure_rate,
+                           request_failure_rate=args.request_failure_rate) as service:
+        uploader = BulkUploader(service.endpoint, "bench-index", "fake-key", "2023-10-01-Preview",
+                                workers=args.workers)
+        uploader.add_many(
+            {"id": str(i), "content": f"document {i}", "contentVector": vector, "source": "bench.csv"}
+            for i in range(args.docs)
+        )
+        stats = uploader.close()
+
+    print(f"uploaded {stats['succeeded']} docs in {stats['elapsed_s']:.2f}s: "
+          f"{stats['docs_per_sec']:,.1f} docs/sec, {stats['requests']} requests, "
+          f"{stats['retried_docs']} docs retried, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
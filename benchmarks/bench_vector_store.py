@@ -0,0 +1,92 @@
+"""
+Measures LocalVectorStore query latency, and the recall of IVF and of
+compressed (int8, binary) scans with rescoring against exact search, on a
+synthetic, clustered corpus.
+
+    python -m benchmarks.bench_vector_store --docs 100000 --dim 1536 --nprobe 8
+    python -m benchmarks.bench_vector_store --dim 512 --oversampling 8
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from vector_store import LocalVectorStore
+
+
+def clustered_vectors(rng, n, dim, clusters=256, noise=0.5):
+    """
+    Returns `n` vectors drawn around random centers, which resembles the
+    structure of real embeddings better than uniform noise.
+    """
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    return centers[rng.integers(0, clusters, n)] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--oversampling", type=float, default=4.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, args.docs, args.dim)
+    queries = vectors[rng.integers(0, args.docs, args.queries)] + 0.3 * rng.standard_normal(
+        (args.queries, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalVectorStore(directory, args.dim, mode="exact")
+        started = time.perf_counter()
+        for start in range(0, args.docs, 10000):
+            store.upsert([{"id": str(i), "contentVector": vectors[i]}
+                          for i in range(start, min(start + 10000, args.docs))])
+        print(f"loaded {args.docs} vectors in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        exact = store.search_many(queries, args.k)
+        exact_s = time.perf_counter() - started
+        started = time.perf_counter()
+        for query in queries:
+            store.search_many([query], args.k)
+        single_s = time.perf_counter() - started
+
+        ivf = LocalVectorStore(directory, args.dim, mode="ivf", nprobe=args.nprobe)
+        started = time.perf_counter()
+        ivf.build_ivf()
+        build_s = time.perf_counter() - started
+        started = time.perf_counter()
+        approximate = [ivf.search_many([query], args.k)[0] for query in queries]
+        ivf_s = time.perf_counter() - started
+
+        compressed = {}
+        for compression in ("int8", "binary"):
+            store = LocalVectorStore(directory, args.dim, mode="exact", compression=compression,
+                                     oversampling=args.oversampling)
+            store.sync_quantized()
+            started = time.perf_counter()
+            hits = store.search_many(queries, args.k)
+            compressed[compression] = (hits, time.perf_counter() - started,
+                                       store.stats()["scan_bytes_per_vector"])
+
+    print(f"exact batched: {exact_s / args.queries * 1000:.3f} ms/query, {args.dim * 4} bytes/vector")
+    print(f"exact single:  {single_s / args.queries * 1000:.3f} ms/query")
+    print(f"ivf (nprobe={args.nprobe}): {ivf_s / args.queries * 1000:.3f} ms/query, "
+          f"recall@{args.k} {_recall(approximate, exact, args.k):.3f}, built in {build_s:.2f}s")
+    for compression, (hits, elapsed_s, row_bytes) in compressed.items():
+        print(f"{compression} (oversampling={args.oversampling:g}): {elapsed_s / args.queries * 1000:.3f} ms/query, "
+              f"recall@{args.k} {_recall(hits, exact, args.k):.3f}, {row_bytes} bytes/vector scanned")
+
+
+def _recall(approximate, exact, k):
+    return np.mean([
+        len({row for row, _ in a} & {row for row, _ in e}) / k for a, e in zip(approximate, exact)
+    ])
+
+
+if __name__ == "__main__":
+    main()
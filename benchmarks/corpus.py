@@ -0,0 +1,96 @@
+"""
+Synthetic corpora grown from the sample files in data/, for benchmarks that
+need more documents than the repo ships.
+
+`synthetic_docs` generates chunks lazily, so a run can stream millions of them
+through the pipeline without holding them. `write_corpus` lays out a source
+tree for the loaders: copies of the sample PDFs plus a CSV of generated
+product rows.
+"""
+import csv
+import glob
+import os
+import random
+import re
+import shutil
+
+from PyPDF2 import PdfReader
+
+from index_manifest import chunk_id
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def sample_sentences(data_dir="data"):
+    """
+    Returns the sentences of the CSV descriptions and PDF text in `data_dir`.
+    """
+    texts = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "csvs", "*.csv"))):
+        with open(path, newline="", encoding="utf-8") as f:
+            texts.extend(row["description"] for row in csv.DictReader(f) if row.get("description"))
+    for path in sorted(glob.glob(os.path.join(data_dir, "pdfs", "*.pdf"))):
+        texts.extend(page.extract_text() or "" for page in PdfReader(path).pages)
+    return [s.strip() for text in texts for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def synthetic_docs(count, data_dir="data", seed=0, sentences=(3, 8)):
+    """
+    Yields `count` documents shaped like `doc_loaders.iter_source_docs` output,
+    each a random run of sample sentences with a row number mixed in so the
+    contents, and therefore embeddings, differ.
+
+    Args:
+        count (int): Number of documents.
+        data_dir (str): Where the sample files live.
+        seed (int): Seed for a reproducible corpus.
+        sentences (tuple): Minimum and maximum sentences per document.
+    """
+    pool = sample_sentences(data_dir)
+    rng = random.Random(seed)
+    for i in range(count):
+        picked = rng.sample(pool, min(len(pool), rng.randint(*sentences)))
+        text = " ".join(picked) + f" Reference SKU-{i:07d}."
+        source = f"synthetic/part-{i // 10000:04d}.pdf"
+        yield {
+            "id": chunk_id(source, i, text),
+            "content": text,
+            "metadata": {"source": os.path.basename(source), "doc_type": "policy",
+                         "page_start": i % 10000 // 5 + 1, "page_end": i % 10000 // 5 + 1},
+        }
+
+
+def write_corpus(directory, pdf_copies=1, csv_rows=1000, data_dir="data", seed=0):
+    """
+    Writes a source tree for the loaders under `directory`.
+
+    Args:
+        pdf_copies (int): Copies of each sample PDF.
+        csv_rows (int): Generated rows in csvs/synthetic.csv, with the columns
+                        of products.csv.
+
+    Returns:
+        tuple: (pdf_dir, csv_dir).
+    """
+    pdf_dir = os.path.join(directory, "pdfs")
+    csv_dir = os.path.join(directory, "csvs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    os.makedirs(csv_dir, exist_ok=True)
+    for path in sorted(glob.glob(os.path.join(data_dir, "pdfs", "*.pdf"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        for copy in range(pdf_copies):
+            shutil.copyfile(path, os.path.join(pdf_dir, f"{name}-{copy:05d}.pdf"))
+
+    with open(os.path.join(data_dir, "csvs", "products.csv"), newline="", encoding="utf-8") as f:
+        products = list(csv.DictReader(f))
+    rng = random.Random(seed)
+    with open(os.path.join(csv_dir, "synthetic.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(products[0]))
+        writer.writeheader()
+        for i in range(csv_rows):
+            row = dict(rng.choice(products))
+            row["id"] = i
+            row["name"] = f"{row['name']} {i}"
+            row["price"] = round(rng.uniform(5, 500), 2)
+            writer.writerow(row)
+    return pdf_dir, csv_dir
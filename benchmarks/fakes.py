@@ -0,0 +1,389 @@
+"""
+Local stand-ins for the OpenAI client and the Azure AI Search REST API, so the
+pipeline can be measured offline.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+
+def fake_vector(text, dim):
+    """
+    Returns a deterministic pseudo-random unit vector for a piece of text.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeRateLimitError(Exception):
+    """
+    Mimics openai.RateLimitError closely enough for the retry logic.
+    """
+
+    def __init__(self, retry_after_ms):
+        super().__init__("Rate limit exceeded")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after-ms": str(retry_after_ms)})
+
+
+class _RawResponse:
+    def __init__(self, parsed, headers):
+        self._parsed = parsed
+        self.headers = headers
+
+    def parse(self):
+        return self._parsed
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner):
+        self._owner = owner
+        self.with_raw_response = SimpleNamespace(create=self._create_raw)
+
+    def create(self, input, model, **kwargs):
+        return self._create_raw(input, model, **kwargs).parse()
+
+    def _create_raw(self, input, model, **kwargs):
+        owner = self._owner
+        texts = [input] if isinstance(input, str) else list(input)
+        owner._admit()
+        # Latency has a fixed round-trip part plus a small per-input part.
+        time.sleep(owner.latency_s + owner.per_input_latency_s * len(texts))
+        dim = kwargs.get("dimensions") or owner.dim
+        data = [
+            SimpleNamespace(index=i, embedding=fake_vector(text, dim), object="embedding")
+            for i, text in enumerate(texts)
+        ]
+        with owner._lock:
+            owner.calls += 1
+            owner.inputs += len(texts)
+        return _RawResponse(SimpleNamespace(data=data, model=model), {})
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model, messages, stream=False, **kwargs):
+        owner = self._owner
+        with owner._lock:
+            owner.chat_calls += 1
+        words = owner.answer.split(" ")
+        if not stream:
+            time.sleep(owner.chat_latency_s)
+            message = SimpleNamespace(role="assistant", content=owner.answer)
+            return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message)])
+        return self._stream(words)
+
+    def _stream(self, words):
+        # The first token arrives after a third of the latency, the rest evenly.
+        owner = self._owner
+        time.sleep(owner.chat_latency_s / 3)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(owner.chat_latency_s * 2 / 3 / len(words))
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)])
+
+
+class FakeOpenAIClient:
+    """
+    An offline replacement for `openai.OpenAI` covering the embeddings and chat
+    completions APIs.
+
+    Args:
+        dim (int): Dimension of the returned vectors.
+        latency_s (float): Simulated round-trip latency per embeddings request.
+        per_input_latency_s (float): Additional latency per input in a request.
+        max_requests_per_s (float): If set, requests above this rate get a 429.
+        chat_latency_s (float): Simulated time to generate a whole answer.
+        answer (str): The answer every chat completion returns.
+    """
+
+    def __init__(self, dim=1536, latency_s=0.05, per_input_latency_s=0.0002, max_requests_per_s=None,
+                 chat_latency_s=0.5, answer="This is a generated answer [source: products.csv, chunk 1]."):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.per_input_latency_s = per_input_latency_s
+        self.max_requests_per_s = max_requests_per_s
+        self.chat_latency_s = chat_latency_s
+        self.answer = answer
+        self.calls = 0
+        self.inputs = 0
+        self.throttled = 0
+        self.chat_calls = 0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def _admit(self):
+        if not self.max_requests_per_s:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            if self._window_count >= self.max_requests_per_s:
+                self.throttled += 1
+                retry_ms = int((1.0 - (now - self._window_start)) * 1000) + 1
+                raise FakeRateLimitError(retry_ms)
+            self._window_count += 1
+
+
+class FakeSearchService:
+    """
+    A local HTTP stand-in for the Azure AI Search document endpoints.
+
+    Supports `docs/index` (upload, mergeOrUpload, merge, delete), `docs/$count`
+    and a brute-force vector or naive text `docs/search`, listing and deleting
+    indexes, and index aliases, which document requests may address instead of
+    an index. Failures and latency can be injected to exercise retry paths.
+
+    Args:
+        latency_s (float): Delay added to every request.
+        doc_failure_rate (float): Fraction of documents rejected with a 503 in a
+                                  207 partial-success response.
+        request_failure_rate (float): Fraction of whole requests answered with a 503.
+
+    Use as a context manager; `endpoint` is the base URL to configure clients with.
+    """
+
+    def __init__(self, latency_s=0.0, doc_failure_rate=0.0, request_failure_rate=0.0, seed=0):
+        self.latency_s = latency_s
+        self.doc_failure_rate = doc_failure_rate
+        self.request_failure_rate = request_failure_rate
+        self.indexes = {}
+        self.aliases = {}
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_search_handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _fail(self, rate):
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def _resolve(self, name):
+        return self.aliases.get(name, name)
+
+    def index_documents(self, index_name, actions):
+        results = []
+        with self._lock:
+            docs = self.indexes.setdefault(self._resolve(index_name), {})
+        for action in actions:
+            key = action.get("id")
+            if self._fail(self.doc_failure_rate):
+                results.append({"key": key, "status": False, "statusCode": 503,
+                                "errorMessage": "Service unavailable (injected)."})
+                continue
+            kind = action.get("@search.action", "upload")
+            fields = {k: v for k, v in action.items() if k != "@search.action"}
+            with self._lock:
+                if kind == "delete":
+                    docs.pop(key, None)
+                elif kind in ("merge", "mergeOrUpload"):
+                    docs.setdefault(key, {}).update(fields)
+                else:
+                    docs[key] = fields
+            results.append({"key": key, "status": True, "statusCode": 200, "errorMessage": None})
+        return results
+
+    def search(self, index_name, payload):
+        with self._lock:
+            docs = list(self.indexes.get(self._resolve(index_name), {}).values())
+        select = [f.strip() for f in payload.get("select", "").split(",") if f.strip()]
+        for filter_field, filter_value in _parse_eq_filter(payload.get("filter")):
+            docs = [d for d in docs if d.get(filter_field) == filter_value]
+
+        vector_queries = payload.get("vectorQueries") or []
+        if vector_queries:
+            query = vector_queries[0]
+            k = query.get("k", 3)
+            target = query["vector"]
+            scored = []
+            for d in docs:
+                vector = d.get(query.get("fields", "contentVector"))
+                if vector:
+                    scored.append((sum(a * b for a, b in zip(target, vector)), d))
+            scored.sort(key=lambda pair: pair[0], reverse=True)
+            hits = [(score, d) for score, d in scored[:k]]
+        elif payload.get("search"):
+            # Crude full-text stand-in: count query words in the content.
+            words = payload["search"].lower().split()
+            scored = [(float(sum(w in (d.get("content") or "").lower() for w in words)), d) for d in docs]
+            scored = [(score, d) for score, d in scored if score > 0]
+            scored.sort(key=lambda pair: pair[0], reverse=True)
+            hits = scored[:payload.get("top", 50)]
+        else:
+            hits = [(1.0, d) for d in docs[:payload.get("top", 50)]]
+
+        value = []
+        for score, d in hits:
+            item = {k: v for k, v in d.items() if not select or k in select}
+            item["@search.score"] = score
+            value.append(item)
+        return {"value": value}
+
+
+def _parse_eq_filter(expression):
+    """
+    Parses the "field eq 'value' and ..." filters the app sends into
+    (field, value) pairs.
+    """
+    clauses = []
+    for clause in (expression or "").split(" and "):
+        parts = clause.split(" eq ", 1)
+        if len(parts) == 2:
+            value = parts[1].strip()[1:-1].replace("''", "'")
+            clauses.append((parts[0].strip(), value))
+    return clauses
+
+
+def _make_search_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _parts(self):
+            with service._lock:
+                service.requests += 1
+            if service.latency_s:
+                time.sleep(service.latency_s)
+            return urlparse(self.path).path.strip("/").split("/")
+
+        def _route(self, parts):
+            # /indexes/{name}/docs[/{operation}]
+            if len(parts) < 3 or parts[0] != "indexes" or parts[2] != "docs":
+                return None, None
+            return parts[1], parts[3] if len(parts) > 3 else ""
+
+        def do_GET(self):
+            parts = self._parts()
+            if parts == ["indexes"]:
+                with service._lock:
+                    names = sorted(service.indexes)
+                self._send(200, {"value": [{"name": name} for name in names]})
+                return
+            if len(parts) == 2 and parts[0] == "indexes":
+                with service._lock:
+                    exists = parts[1] in service.indexes
+                if exists:
+                    self._send(200, {"name": parts[1]})
+                else:
+                    self._send(404, {"error": {"message": "Index not found"}})
+                return
+            if len(parts) == 2 and parts[0] == "aliases":
+                with service._lock:
+                    target = service.aliases.get(parts[1])
+                if target is None:
+                    self._send(404, {"error": {"message": "Alias not found"}})
+                else:
+                    self._send(200, {"name": parts[1], "indexes": [target]})
+                return
+            index_name, operation = self._route(parts)
+            if operation == "$count":
+                with service._lock:
+                    count = len(service.indexes.get(service._resolve(index_name), {}))
+                data = str(count).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            self._send(404, {"error": {"message": "Not found"}})
+
+        def do_PUT(self):
+            parts = self._parts()
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            with service._lock:
+                if len(parts) == 2 and parts[0] == "indexes":
+                    created = parts[1] not in service.indexes
+                    service.indexes.setdefault(parts[1], {})
+                elif len(parts) == 2 and parts[0] == "aliases":
+                    if parts[1] in service.indexes or payload.get("indexes", [None])[0] not in service.indexes:
+                        self._send(400, {"error": {"message": "Alias name taken or index missing"}})
+                        return
+                    created = parts[1] not in service.aliases
+                    service.aliases[parts[1]] = payload["indexes"][0]
+                else:
+                    self._send(404, {"error": {"message": "Not found"}})
+                    return
+            self._send(201 if created else 200, payload)
+
+        def do_DELETE(self):
+            parts = self._parts()
+            with service._lock:
+                if len(parts) == 2 and parts[0] == "indexes" and parts[1] in service.indexes:
+                    del service.indexes[parts[1]]
+                elif len(parts) == 2 and parts[0] == "aliases" and parts[1] in service.aliases:
+                    del service.aliases[parts[1]]
+                else:
+                    self._send(404, {"error": {"message": "Not found"}})
+                    return
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            index_name, operation = self._route(self._parts())
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if service._fail(service.request_failure_rate):
+                self._send(503, {"error": {"message": "Service unavailable (injected)."}})
+            elif operation == "index":
+                results = service.index_documents(index_name, payload.get("value", []))
+                status = 200 if all(r["status"] for r in results) else 207
+                self._send(status, {"value": results})
+            elif operation == "search":
+                self._send(200, service.search(index_name, payload))
+            else:
+                self._send(404, {"error": {"message": "Not found"}})
+
+    return Handler
@@ -0,0 +1,352 @@
+"""
+Load-tests search_server.py by replaying recorded requests or synthetic queries
+against /api/search and /api/embed.
+
+Without `--url`, the Flask server is started in-process against the local fakes
+from benchmarks/fakes.py, with injectable OpenAI and search latencies, over a
+synthetic corpus, so no Azure or OpenAI access is needed. With `--url`, requests
+go to a running server.
+
+Two load models are supported:
+
+    closed loop  `--concurrency` clients each send their next request as soon
+                 as the previous one completes (the default)
+    open loop    requests arrive at `--rate` per second, Poisson or evenly
+                 spaced, whether or not earlier ones completed; up to
+                 `--concurrency` are in flight and latency is measured from
+                 the scheduled arrival, so queueing in a saturated server shows
+                 up instead of being hidden by a slowed-down client
+
+    python -m benchmarks.load_test --requests 2000 --concurrency 32
+    python -m benchmarks.load_test --rate 50 --duration 30 --chat-latency 0.8
+    python -m benchmarks.load_test --replay traffic.jsonl --url http://localhost:5000
+
+A replay file holds one JSON request per line, either
+{"path": "/api/search", "body": {...}} or a bare search body such as
+{"query": "...", "k": 3}; {"text": "..."} lines go to /api/embed. Lines in
+neither shape are skipped. Throughput, error rate and latency percentiles and
+histograms, overall and per endpoint, are written as JSON.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.corpus import sample_sentences, synthetic_docs
+from benchmarks.fakes import FakeOpenAIClient, FakeSearchService, fake_vector
+from embedding_providers import HashingEmbeddingClient
+from metrics import DEFAULT_BUCKETS
+
+EMBED_MODEL = "text-embedding-3-small"
+SEARCH_PATH = "/api/search"
+EMBED_PATH = "/api/embed"
+
+
+@contextlib.contextmanager
+def fake_search_server(docs, dim=256, backend="azure", embed_latency_s=0.02, chat_latency_s=0.2,
+                       search_latency_s=0.005, answer_cache=False, embedder="fake"):
+    """
+    Runs search_server.app on a local port against the fakes, with `docs`
+    indexed in the chosen retrieval backend.
+
+    Queries and documents are embedded by FakeOpenAIClient, or with
+    `embedder="hashing"` by the local hashing provider, so hits match the
+    query's words. The server reads its configuration when first imported, so
+    only the first call in a process applies `dim`, `backend`, `answer_cache`
+    and `embedder`.
+
+    Yields:
+        str: The server's base URL.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    with tempfile.TemporaryDirectory() as directory, FakeSearchService(latency_s=search_latency_s) as service:
+        config = {
+            "SEARCH_ENDPOINT": service.endpoint,
+            "SEARCH_API_KEY": "fake-key",
+            "SEARCH_API_VERSION": "2023-10-01-Preview",
+            "INDEX_NAME": "bench-index",
+            "EMBED_DIM": dim,
+            "RETRIEVAL_BACKEND": backend,
+            "LOCAL_STORE_DIR": os.path.join(directory, "vector_store"),
+            "LOCAL_STORE_MODE": "auto",
+        }
+        from retrieval import get_retrieval_backend
+        if embedder == "hashing":
+            hashing = HashingEmbeddingClient(dim)
+            vector = lambda text: hashing.create(text).data[0].embedding
+        else:
+            vector = lambda text: fake_vector(text, dim)
+        writer = get_retrieval_backend(config).writer()
+        writer.add_many({"id": doc["id"], "content": doc["content"],
+                         "contentVector": vector(doc["content"]),
+                         "source": doc["metadata"]["source"], "doc_type": doc["metadata"]["doc_type"],
+                         "metadata": json.dumps(doc["metadata"])} for doc in docs)
+        writer.close()
+
+        os.environ.update({
+            "AZURE_KEY_VAULT_URL": "",
+            "OPENAI_API_KEY": "fake-key",
+            "AZURE_SEARCH_ENDPOINT": service.endpoint,
+            "AZURE_SEARCH_INDEX": config["INDEX_NAME"],
+            "EMBED_DIM": str(dim),
+            "EMBED_MODEL": EMBED_MODEL if embedder == "fake" else "local-hashing-v1",
+            "EMBED_PROVIDER": "openai" if embedder == "fake" else embedder,
+            "EMBED_CACHE_DIR": "",
+            "ANSWER_CACHE_MAX_ENTRIES": "1000" if answer_cache else "0",
+            "RETRIEVAL_BACKEND": backend,
+            "LOCAL_STORE_DIR": config["LOCAL_STORE_DIR"],
+        })
+        import search_server
+        search_server.openai_client = FakeOpenAIClient(dim=dim, latency_s=embed_latency_s,
+                                                       chat_latency_s=chat_latency_s)
+        if embedder == "fake":
+            search_server.embedding_client = search_server.openai_client
+        server = make_server("127.0.0.1", 0, search_server.app, threaded=True, request_handler=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_port}"
+        finally:
+            server.shutdown()
+
+
+def load_replay(path):
+    """
+    Reads a replay file into (path, body) pairs; see the module docstring.
+    """
+    requests_, skipped = [], 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if isinstance(entry.get("body"), dict):
+                requests_.append((entry.get("path", SEARCH_PATH), entry["body"]))
+            elif isinstance(entry.get("query"), str):
+                requests_.append((SEARCH_PATH, entry))
+            elif isinstance(entry.get("text"), str):
+                requests_.append((EMBED_PATH, entry))
+            else:
+                skipped += 1
+    if skipped:
+        print(f"skipped {skipped} lines of {path} that are not search or embed requests", file=sys.stderr)
+    return requests_
+
+
+def synthetic_requests(count, embed_share=0.0, k=3, seed=0):
+    """
+    Returns `count` (path, body) pairs of queries built from the sample data,
+    `embed_share` of them embed requests.
+    """
+    rng = random.Random(seed)
+    sentences = sample_sentences()
+    requests_ = []
+    for _ in range(count):
+        words = rng.choice(sentences).split()
+        start = rng.randrange(max(len(words) - 8, 1))
+        text = " ".join(words[start:start + 8])
+        if rng.random() < embed_share:
+            requests_.append((EMBED_PATH, {"text": text}))
+        else:
+            requests_.append((SEARCH_PATH, {"query": text, "k": k}))
+    return requests_
+
+
+class _Client:
+    """
+    Sends requests over one keep-alive session per thread and records
+    (path, status, latency_s) outcomes; status is None for transport errors.
+    """
+
+    def __init__(self, base_url, timeout_s):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_s = timeout_s
+        self.outcomes = []
+        self._sessions = threading.local()
+        self._lock = threading.Lock()
+
+    def send(self, path, body, started=None):
+        import requests
+
+        if not hasattr(self._sessions, "session"):
+            self._sessions.session = requests.Session()
+        started = time.perf_counter() if started is None else started
+        try:
+            status = self._sessions.session.post(self.base_url + path, json=body, timeout=self.timeout_s).status_code
+        except requests.RequestException:
+            status = None
+        with self._lock:
+            self.outcomes.append((path, status, time.perf_counter() - started))
+
+
+def run_closed_loop(client, requests_, concurrency, total=None, duration_s=None):
+    """
+    Runs `concurrency` clients back to back until `total` requests are sent or
+    `duration_s` elapses, cycling through `requests_`.
+    """
+    source = itertools.cycle(requests_)
+    lock = threading.Lock()
+    sent = itertools.count()
+    deadline = time.perf_counter() + duration_s if duration_s else None
+
+    def worker():
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if total is not None and next(sent) >= total:
+                return
+            with lock:
+                path, body = next(source)
+            client.send(path, body)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(client, requests_, rate, concurrency, total=None, duration_s=None, poisson=True, seed=0):
+    """
+    Schedules requests at `rate` per second, independent of completions, until
+    `total` are sent or `duration_s` elapses. Each latency is measured from the
+    request's scheduled arrival.
+    """
+    rng = random.Random(seed)
+    source = itertools.cycle(requests_)
+    start = time.perf_counter()
+    arrival = start
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for sent in itertools.count():
+            if total is not None and sent >= total:
+                break
+            if duration_s and arrival - start >= duration_s:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            path, body = next(source)
+            pool.submit(client.send, path, body, arrival)
+            arrival += rng.expovariate(rate) if poisson else 1.0 / rate
+
+
+def summarize(outcomes, elapsed_s):
+    """
+    Returns throughput, error rate, latency percentiles and a latency
+    histogram (bucket upper bound in seconds -> count) for `outcomes`.
+    """
+    latencies = np.asarray([latency for _, status, latency in outcomes])
+    errors = sum(1 for _, status, _ in outcomes if status is None or status >= 400)
+    summary = {"requests": len(outcomes), "errors": errors,
+               "error_rate": errors / len(outcomes) if outcomes else 0.0,
+               "requests_per_sec": len(outcomes) / elapsed_s if elapsed_s else None}
+    if len(latencies):
+        p50, p90, p95, p99 = np.percentile(latencies * 1000, [50, 90, 95, 99])
+        summary.update({"p50_ms": float(p50), "p90_ms": float(p90), "p95_ms": float(p95),
+                        "p99_ms": float(p99), "max_ms": float(latencies.max() * 1000)})
+        counts = np.bincount(np.searchsorted(DEFAULT_BUCKETS, latencies), minlength=len(DEFAULT_BUCKETS) + 1)
+        summary["histogram"] = {str(bound): int(count)
+                                for bound, count in zip(DEFAULT_BUCKETS + ("+Inf",), counts) if count}
+    statuses = {}
+    for _, status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary["statuses"] = statuses
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; default starts one against the fakes.")
+    parser.add_argument("--replay", help="JSON-lines file of recorded requests; default is synthetic queries.")
+    parser.add_argument("--requests", type=int, help="Requests to send (default 1000 unless --duration is set).")
+    parser.add_argument("--duration", type=float, help="Seconds to run for.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients, or in-flight limit with --rate.")
+    parser.add_argument("--rate", type=float, help="Open-loop arrivals per second.")
+    parser.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--embed-share", type=float, default=0.0, help="Share of synthetic requests to /api/embed.")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=10, help="Requests sent before measuring.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a request counts as failed.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    fakes = parser.add_argument_group("in-process server")
+    fakes.add_argument("--docs", type=int, default=5000, help="Synthetic chunks indexed.")
+    fakes.add_argument("--backend", choices=("azure", "local"), default="azure")
+    fakes.add_argument("--dim", type=int, default=256)
+    fakes.add_argument("--embedder", choices=("fake", "hashing"), default="fake",
+                       help="Fake OpenAI embeddings with --embed-latency, or the local hashing provider.")
+    fakes.add_argument("--embed-latency", type=float, default=0.02, help="Simulated seconds per embeddings call.")
+    fakes.add_argument("--chat-latency", type=float, default=0.2, help="Simulated seconds per answer.")
+    fakes.add_argument("--search-latency", type=float, default=0.005, help="Simulated seconds per search call.")
+    fakes.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache enabled.")
+    args = parser.parse_args()
+
+    total = args.requests if args.requests is not None else (None if args.duration else 1000)
+    requests_ = load_replay(args.replay) if args.replay else synthetic_requests(
+        total or 1000, args.embed_share, args.k)
+    if not requests_:
+        parser.error("no requests to send")
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.url
+        if not base_url:
+            # Progress output from the pipeline would mix with the JSON on stdout.
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+            base_url = stack.enter_context(fake_search_server(
+                synthetic_docs(args.docs, seed=1), dim=args.dim, backend=args.backend,
+                embed_latency_s=args.embed_latency, chat_latency_s=args.chat_latency,
+                search_latency_s=args.search_latency, answer_cache=args.answer_cache, embedder=args.embedder))
+
+        client = _Client(base_url, args.timeout)
+        run_closed_loop(client, requests_, args.concurrency, total=args.warmup)
+        client.outcomes = []
+
+        started = time.perf_counter()
+        if args.rate:
+            run_open_loop(client, requests_, args.rate, args.concurrency, total, args.duration,
+                          poisson=args.arrivals == "poisson")
+        else:
+            run_closed_loop(client, requests_, args.concurrency, total, args.duration)
+        elapsed_s = time.perf_counter() - started
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process search_server with fakes",
+        "params": {k: v for k, v in vars(args).items() if k not in ("url", "output")},
+        "elapsed_s": elapsed_s,
+        "overall": summarize(client.outcomes, elapsed_s),
+        "endpoints": {path: summarize([o for o in client.outcomes if o[0] == path], elapsed_s)
+                      for path in sorted({o[0] for o in client.outcomes})},
+    }
+    overall = report["overall"]
+    print(f"{overall['requests']} requests in {elapsed_s:.1f}s: {overall['requests_per_sec']:,.1f}/s, "
+          f"{overall['error_rate']:.1%} errors, p50 {overall.get('p50_ms', 0):.0f} ms, "
+          f"p99 {overall.get('p99_ms', 0):.0f} ms", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
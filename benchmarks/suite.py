@@ -0,0 +1,264 @@
+"""
+Runs the offline benchmark suite and writes the results as JSON, so runs can
+be compared to catch regressions.
+
+Everything runs against the local fakes in benchmarks/fakes.py: no Key Vault,
+OpenAI or Azure AI Search access is needed. Preprocessing and ingest use the
+NLTK corpora, as the indexer does; install them once with
+`python -m text_preprocessor`. Corpora are grown from the sample
+files in data/, and `--scale` multiplies every size, up to millions of chunks
+for the streaming ingest benchmark:
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --scale 500 --only ingest --backend local
+
+Benchmarks:
+
+    preprocess  TextPreprocessor docs/sec, NLTK and fast tokenizers
+    loaders     load_pdfs files/sec and MB/sec, load_csvs_from_directory rows/sec
+    chunking    chunk_text MB/sec and chunks/sec
+    embedding   local hashing provider texts/sec, on one thread and on the pool
+    ingest      end-to-end ingest_docs docs/sec (embed, upload)
+    search      /api/search latency percentiles under concurrent clients
+    startup     cold start of the servers and the indexer, in fresh processes
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.corpus import sample_sentences, synthetic_docs, write_corpus
+from benchmarks.fakes import FakeOpenAIClient, FakeSearchService
+
+BENCHMARKS = ("preprocess", "loaders", "chunking", "embedding", "ingest", "search", "startup")
+STARTUP_MODULES = ("search_server", "async_search_server", "elt_indexer")
+EMBED_MODEL = "text-embedding-3-small"
+
+
+def _timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def bench_preprocess(args):
+    from text_preprocessor import TextPreprocessor
+
+    texts = [doc["content"] for doc in synthetic_docs(1000 * args.scale)]
+    TextPreprocessor.stopword_set()  # load outside the timed region
+    _, nltk_s = _timed(lambda: TextPreprocessor.preprocess_many(texts))
+    _, fast_s = _timed(lambda: TextPreprocessor.preprocess_many(texts, fast=True))
+    return {"docs": len(texts), "nltk_docs_per_sec": len(texts) / nltk_s,
+            "fast_docs_per_sec": len(texts) / fast_s}
+
+
+def bench_loaders(args):
+    from doc_loaders import load_csvs_from_directory, load_pdfs
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_dir, csv_dir = write_corpus(directory, pdf_copies=10 * args.scale, csv_rows=5000 * args.scale)
+        pdf_files = len(os.listdir(pdf_dir))
+        text, pdf_s = _timed(lambda: load_pdfs(pdf_dir, workers=args.workers))
+        docs, csv_s = _timed(lambda: load_csvs_from_directory(csv_dir, workers=args.workers))
+    return {"pdf_files": pdf_files, "pdf_files_per_sec": pdf_files / pdf_s,
+            "pdf_mb_per_sec": len(text) / 1e6 / pdf_s,
+            "csv_rows": len(docs), "csv_rows_per_sec": len(docs) / csv_s, "workers": args.workers}
+
+
+def bench_chunking(args):
+    from doc_loaders import chunk_text
+
+    sentences = sample_sentences()
+    rng = random.Random(0)
+    target_chars = 1_000_000 * args.scale
+    parts, size = [], 0
+    while size < target_chars:
+        paragraph = " ".join(rng.choice(sentences) for _ in range(rng.randint(3, 10)))
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    text = "\n\n".join(parts)
+    chunks, elapsed_s = _timed(lambda: chunk_text(text))
+    return {"mb": len(text) / 1e6, "chunks": len(chunks), "mb_per_sec": len(text) / 1e6 / elapsed_s,
+            "chunks_per_sec": len(chunks) / elapsed_s}
+
+
+def _bench_config(args, directory, endpoint=None):
+    """
+    Returns the configuration the indexer and servers use, pointed at the fakes.
+    """
+    return {
+        "SEARCH_ENDPOINT": endpoint,
+        "SEARCH_API_KEY": "fake-key",
+        "SEARCH_API_VERSION": "2023-10-01-Preview",
+        "INDEX_NAME": "bench-index",
+        "EMBED_DIM": args.dim,
+        "OPENAI_EMBED_MODEL": EMBED_MODEL if args.embedder == "fake" else "local-hashing-v1",
+        "EMBED_CACHE_DIR": "",
+        "RETRIEVAL_BACKEND": args.backend,
+        "LOCAL_STORE_DIR": os.path.join(directory, "vector_store"),
+        "LOCAL_STORE_MODE": "auto",
+        "PREPROCESS_FAST": True,
+        "INGEST_BATCH_SIZE": 1000,
+    }
+
+
+def bench_embedding(args):
+    from embedding_providers import HashingEmbeddingClient
+
+    texts = [doc["content"] for doc in synthetic_docs(2000 * args.scale)]
+    results = {"texts": len(texts), "dim": args.dim}
+    for label, workers in (("single_thread", 1), ("pool", os.cpu_count() or 1)):
+        client = HashingEmbeddingClient(args.dim, batch_size=64, workers=workers)
+        _, elapsed_s = _timed(lambda: client.embeddings.create(input=texts))
+        results[f"{label}_texts_per_sec"] = len(texts) / elapsed_s
+    return results
+
+
+def _embedding_client(args):
+    if args.embedder == "hashing":
+        from embedding_providers import HashingEmbeddingClient
+        return HashingEmbeddingClient(args.dim)
+    return FakeOpenAIClient(dim=args.dim, latency_s=args.embed_latency)
+
+
+def bench_ingest(args):
+    from elt_indexer import ingest_docs
+
+    docs = 2000 * args.scale
+    client = _embedding_client(args)
+    with tempfile.TemporaryDirectory() as directory, FakeSearchService(latency_s=args.search_latency) as service:
+        config = _bench_config(args, directory, service.endpoint)
+        config["openai_client"] = client
+        failed, elapsed_s = _timed(lambda: ingest_docs(config, synthetic_docs(docs)))
+    return {"docs": docs, "docs_per_sec": docs / elapsed_s, "failed": len(failed),
+            "embedding_requests": client.stats["requests"] if args.embedder == "hashing" else client.calls,
+            "backend": args.backend, "embedder": args.embedder}
+
+
+def _percentiles(latencies):
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def bench_search(args):
+    import requests
+
+    from benchmarks.load_test import fake_search_server
+
+    docs = list(synthetic_docs(500 * args.scale, seed=1))
+    queries = [" ".join(doc["content"].split()[:8]) for doc in docs[:args.requests]]
+    queries = (queries * (args.requests // max(len(queries), 1) + 1))[:args.requests]
+
+    with fake_search_server(docs, dim=args.dim, backend=args.backend, embed_latency_s=args.embed_latency,
+                            chat_latency_s=args.chat_latency, search_latency_s=args.search_latency,
+                            embedder=args.embedder) as base_url:
+        url = f"{base_url}/api/search"
+        sessions = threading.local()
+
+        def query(text):
+            if not hasattr(sessions, "session"):
+                sessions.session = requests.Session()
+            started = time.perf_counter()
+            response = sessions.session.post(url, json={"query": text, "k": 3}, timeout=60)
+            return time.perf_counter() - started, response.status_code
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes, elapsed_s = _timed(lambda: list(pool.map(query, queries)))
+
+    latencies = [latency for latency, status in outcomes if status == 200]
+    return {"requests": len(queries), "concurrency": args.concurrency, "indexed_docs": len(docs),
+            "errors": len(outcomes) - len(latencies), "requests_per_sec": len(queries) / elapsed_s,
+            "backend": args.backend, "embedder": args.embedder, **(_percentiles(latencies) if latencies else {})}
+
+
+def bench_startup(args):
+    """
+    Times `import <module>` for the servers and the indexer in fresh Python
+    processes: the imports plus the module-level setup a new worker does
+    before it can serve.
+    """
+    code = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, "AZURE_KEY_VAULT_URL": "", "OPENAI_API_KEY": "fake-key", "EMBED_CACHE_DIR": "",
+               "RETRIEVAL_BACKEND": "local", "LOCAL_STORE_DIR": os.path.join(directory, "vector_store"),
+               "NLTK_AUTO_DOWNLOAD": "false"}
+        results = {}
+        for module in STARTUP_MODULES:
+            process_s, import_s = [], []
+            for _ in range(args.startup_runs):
+                started = time.perf_counter()
+                completed = subprocess.run([sys.executable, "-c", code.format(module=module)], env=env,
+                                           capture_output=True, text=True)
+                if completed.returncode:
+                    raise RuntimeError(f"importing {module} failed: {completed.stderr.strip().splitlines()[-1]}")
+                process_s.append(time.perf_counter() - started)
+                import_s.append(float(completed.stdout.strip().splitlines()[-1]))
+            results[module] = {"process_s": statistics.median(process_s), "import_s": statistics.median(import_s),
+                               "min_process_s": min(process_s)}
+    return {"runs": args.startup_runs, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="Comma-separated benchmarks to run.")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for every corpus size.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--backend", choices=("azure", "local"), default="azure")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1, help="Loader processes.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embedder", choices=("fake", "hashing"), default="fake",
+                        help="Fake OpenAI embeddings with --embed-latency, or the local hashing provider.")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Simulated seconds per embeddings call.")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Simulated seconds per answer.")
+    parser.add_argument("--search-latency", type=float, default=0.005, help="Simulated seconds per search call.")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh processes timed per module.")
+    args = parser.parse_args()
+
+    selected = [name for name in args.only.split(",") if name]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("only", "output")},
+        "results": {},
+    }
+    for name in selected:
+        print(f"running {name}...", file=sys.stderr)
+        try:
+            # The pipeline's progress output would mix with the JSON on stdout.
+            with contextlib.redirect_stdout(sys.stderr):
+                result, elapsed_s = _timed(lambda: globals()[f"bench_{name}"](args))
+            report["results"][name] = {**result, "elapsed_s": elapsed_s}
+        except Exception as e:
+            message = str(e).strip().splitlines()
+            report["results"][name] = {"error": f"{type(e).__name__}: {message[0] if message else ''}"}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
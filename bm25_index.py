@@ -0,0 +1,362 @@
+"""
+Compact on-disk BM25 index over chunk content, for lexical and hybrid search
+without Azure AI Search.
+
+The indexer appends each chunk's term counts (or a delete) to a JSON-lines
+log, then `build()` compiles the live documents into CSR-style NumPy arrays:
+one sorted vocabulary, an offsets array per term, and flat posting arrays of
+document numbers and term frequencies. Later builds read only the new part of
+the log and merge it into the existing arrays. Readers memory-map the arrays and score
+only the postings of the query terms, so a lookup costs microseconds rather
+than a pass over the corpus.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+ARRAYS = ("offsets", "postings", "frequencies", "doc_lengths")
+
+
+class BM25Index:
+    """
+    A BM25 inverted index stored in a directory.
+
+    Args:
+        directory (str): Directory holding the log and the compiled arrays.
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 document-length normalization.
+    """
+
+    def __init__(self, directory, k1=1.2, b=0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.log_path = os.path.join(directory, "documents.jsonl")
+        self.meta_path = os.path.join(directory, "meta.json")
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._meta_mtime = None
+        self._terms = {}
+        self._doc_ids = []
+        self._fields = {}
+        self._field_values = {}
+        self._arrays = {}
+        self._avg_length = 0.0
+        self._filter_masks = {}
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------------ writing
+
+    def add_many(self, docs):
+        """
+        Logs documents for the next build, replacing earlier versions.
+
+        Args:
+            docs (iterable): (doc_id, tokens, fields) tuples, where `fields`
+                             holds the filterable "source" and "doc_type".
+        """
+        lines = [
+            json.dumps({"id": doc_id, "fields": fields, "terms": Counter(tokens)}) + "\n"
+            for doc_id, tokens, fields in docs
+        ]
+        self._append(lines)
+
+    def delete(self, doc_ids):
+        self._append([json.dumps({"op": "delete", "id": doc_id}) + "\n" for doc_id in doc_ids])
+
+    def _append(self, lines):
+        if lines:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+
+    def reset(self):
+        for name in os.listdir(self.directory):
+            if name in ("documents.jsonl", "meta.json") or name.endswith(".npy"):
+                os.remove(os.path.join(self.directory, name))
+        with self._lock:
+            self._version = self._meta_mtime = None
+            self._terms, self._doc_ids, self._arrays = {}, [], {}
+
+    def build(self):
+        """
+        Brings the posting arrays up to date with the log.
+
+        Only records appended since the last build are read: their documents
+        replace or remove earlier versions and are merged into the existing
+        arrays. The whole log is compiled again, and rewritten without
+        superseded records, when there is no usable build yet or superseded
+        records dominate it.
+
+        Returns:
+            int: The number of live documents.
+        """
+        meta = self._read_meta()
+        if meta is None or "log_offset" not in meta:
+            return self._build_full()
+        records, log_offset = self._read_log(meta["log_offset"])
+        if records is None:
+            return self._build_full()
+        if not records:
+            return len(meta["doc_ids"])
+
+        latest = self._latest(records)
+        doc_ids = meta["doc_ids"]
+        keep = np.fromiter((doc_id not in latest for doc_id in doc_ids), dtype=bool, count=len(doc_ids))
+        live = int(keep.sum()) + sum(record is not None for record in latest.values())
+        if meta["records"] + len(records) > 2 * live:
+            return self._build_full()
+
+        arrays = {name: np.load(self._array_path(name, meta["version"])) for name in ARRAYS}
+        old_vocabulary = np.array(meta["terms"], dtype=str)
+        posting_terms = np.repeat(np.arange(len(old_vocabulary)), np.diff(arrays["offsets"]))
+        renumber = np.cumsum(keep) - 1
+        kept = keep[arrays["postings"]]
+
+        added = [record for record in latest.values() if record is not None]
+        vocabulary = np.union1d(
+            old_vocabulary[np.unique(posting_terms[kept])],
+            np.array(sorted({term for record in added for term in record["terms"]}), dtype=str),
+        )
+        new_terms, new_docs, new_freqs, new_lengths = self._postings(added, vocabulary)
+        n_kept = int(keep.sum())
+        posting_terms = np.concatenate([
+            np.searchsorted(vocabulary, old_vocabulary)[posting_terms[kept]], new_terms
+        ]).astype(np.int32)
+        order = np.argsort(posting_terms, kind="stable")
+        merged = {
+            "offsets": np.searchsorted(posting_terms[order], np.arange(len(vocabulary) + 1)).astype(np.int64),
+            "postings": np.concatenate([renumber[arrays["postings"][kept]], new_docs + n_kept])
+                          .astype(np.int32)[order],
+            "frequencies": np.concatenate([arrays["frequencies"][kept], new_freqs])[order],
+            "doc_lengths": np.concatenate([arrays["doc_lengths"][keep], new_lengths]).astype(np.int32),
+        }
+        fields = {
+            field: [value for value, k in zip(values, keep) if k] + [record["fields"].get(field) for record in added]
+            for field, values in meta["fields"].items()
+        }
+        self._write(merged, vocabulary.tolist(), [d for d, k in zip(doc_ids, keep) if k] + [r["id"] for r in added],
+                    fields, log_offset, meta["records"] + len(records))
+        return len(merged["doc_lengths"])
+
+    def _build_full(self):
+        """
+        Compiles every live document in the log, compacting the log first when
+        superseded records dominate it.
+        """
+        records, log_offset = self._read_log(0)
+        latest = self._latest(records)
+        docs = [record for record in latest.values() if record is not None]
+
+        if len(records) > 2 * len(docs):
+            tmp_path = f"{self.log_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in docs)
+            os.replace(tmp_path, self.log_path)
+            log_offset = os.path.getsize(self.log_path)
+            records = docs
+
+        vocabulary = np.array(sorted({term for record in docs for term in record["terms"]}), dtype=str)
+        posting_terms, posting_docs, posting_freqs, doc_lengths = self._postings(docs, vocabulary)
+        order = np.argsort(posting_terms, kind="stable")
+        arrays = {
+            "offsets": np.searchsorted(posting_terms[order], np.arange(len(vocabulary) + 1)).astype(np.int64),
+            "postings": posting_docs[order],
+            "frequencies": posting_freqs[order],
+            "doc_lengths": doc_lengths,
+        }
+        fields = {
+            field: [record["fields"].get(field) for record in docs]
+            for field in ("source", "doc_type")
+        }
+        self._write(arrays, vocabulary.tolist(), [record["id"] for record in docs], fields,
+                    log_offset, len(records))
+        return len(docs)
+
+    def _read_log(self, offset):
+        """
+        Reads the complete records written from `offset` on.
+
+        Returns:
+            tuple: (records, offset after the last complete record), or
+                   (None, None) if the log is shorter than `offset`.
+        """
+        if not os.path.exists(self.log_path):
+            return ([], 0) if offset == 0 else (None, None)
+        records = []
+        with open(self.log_path, "rb") as f:
+            if offset > os.fstat(f.fileno()).st_size:
+                return None, None
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                records.append(json.loads(line))
+                offset += len(line)
+        return records, offset
+
+    @staticmethod
+    def _latest(records):
+        """
+        Maps each document id to its last record, or None if it was deleted,
+        ordered by when that record was written.
+        """
+        latest = {}
+        for record in records:
+            latest.pop(record["id"], None)  # Re-insert so order follows the latest write.
+            latest[record["id"]] = None if record.get("op") == "delete" else record
+        return latest
+
+    @staticmethod
+    def _postings(docs, vocabulary):
+        """
+        Returns the unsorted (term ids, doc numbers, frequencies) postings and
+        the lengths of `docs`, numbered from 0.
+        """
+        term_ids = {term: i for i, term in enumerate(vocabulary.tolist())}
+        doc_lengths = np.zeros(len(docs), dtype=np.int32)
+        posting_terms, posting_docs, posting_freqs = [], [], []
+        for doc_number, record in enumerate(docs):
+            terms = record["terms"]
+            doc_lengths[doc_number] = sum(terms.values())
+            posting_terms.extend(term_ids[t] for t in terms)
+            posting_docs.extend([doc_number] * len(terms))
+            posting_freqs.extend(terms.values())
+        return (np.asarray(posting_terms, dtype=np.int32), np.asarray(posting_docs, dtype=np.int32),
+                np.asarray(posting_freqs, dtype=np.float32), doc_lengths)
+
+    def _array_path(self, name, version):
+        return os.path.join(self.directory, f"{name}-{version}.npy")
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, arrays, vocabulary, doc_ids, fields, log_offset, records):
+        version = str(time.time_ns())
+        for name, array in arrays.items():
+            np.save(self._array_path(name, version), array)
+        meta = {
+            "version": version,
+            "terms": vocabulary,
+            "doc_ids": doc_ids,
+            "fields": fields,
+            "log_offset": log_offset,
+            "records": records,
+        }
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        self._remove_old_versions(version)
+
+    def _remove_old_versions(self, keep):
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy") and not name.endswith(f"-{keep}.npy"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # Still mapped by a reader on some platforms.
+
+    # ------------------------------------------------------------------ reading
+
+    def refresh(self):
+        """
+        Loads the latest build if it changed. Caller holds the lock.
+        """
+        meta = self._read_meta()
+        if meta is None or meta["version"] == self._version:
+            return
+        self._arrays = {
+            name: np.load(self._array_path(name, meta["version"]), mmap_mode="r")
+            for name in ARRAYS
+        }
+        self._terms = {term: i for i, term in enumerate(meta["terms"])}
+        self._doc_ids = meta["doc_ids"]
+        self._fields = {field: np.array(values, dtype=object) for field, values in meta["fields"].items()}
+        self._field_values = {field: set(values) for field, values in meta["fields"].items()}
+        lengths = self._arrays["doc_lengths"]
+        self._avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        self._filter_masks = {}
+        self._version = meta["version"]
+
+    def _refresh_if_changed(self):
+        try:
+            mtime = os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            if self._version is not None:
+                self._version = self._meta_mtime = None
+                self._terms, self._doc_ids, self._arrays = {}, [], {}
+            return
+        if mtime != self._meta_mtime:
+            self._meta_mtime = mtime
+            self.refresh()
+
+    def search(self, tokens, k=10, filters=None):
+        """
+        Scores documents containing any of the query tokens.
+
+        Args:
+            tokens (list): Query tokens from `TextPreprocessor.search_tokens`.
+            k (int): Maximum number of hits.
+            filters (dict): Equality filters on `source` and `doc_type`.
+
+        Returns:
+            list: (doc_id, BM25 score) pairs, best first.
+        """
+        with self._lock:
+            self._refresh_if_changed()
+            n_docs = len(self._doc_ids)
+            if not n_docs:
+                return []
+            offsets = self._arrays["offsets"]
+            postings = self._arrays["postings"]
+            frequencies = self._arrays["frequencies"]
+            doc_lengths = self._arrays["doc_lengths"]
+
+            docs, contributions = [], []
+            for term in set(tokens):
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                start, stop = offsets[term_id], offsets[term_id + 1]
+                term_docs = np.asarray(postings[start:stop])
+                tf = np.asarray(frequencies[start:stop])
+                df = stop - start
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[term_docs] / self._avg_length)
+                docs.append(term_docs)
+                contributions.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+            if not docs:
+                return []
+
+            candidates, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(contributions))
+            for field, value in (filters or {}).items():
+                if value not in self._field_values.get(field, ()):
+                    return []
+                key = (field, value)
+                if key not in self._filter_masks:
+                    self._filter_masks[key] = self._fields[field] == value
+                keep = self._filter_masks[key][candidates]
+                candidates, scores = candidates[keep], scores[keep]
+
+            top = np.argsort(-scores, kind="stable")[:k]
+            return [(self._doc_ids[candidates[i]], float(scores[i])) for i in top]
+
+    def stats(self):
+        with self._lock:
+            self._refresh_if_changed()
+            return {
+                "documents": len(self._doc_ids),
+                "terms": len(self._terms),
+                "postings": len(self._arrays.get("postings", ())),
+            }
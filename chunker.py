@@ -0,0 +1,206 @@
+"""
+Token-aware chunking for the PDF sources.
+
+Text is split into sentences, and paragraph breaks are recorded. The sentences
+are packed into chunks of about `target_tokens` tokens, counted with the
+embedding model's tokenizer. Each chunk starts with up to `overlap_tokens` of
+the previous one. A chunk ends at a paragraph break when that still fills most
+of it, and otherwise at a sentence boundary. A sentence longer than a chunk is
+cut at whitespace. Every sentence is tokenized once and pages are consumed as
+they arrive, so time is linear in the document and memory is bounded by a
+chunk.
+
+Each chunk records the pages it spans and its character offsets in the
+document text, which is its pages joined with newlines.
+"""
+import bisect
+import re
+from collections import deque
+
+from token_counter import FALLBACK_CHARS_PER_TOKEN, count_tokens
+
+# A sentence ends at . ! or ? (plus closing quotes or brackets) followed by
+# whitespace; a blank line ends a paragraph.
+_BOUNDARY = re.compile(r"\n[ \t]*\n\s*|[.!?][\"'’”)\]]*\s+")
+# A chunk may end early at a paragraph break once it is this full.
+PARAGRAPH_MIN_FILL = 0.75
+
+
+def _cut(text, position, max_chars):
+    """
+    Returns where to end a piece of `text` starting at `position`: the last
+    whitespace within `max_chars`, or a hard cut if there is none.
+    """
+    if len(text) - position <= max_chars:
+        return len(text)
+    limit = position + max_chars
+    space = max(text.rfind(" ", position + 1, limit), text.rfind("\n", position + 1, limit))
+    return space + 1 if space > position else limit
+
+
+class TokenChunker:
+    """
+    Splits documents into chunks of roughly equal token counts.
+
+    Args:
+        target_tokens (int): Maximum tokens per chunk.
+        overlap_tokens (int): Tokens of the previous chunk repeated at the start
+                              of the next, whole sentences only.
+        model_name (str): The embedding model whose tokenizer counts tokens.
+    """
+
+    def __init__(self, target_tokens=512, overlap_tokens=64, model_name=None):
+        if overlap_tokens >= target_tokens:
+            raise ValueError("overlap_tokens must be smaller than target_tokens.")
+        self.target_tokens = target_tokens
+        self.overlap_tokens = overlap_tokens
+        self.model_name = model_name
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            target_tokens=config.get("CHUNK_TOKENS", 512),
+            overlap_tokens=config.get("CHUNK_OVERLAP_TOKENS", 64),
+            model_name=config.get("OPENAI_EMBED_MODEL"),
+        )
+
+    def chunk_text(self, text):
+        """
+        Returns the chunks of a single string; see `iter_chunks`.
+        """
+        return list(self.iter_chunks([(None, text)]))
+
+    def iter_chunks(self, pages):
+        """
+        Chunks a document given page by page.
+
+        Args:
+            pages (iterable): (page_number, text) pairs in order.
+
+        Yields:
+            dict: "text", "tokens", "page_start", "page_end", "char_start" and
+                  "char_end" (offsets of the text in the joined pages).
+        """
+        builder = _ChunkBuilder(self)
+        for page_number, text in pages:
+            yield from builder.feed(page_number, text)
+        yield from builder.finish()
+
+
+class _ChunkBuilder:
+    """
+    The state of one document being chunked. Offsets are absolute positions in
+    the joined text, of which only the part still needed is kept.
+    """
+
+    def __init__(self, chunker):
+        self.chunker = chunker
+        self.text = ""
+        self.base = 0          # offset of self.text[0]
+        self.scanned = 0       # offset up to which text is split into sentences
+        self.page_offsets = []
+        self.page_numbers = []
+        # Sentences not yet emitted, as (start, end, tokens, ends_paragraph,
+        # fresh); fresh is False for overlap repeated from the last chunk.
+        self.pending = deque()
+        self.tokens = 0
+        self.fresh = 0
+        self.chunks = []
+
+    def feed(self, page_number, text):
+        if self.page_offsets:
+            self.text += "\n"
+        self.page_offsets.append(self.base + len(self.text))
+        self.page_numbers.append(page_number)
+        self.text += text
+        self._split(final=False)
+        return self._drain()
+
+    def finish(self):
+        self._split(final=True)
+        if self.fresh:
+            self._emit(len(self.pending))
+        return self._drain()
+
+    def _drain(self):
+        chunks, self.chunks = self.chunks, []
+        keep_from = self.pending[0][0] if self.pending else self.scanned
+        if keep_from > self.base:
+            self.text = self.text[keep_from - self.base:]
+            self.base = keep_from
+        return chunks
+
+    def _slice(self, start, end):
+        return self.text[start - self.base:end - self.base]
+
+    def _page_at(self, offset):
+        return self.page_numbers[max(bisect.bisect_right(self.page_offsets, offset) - 1, 0)]
+
+    def _split(self, final):
+        position = self.scanned - self.base
+        for match in _BOUNDARY.finditer(self.text, position):
+            if not final and match.end() == len(self.text):
+                break  # The whitespace may continue on the next page.
+            self._add(self.base + position, self.base + match.end(), match.group().count("\n") >= 2)
+            position = match.end()
+        # Text with no sentence boundary is cut once no chunk could hold it.
+        max_chars = self.chunker.target_tokens * FALLBACK_CHARS_PER_TOKEN
+        while len(self.text) - position > max_chars or (final and position < len(self.text)):
+            cut = _cut(self.text, position, max_chars)
+            self._add(self.base + position, self.base + cut, False)
+            position = cut
+        self.scanned = self.base + position
+
+    def _add(self, start, end, ends_paragraph):
+        target = self.chunker.target_tokens
+        text = self._slice(start, end)
+        tokens = count_tokens(text, self.chunker.model_name)
+        if tokens > target and len(text) > 1:
+            # A run-on sentence: cut it into pieces that fit on their own.
+            max_chars = max(1, int(len(text) * target / tokens * 0.9))
+            position = 0
+            while position < len(text):
+                cut = _cut(text, position, max_chars)
+                self._add(start + position, start + cut, ends_paragraph and cut == len(text))
+                position = cut
+            return
+
+        while self.fresh and self.tokens + tokens > target:
+            count, filled = len(self.pending), 0
+            for i, (_, _, unit_tokens, unit_ends_paragraph, fresh) in enumerate(self.pending):
+                filled += unit_tokens
+                if unit_ends_paragraph and fresh and filled >= PARAGRAPH_MIN_FILL * target:
+                    count = i + 1
+            self._emit(count)
+        while self.pending and self.tokens + tokens > target:
+            # Overlap is best effort; drop it rather than overflow.
+            self.tokens -= self.pending.popleft()[2]
+        self.pending.append((start, end, tokens, ends_paragraph, True))
+        self.tokens += tokens
+        self.fresh += 1
+
+    def _emit(self, count):
+        units = [self.pending.popleft() for _ in range(count)]
+        raw = self._slice(units[0][0], units[-1][1])
+        stripped = raw.strip()
+        char_start = units[0][0] + len(raw) - len(raw.lstrip())
+        char_end = char_start + len(stripped)
+        self.chunks.append({
+            "text": stripped,
+            "tokens": sum(unit[2] for unit in units),
+            "page_start": self._page_at(char_start),
+            "page_end": self._page_at(max(char_end - 1, char_start)),
+            "char_start": char_start,
+            "char_end": char_end,
+        })
+
+        # Repeat whole trailing sentences, never the entire chunk, as overlap.
+        overlap, overlap_tokens = [], 0
+        for unit in reversed(units[1:]):
+            if overlap_tokens + unit[2] > self.chunker.overlap_tokens:
+                break
+            overlap.append(unit[:4] + (False,))
+            overlap_tokens += unit[2]
+        self.pending.extendleft(overlap)
+        self.tokens = sum(unit[2] for unit in self.pending)
+        self.fresh = sum(1 for unit in self.pending if unit[4])
@@ -0,0 +1,121 @@
+"""
+Assembles the prompt context for an answer from search hits.
+
+Hits are taken best score first. Exact and near-duplicate chunks are dropped:
+the same row indexed twice, or a chunk that mostly repeats the overlap of one
+already packed. The rest are packed under a token budget counted with the chat
+model's tokenizer. Each packed chunk is headed with the citation the prompt asks
+the model to use, `[source: file.pdf, chunk N]`, where N is its position in the
+context. Structured records keep only the fields that the header and the
+content do not already carry.
+"""
+import json
+import re
+
+from token_counter import count_tokens, truncate_to_tokens
+
+# Words per shingle when comparing chunks for near-duplicates.
+SHINGLE_WORDS = 3
+# Share of a chunk's shingles found in a packed chunk above which it is dropped.
+DUPLICATE_CONTAINMENT = 0.8
+# Provenance fields left out of structured records: the citation header
+# carries the source and pages, and offsets mean nothing to the model.
+HEADER_FIELDS = ("source", "doc_type", "chunk", "page_start", "page_end", "char_start", "char_end")
+
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _is_duplicate(shingles, packed_shingles):
+    for other in packed_shingles:
+        if len(shingles & other) >= DUPLICATE_CONTAINMENT * len(shingles):
+            return True
+    return False
+
+
+def _score(result):
+    return result.get("@search.rerankerScore", result.get("@search.score", 0.0))
+
+
+def _metadata(result):
+    metadata = result.get("metadata") or "{}"
+    return json.loads(metadata) if isinstance(metadata, str) else dict(metadata)
+
+
+def _header(number, source, metadata):
+    header = f"[source: {source}, chunk {number}]"
+    if metadata.get("page_start"):
+        pages = metadata["page_start"], metadata.get("page_end", metadata["page_start"])
+        header += f" (page {pages[0]})" if pages[0] == pages[1] else f" (pages {pages[0]}-{pages[1]})"
+    return header
+
+
+def pack_context(results, max_tokens=3000, model_name=None):
+    """
+    Builds the context for a query from its search hits.
+
+    Args:
+        results (list): The "value" list of a search response.
+        max_tokens (int): Token budget for the chunks and structured records
+                          together. None packs every distinct hit.
+        model_name (str): The chat model whose tokenizer counts the budget.
+
+    Returns:
+        dict: "chunks" (the context text), "records" (structured records, each
+              with the "chunk" it belongs to), "citations" (chunk number, id,
+              source and pages of each packed hit), "tokens" (tokens used) and
+              "dropped" (hits left out as duplicates or over the budget).
+    """
+    ranked = sorted(results, key=_score, reverse=True)
+    blocks, records, citations = [], [], []
+    packed_shingles = []
+    used = dropped = 0
+
+    for result in ranked:
+        content = (result.get("content") or "").strip()
+        shingles = _shingles(content)
+        if not content or _is_duplicate(shingles, packed_shingles):
+            dropped += 1
+            continue
+
+        metadata = _metadata(result)
+        source = result.get("source") or metadata.get("source") or "unknown"
+        number = len(blocks) + 1
+        header = _header(number, source, metadata)
+        block = f"{header}\n{content}\n\n"
+        record = {key: value for key, value in metadata.items()
+                  if key not in HEADER_FIELDS and value != content}
+        if record:
+            record = {"chunk": number, **record}
+        cost = count_tokens(block, model_name) + (count_tokens(json.dumps(record), model_name) if record else 0)
+
+        if max_tokens is not None and used + cost > max_tokens:
+            if blocks:
+                dropped += 1
+                continue
+            # Always answer from something: cut the best hit to the budget.
+            # The header and the blank line after the content count too.
+            frame_tokens = count_tokens(f"{header}\n\n\n", model_name)
+            block = f"{header}\n{truncate_to_tokens(content, max(max_tokens - frame_tokens, 0), model_name)}\n\n"
+            record = {}
+            cost = count_tokens(block, model_name)
+
+        blocks.append(block)
+        packed_shingles.append(shingles)
+        if record:
+            records.append(record)
+        citation = {"chunk": number, "id": result.get("id"), "source": source}
+        for key in ("page_start", "page_end"):
+            if metadata.get(key):
+                citation[key] = metadata[key]
+        citations.append(citation)
+        used += cost
+
+    return {"chunks": "".join(blocks), "records": records, "citations": citations,
+            "tokens": used, "dropped": dropped}
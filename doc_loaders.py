@@ -0,0 +1,373 @@
+"""
+Document loaders for the PDF and CSV sources.
+
+Kept free of the Azure and OpenAI SDKs, and pandas and PyPDF2 are imported
+only when a file of their type is read, so the indexer and the worker
+processes that extract files in parallel start quickly.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
+
+from chunker import TokenChunker
+from index_manifest import chunk_id, source_key
+
+# Rows parsed per pandas chunk when reading CSV files.
+CSV_CHUNK_ROWS = 50000
+
+# Pages of a PDF a loader worker extracts per task. Each task's text is
+# pickled back to the indexer, so this and the worker count bound memory.
+PDF_PAGES_PER_TASK = 16
+
+def iter_pdf_pages(file_path):
+    """
+    Yields the text of a PDF one page at a time.
+
+    Args:
+        file_path (str): The path to the PDF file.
+
+    Yields:
+        tuple: (page_number, text), with 1-based page numbers.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    for page_number, page in enumerate(reader.pages, start=1):
+        yield page_number, page.extract_text() or ""
+
+def iter_pdf_chunks(file_path, chunker=None):
+    """
+    Chunks a PDF as its pages are read, without holding the whole text.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        chunker (TokenChunker): Sets the chunk and overlap sizes; defaults to
+                                TokenChunker().
+
+    Yields:
+        dict: The chunk "text" with the "page_start" and "page_end" it spans
+              and its "char_start" and "char_end" offsets in the document.
+    """
+    yield from (chunker or TokenChunker()).iter_chunks(iter_pdf_pages(file_path))
+
+def _extract_pdf_text(file_path):
+    """
+    Returns (text, error) for one PDF; runs in a worker process.
+    """
+    try:
+        return "\n".join(text for _, text in iter_pdf_pages(file_path)), None
+    except Exception as e:
+        return "", str(e)
+
+def load_pdfs(folder_path, workers=None):
+    """
+    Loads text content from all PDF files in a given folder.
+
+    Kept for callers that want one string; the indexer itself streams pages
+    through `iter_pdf_chunks` instead.
+
+    Args:
+        folder_path (str): The directory containing the PDF files.
+        workers (int): Number of processes extracting files in parallel.
+                       None or 1 extracts in the current process.
+    """
+    paths = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path)) if f.endswith(".pdf")]
+    all_text = []
+    for file_path, (text, error) in map_files(_extract_pdf_text, paths, workers):
+        if error:
+            print(f"Error reading PDF file {os.path.basename(file_path)}: {error}")
+        elif text:
+            all_text.append(text)
+    return "\n".join(all_text)
+
+
+def iter_csv_docs(csv_path, text_field="description", chunksize=CSV_CHUNK_ROWS):
+    """
+    Yields one document per CSV row, reading the file `chunksize` rows at a time.
+
+    Documents are built column-wise from each chunk rather than row by row,
+    and the text field is kept out of the metadata so it is stored only once,
+    as the document content. Rows with an empty text field are skipped.
+
+    Args:
+        csv_path (str): The path to the CSV file.
+        text_field (str): The column used as the document content.
+        chunksize (int): Rows parsed per chunk, which bounds memory.
+
+    Yields:
+        dict: Documents with 'id', 'content' and 'metadata'.
+
+    Raises:
+        ValueError: If the file has no `text_field` column.
+    """
+    import pandas as pd
+
+    filename = os.path.basename(csv_path)
+    source = source_key(csv_path)
+    for frame in pd.read_csv(csv_path, chunksize=chunksize):
+        if text_field not in frame.columns:
+            raise ValueError(f"'{text_field}' column not found in {filename}")
+        frame = frame[frame[text_field].notna()]
+        positions = frame.index.tolist()
+        texts = frame[text_field].astype(str).tolist()
+        records = frame.drop(columns=[text_field]).to_dict("records")
+        for position, text, record in zip(positions, texts, records):
+            yield {
+                "id": chunk_id(source, position, text),
+                "content": text,
+                "metadata": {
+                    "doc_type": "csv",
+                    "source": filename,
+                    **record
+                }
+            }
+
+def load_csv(csv_path, text_field="description"):
+    return list(iter_csv_docs(csv_path, text_field))
+
+def _load_csv_file(file_path, text_field="description"):
+    """
+    Returns (docs, error) for one CSV; runs in a worker process.
+    """
+    import pandas as pd
+
+    filename = os.path.basename(file_path)
+    try:
+        return list(iter_csv_docs(file_path, text_field)), None
+    except ValueError as e:
+        return [], f"Warning: {e}. Skipping."
+    except pd.errors.ParserError as e:
+        return [], f"Error parsing {filename}: {e}. Skipping this file."
+    except Exception as e:
+        return [], f"An unexpected error occurred while processing {filename}: {e}."
+
+def load_csvs_from_directory(directory_path, text_field="description", workers=None):
+    """
+    Loads documents from all CSV files in a given directory.
+
+    Args:
+        directory_path (str): The path to the directory containing CSV files.
+        text_field (str): The name of the column in the CSV to use as the
+                          main content for the document. Defaults to "description".
+        workers (int): Number of processes parsing files in parallel. None or 1
+                       parses in the current process.
+
+    Returns:
+        list: A list of dictionaries, where each dictionary represents a document
+              with 'id', 'content', and 'metadata'. Documents are ordered by file
+              name, then row, regardless of which file finished first.
+    """
+    all_docs = []
+    
+    # Check if the directory exists
+    if not os.path.isdir(directory_path):
+        print(f"Directory not found: {directory_path}")
+        return []
+
+    paths = [os.path.join(directory_path, f) for f in sorted(os.listdir(directory_path)) if f.endswith(".csv")]
+    for file_path, (docs, error) in map_files(partial(_load_csv_file, text_field=text_field), paths, workers):
+        print(f"Processing CSV file: {file_path}")
+        if error:
+            print(error)
+        all_docs.extend(docs)
+
+    return all_docs
+
+def chunk_text(text, chunker=None):
+    """
+    Splits a large string into smaller chunks at sentence boundaries.
+    """
+    return [chunk["text"] for chunk in (chunker or TokenChunker()).chunk_text(text)]
+
+def iter_source_docs(file_path, chunker=None):
+    """
+    Yields the documents for a single PDF or CSV source file.
+
+    PDFs are streamed page by page, so memory stays bounded by the chunk size
+    rather than the file size.
+
+    Args:
+        file_path (str): The path to the source file.
+        chunker (TokenChunker): How PDFs are chunked; defaults to TokenChunker().
+
+    Yields:
+        dict: Documents with deterministic ids derived from the file, the chunk
+              position and the chunk content. PDF chunks carry their source file,
+              chunk number, page range and character offsets in the metadata.
+    """
+    filename = os.path.basename(file_path)
+    if filename.endswith(".csv"):
+        yield from iter_csv_docs(file_path, text_field="description")
+        return
+
+    yield from _pdf_docs(file_path, iter_pdf_pages(file_path), chunker)
+
+def _pdf_docs(file_path, pages, chunker=None):
+    """
+    Yields the chunk documents of a PDF given its (page_number, text) pairs.
+    """
+    filename = os.path.basename(file_path)
+    source = source_key(file_path)
+    for position, chunk in enumerate((chunker or TokenChunker()).iter_chunks(pages)):
+        yield {
+            "id": chunk_id(source, position, chunk["text"]),
+            "content": chunk["text"],
+            "metadata": {
+                "source": filename,
+                "doc_type": "policy",
+                "chunk": position,
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "char_start": chunk["char_start"],
+                "char_end": chunk["char_end"]
+            }
+        }
+
+def list_source_files(*directories):
+    """
+    Lists the PDF and CSV files in the given directories, in a stable order.
+    """
+    paths = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            print(f"Directory not found: {directory}")
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith((".pdf", ".csv")):
+                paths.append(os.path.join(directory, filename))
+    return paths
+
+
+def _pdf_tasks(paths, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Splits the PDFs among `paths` into page ranges for the loader workers.
+
+    Yields:
+        tuple: (file_index, path, start, stop, error), with at least one task
+               per PDF. `error` is set when the file cannot be opened.
+    """
+    from PyPDF2 import PdfReader
+
+    for index, path in enumerate(paths):
+        if not path.endswith(".pdf"):
+            continue
+        try:
+            count = len(PdfReader(path).pages)
+        except Exception as e:
+            yield index, path, 0, 0, str(e)
+            continue
+        for start in range(0, max(count, 1), pages_per_task):
+            yield index, path, start, min(start + pages_per_task, count), None
+
+@lru_cache(maxsize=2)
+def _open_pdf(path):
+    # A worker usually gets several consecutive ranges of the same file.
+    from PyPDF2 import PdfReader
+
+    return PdfReader(path)
+
+def _extract_pdf_pages(task):
+    """
+    Returns (pages, error) for one task from `_pdf_tasks`, where `pages` holds
+    (page_number, text) pairs; runs in a worker process.
+    """
+    _, path, start, stop, error = task
+    if error:
+        return [], error
+    try:
+        reader = _open_pdf(path)
+        return [(n + 1, reader.pages[n].extract_text() or "") for n in range(start, stop)], None
+    except Exception as e:
+        return [], str(e)
+
+def map_files(func, paths, workers=None, max_pending=None):
+    """
+    Applies `func` to each file (or task), in a process pool when `workers` > 1.
+
+    Results are yielded in the order of `paths` as soon as each file and all
+    files before it are done, so output is deterministic whatever order the
+    workers finish in. At most `max_pending` files are in flight or waiting to
+    be yielded, which bounds memory.
+
+    Args:
+        func (callable): A picklable function taking a file path. It should
+                         catch its own errors so one bad file does not stop the run.
+        paths (list): The files to process.
+        workers (int): Number of worker processes. None or 1 runs in-process.
+        max_pending (int): Files submitted ahead of the one being yielded.
+                           Defaults to twice the worker count.
+
+    Yields:
+        tuple: (path, func(path)).
+    """
+    if not workers or workers <= 1:
+        for path in paths:
+            yield path, func(path)
+        return
+
+    max_pending = max_pending or workers * 2
+    remaining = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque((path, pool.submit(func, path)) for path in islice(remaining, max_pending))
+        while pending:
+            path, future = pending.popleft()
+            result = future.result()
+            for next_path in islice(remaining, 1):
+                pending.append((next_path, pool.submit(func, next_path)))
+            yield path, result
+
+def iter_loaded_files(paths, workers=None, chunker=None):
+    """
+    Loads source files, extracting PDF pages in parallel when `workers` > 1.
+
+    Each file's documents are streamed lazily either way. With several workers,
+    PDFs are split into ranges of PDF_PAGES_PER_TASK pages that the workers
+    extract ahead of the file being read, across file boundaries, while pages
+    are chunked in order in this process, so chunks and their ids are the same
+    as with a single worker. At most two tasks per worker are in flight or
+    waiting, which bounds memory whatever the file sizes. CSVs are parsed here
+    in chunks, as pandas already does that in C.
+
+    Args:
+        paths (list): The PDF and CSV files to load.
+        workers (int): Number of worker processes.
+        chunker (TokenChunker): How PDFs are chunked; defaults to TokenChunker().
+
+    Yields:
+        tuple: (path, docs, error) in the order of `paths`, where `docs` is an
+               iterable of documents and `error` is None or a message. Errors
+               found while extracting raise from iterating `docs`.
+    """
+    if not workers or workers <= 1:
+        for path in paths:
+            yield path, iter_source_docs(path, chunker), None
+        return
+
+    results = map_files(_extract_pdf_pages, _pdf_tasks(paths), workers)
+    lookahead = []
+
+    def file_pages(index):
+        while True:
+            item = lookahead.pop() if lookahead else next(results, None)
+            if item is None:
+                return
+            task, (pages, error) = item
+            if task[0] < index:
+                continue  # Left over from a file whose docs were not read to the end.
+            if task[0] > index:
+                lookahead.append(item)
+                return
+            if error:
+                raise RuntimeError(error)
+            yield from pages
+
+    try:
+        for index, path in enumerate(paths):
+            if path.endswith(".pdf"):
+                yield path, _pdf_docs(path, file_pages(index), chunker), None
+            else:
+                yield path, iter_source_docs(path, chunker), None
+    finally:
+        results.close()
@@ -1,277 +1,433 @@
+import time
+
+# Taken before the other imports so the startup time includes them.
+STARTED = time.perf_counter()
+
 import os
-import uuid
 import json
-from openai import OpenAI
-import pandas as pd
-from dotenv import load_dotenv
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import (
-    SimpleField,
-    ComplexField,
-    SearchField,
-    SearchFieldDataType,    
-    SearchableField,
-    SearchIndex,
-    SemanticConfiguration,
-    SemanticField,
-    SemanticPrioritizedFields,
-    SemanticSearch,
-    VectorSearch, 
-    VectorSearchProfile,
-    HnswAlgorithmConfiguration,
-    ExhaustiveKnnAlgorithmConfiguration
-)
-
-from azure.core.credentials import AzureKeyCredential
-from PyPDF2 import PdfReader
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from infra.utils.azure_util import load_config
+from infra.utils.index_naming import version_name
 from text_preprocessor import TextPreprocessor
+from embedding_pipeline import BatchEmbedder, embedding_request_options
+from embedding_providers import get_embedding_client
+from retrieval import get_retrieval_backend
+from index_manifest import IndexManifest, content_hash, file_hash, source_key
+from answer_cache import bump_index_generation
+from metrics import INGEST_DOCUMENTS, UPLOAD_QUEUE_BATCHES, StartupClock, stage_timer
+from chunker import TokenChunker
+from doc_loaders import iter_loaded_files, list_source_files
 
-def embed(openai_client, text, model_name):
+def embed(openai_client, text, model_name, cache=None, dimensions=None):
     """
-    Generates an embedding for the given text using OpenAI's embedding model.
+    Generates an embedding for the given text with the configured embedding
+    provider; `openai_client` is anything from `get_embedding_client`.
+
+    When an EmbeddingCache is given, a cached vector is returned if present and
+    freshly generated vectors are added to it. `dimensions` requests a
+    shortened embedding from models that support it.
     """
+    key = cache.key(model_name, text) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
     response = openai_client.embeddings.create(
         input=text,
-        model=model_name
+        model=model_name,
+        **embedding_request_options(model_name, dimensions)
     )
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+    if key is not None:
+        cache.observe_upstream_latency(time.perf_counter() - started)
+        cache.put(key, embedding, text)
+    return embedding
+
+def create_index(config, recreate=True):
 
-def load_pdfs(folder_path):
     """
-    Loads text content from all PDF files in a given folder.
+    Creates the search index in the configured retrieval backend.
+    
+    Args:
+        config (dict): The application configuration.
+        recreate (bool): Delete and re-create the index. When False, the index
+                         is created if missing and otherwise updated in place,
+                         keeping its documents.
     """
-    all_text = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    all_text.append(page.extract_text())
-            except Exception as e:
-                print(f"Error reading PDF file {filename}: {e}")
-    return "\n".join(all_text)
-
-
-def load_csv(csv_path, text_field="description"):
-    df = pd.read_csv(csv_path)
-    docs = []
-    for _, row in df.iterrows():
-        doc = {
-            "id": str(uuid.uuid4()),
-            "content": row[text_field],
-            "metadata": {
-                "doc_type": "csv",
-                "source": os.path.basename(csv_path),
-                **row.to_dict()
-            }
-        }
-        docs.append(doc)
-    return docs
-
-def load_csvs_from_directory(directory_path, text_field="description"):
+    get_retrieval_backend(config).create_index(recreate)
+
+def iter_batches(items, batch_size):
     """
-    Loads documents from all CSV files in a given directory.
+    Groups any iterable into lists of at most `batch_size` items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_docs(config, docs):
+    """
+    Embeds and uploads documents to the search index in bounded batches.
 
+    Uploads run on a small worker pool while the next batch is embedded. When
+    uploads fall behind, the uploader blocks and holds back further embedding.
+    Time spent in each stage (loading, preprocessing, embedding, queueing for
+    upload, flushing) and the upload queue depth are reported at the end.
+    
     Args:
-        directory_path (str): The path to the directory containing CSV files.
-        text_field (str): The name of the column in the CSV to use as the
-                          main content for the document. Defaults to "description".
+        config (dict): The application configuration.
+        docs (iterable): Dictionaries representing the documents to ingest. A
+                         generator is consumed lazily, INGEST_BATCH_SIZE at a time.
 
     Returns:
-        list: A list of dictionaries, where each dictionary represents a document
-              with 'id', 'content', and 'metadata'.
+        dict: The ids of documents that could not be indexed, mapped to the error.
     """
-    all_docs = []
-    
-    # Check if the directory exists
-    if not os.path.isdir(directory_path):
-        print(f"Directory not found: {directory_path}")
-        return []
-
-    # Iterate over all files in the directory
-    for filename in os.listdir(directory_path):
-        if filename.endswith(".csv"):
-            file_path = os.path.join(directory_path, filename)
-            print(f"Processing CSV file: {file_path}")
-            
-            try:
-                df = pd.read_csv(file_path)
-                
-                # Check if the text_field exists in the DataFrame
-                if text_field not in df.columns:
-                    print(f"Warning: '{text_field}' column not found in {filename}. Skipping.")
-                    continue
-                
-                # Iterate through rows and create documents
-                for _, row in df.iterrows():
-                    doc = {
-                        "id": str(uuid.uuid4()),
-                        "content": row[text_field],
-                        "metadata": {
-                            "doc_type": "csv",
-                            "source": filename,
-                            **row.to_dict()
-                        }
-                    }
-                    all_docs.append(doc)
-
-            except pd.errors.ParserError as e:
-                print(f"Error parsing {filename}: {e}. Skipping this file.")
-            except Exception as e:
-                print(f"An unexpected error occurred while processing {filename}: {e}.")
+    uploader = get_retrieval_backend(config).writer()
+    embedder = BatchEmbedder.from_config(config)
+    workers = config.get("PREPROCESS_WORKERS", 1)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
 
-    return all_docs
+    metrics_enabled = config.get("METRICS_ENABLED", True)
+    timer = stage_timer("ingest", metrics_enabled)
+    batches = iter_batches(docs, config.get("INGEST_BATCH_SIZE", 500))
+    total = 0
+    max_queue = 0
+    try:
+        while True:
+            # Loading covers reading and chunking the sources that feed `docs`.
+            with timer.stage("load"):
+                docs_batch = next(batches, None)
+            if docs_batch is None:
+                break
+
+            # Preprocess the batch, then embed it in batched, concurrent requests
+            with timer.stage("preprocess"):
+                processed_texts = TextPreprocessor.preprocess_many(
+                    [d["content"] for d in docs_batch],
+                    fast=config.get("PREPROCESS_FAST", False),
+                    executor=executor
+                )
+            with timer.stage("embed"):
+                embeddings = embedder.embed_many(processed_texts)
+
+            # Blocks while the upload queue is full, so this is time spent
+            # waiting on the search service.
+            with timer.stage("upload_queue"):
+                for d, emb in zip(docs_batch, embeddings):
+                    uploader.add({
+                        "id": d["id"],
+                        "content": d["content"],
+                        "contentVector": emb,
+                        "source": d["metadata"].get("source"),
+                        "doc_type": d["metadata"].get("doc_type"),
+                        "metadata": json.dumps(d["metadata"])
+                    })
+            total += len(docs_batch)
+            queue = uploader.pending_batches()
+            max_queue = max(max_queue, queue)
+            if metrics_enabled:
+                INGEST_DOCUMENTS.inc(len(docs_batch), "embedded")
+                UPLOAD_QUEUE_BATCHES.set(queue)
+            print(f"Embedded {total} documents so far... (upload queue: {queue} batches)")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        with timer.stage("flush"):
+            stats = uploader.close()
 
-def chunk_text(text, chunk_size=1000):
+    print(f"Embedded {total} documents in {embedder.stats['requests']} requests "
+          f"({embedder.stats['cache_hits']} cache hits, {embedder.stats['retries']} retries).")
+    print(f"Uploaded {stats['succeeded']} documents in {stats['requests']} requests at "
+          f"{stats['docs_per_sec']:.1f} docs/sec ({stats['retried_docs']} retried, {stats['failed']} failed).")
+    if metrics_enabled:
+        INGEST_DOCUMENTS.inc(stats["succeeded"], "uploaded")
+        print(f"Stage time and docs/sec: {timer.summary(total)}; upload queue peaked at {max_queue} batches.")
+    return uploader.failed
+
+def delete_docs(config, doc_ids):
     """
-    Splits a large string into smaller chunks.
+    Deletes documents from the search index by id.
+
+    Args:
+        config (dict): The application configuration.
+        doc_ids (iterable): The ids of the documents to delete.
+
+    Returns:
+        dict: The ids that could not be deleted, mapped to the error.
+    """
+    doc_ids = sorted(doc_ids)
+    if not doc_ids:
+        return {}
+    print(f"Deleting {len(doc_ids)} stale documents from the index...")
+    uploader = get_retrieval_backend(config).writer()
+    uploader.delete_many(doc_ids)
+    uploader.close()
+    return uploader.failed
+
+def sync_index(config, source_paths, manifest, bump_generation=True):
     """
-    chunks = []
-    for i in range(0, len(text), chunk_size):
-        chunks.append(text[i:i + chunk_size])
-    return chunks
+    Brings the index in line with the source files, touching only what changed.
 
-def create_index(config):
+    Unchanged files are skipped without being parsed. Changed or new files are
+    loaded, in parallel when LOADER_WORKERS > 1, and only chunks whose id is
+    not already in the manifest are embedded and uploaded, in bounded batches.
+    Chunks that no longer exist, including every chunk of a deleted file, are
+    removed from the index. Files with chunks that failed to upload or delete
+    are left marked as changed so the next run retries them.
 
+    Args:
+        config (dict): The application configuration.
+        source_paths (list): The PDF and CSV files that should be indexed.
+        manifest (IndexManifest): What the previous run indexed; updated in place.
+        bump_generation (bool): Tell the servers to drop cached answers when
+                                anything changed. A blue/green rebuild does
+                                this itself once the new version is live.
+
+    Returns:
+        dict: Counts of new, stale, indexed and failed chunks and of files that
+              could not be loaded.
     """
-    Deletes and re-creates the Azure AI Search index.
-    
+    stale_ids = {}
+    updated = []
+    current_sources = set()
+    new_count = 0
+    load_errors = 0
+
+    changed = {}
+    for path in source_paths:
+        source = source_key(path)
+        current_sources.add(source)
+        digest = file_hash(path)
+        if not manifest.file_unchanged(source, digest):
+            changed[path] = (source, digest)
+
+    chunker = TokenChunker.from_config(config)
+
+    def changed_docs():
+        nonlocal new_count, load_errors
+        for path, docs, error in iter_loaded_files(list(changed), config.get("LOADER_WORKERS", 1), chunker):
+            source, digest = changed[path]
+            previous = manifest.files.get(source, {}).get("chunks", {})
+            chunk_hashes = {}
+            try:
+                if error:
+                    raise RuntimeError(error)
+                for d in docs:
+                    chunk_hashes[d["id"]] = content_hash(d["content"])
+                    if d["id"] not in previous:
+                        new_count += 1
+                        yield d
+            except Exception as e:
+                # Keep every id we may have uploaded so the next run can clean up,
+                # and leave the file hash unset so the file is retried.
+                print(f"Error loading {path}: {e}. Will retry it on the next run.")
+                load_errors += 1
+                updated.append((source, None, {**previous, **chunk_hashes}))
+                continue
+            stale_ids.update((i, source) for i in set(previous) - set(chunk_hashes))
+            updated.append((source, digest, chunk_hashes))
+
+    failed_uploads = ingest_docs(config, changed_docs())
+
+    for source in set(manifest.files) - current_sources:
+        stale_ids.update((i, source) for i in manifest.remove_file(source))
+
+    print(f"{new_count} new or changed chunks, {len(stale_ids)} stale chunks.")
+    failed_deletes = delete_docs(config, stale_ids)
+
+    # Forget chunks that never reached the index, remember ones that could not
+    # be removed from it, and mark their files for another pass.
+    retry = {}
+    for doc_id in failed_deletes:
+        retry.setdefault(stale_ids[doc_id], {})[doc_id] = ""
+    for source, digest, chunk_hashes in updated:
+        kept = {i: h for i, h in chunk_hashes.items() if i not in failed_uploads}
+        leftovers = retry.pop(source, {})
+        if leftovers or len(kept) < len(chunk_hashes):
+            digest = None
+        manifest.update_file(source, digest, {**leftovers, **kept})
+    for source, leftovers in retry.items():
+        manifest.update_file(source, None, leftovers)
+    manifest.save()
+
+    if bump_generation and (new_count or stale_ids):
+        # Cached answers may cite chunks that changed; tell the servers.
+        bump_index_generation(config["INDEX_GENERATION_PATH"])
+    return {
+        "new": new_count,
+        "stale": len(stale_ids),
+        "indexed": sum(len(entry.get("chunks", {})) for entry in manifest.files.values()),
+        "failed_uploads": len(failed_uploads),
+        "failed_deletes": len(failed_deletes),
+        "load_errors": load_errors,
+    }
+
+def validate_version(config, backend, summary, live_count=None):
+    """
+    Checks a freshly built index version before it goes live.
+
+    The version must have loaded every file and uploaded every chunk, must
+    report as many documents as were indexed (Azure AI Search counts lag
+    uploads briefly, so the count is polled for up to INDEX_VALIDATE_TIMEOUT_S),
+    and must not hold fewer than INDEX_MIN_COUNT_RATIO times the documents of
+    the live version.
+
     Args:
         config (dict): The application configuration.
+        backend (RetrievalBackend): The backend reading the new version.
+        summary (dict): What `sync_index` returned for the build.
+        live_count (int): Documents in the live version, if there is one.
+
+    Returns:
+        list: Reasons the version must not go live; empty if it passed.
     """
-    search_index_name = config["INDEX_NAME"]
-    search_endpoint = config["SEARCH_ENDPOINT"]
-    search_key = config["SEARCH_API_KEY"]
-    
-    index_client = SearchIndexClient(search_endpoint, AzureKeyCredential(search_key))
-
-    fields = [
-        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
-        SearchableField(name="content", type=SearchFieldDataType.String),
-        SearchableField(name="source", type=SearchFieldDataType.String, filterable=True),
-        SearchableField(name="doc_type", type=SearchFieldDataType.String, filterable=True),
-        SearchableField(name="metadata", type=SearchFieldDataType.String, searchable=False),
-        SearchField(
-            name="contentVector",
-            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-            vector_search_dimensions=config["EMBED_DIM"],
-            vector_search_profile_name="my-vector-profile"
-        )
-    ]
-
-    """vector_search=VectorSearch(
-        algorithms=[
-            VectorSearchAlgorithmConfiguration(
-                name="default",
-                kind="hnsw",
-                hnsw_parameters=HnswParameters(metric="cosine")
-            )
-        ]
-    )"""
-    
-    vector_search = VectorSearch(
-        algorithms=[
-            HnswAlgorithmConfiguration(name="my-hnsw-vector-config-1", kind="hnsw"),
-            ExhaustiveKnnAlgorithmConfiguration(name="my-eknn-vector-config", kind="exhaustiveKnn")
-        ],
-        profiles=[
-            VectorSearchProfile(name="my-vector-profile", algorithm_configuration_name="my-hnsw-vector-config-1")
-        ]
-    )
-    """ vector_search = VectorSearch(
-        algorithms=[HnswVectorSearchAlgorithmConfiguration(
-            name="hnsw-config",
-            parameters={"metric": "cosine", "m": 4, "efConstruction": 400}
-        )],
-        profiles=[VectorSearchProfile(name="default", algorithm_configuration_name="hnsw-config")]
-    ) """
-
-    index = SearchIndex(name=search_index_name, fields=fields, vector_search=vector_search)
-    
-    try:
-        print(f"Deleting index '{search_index_name}'...")
-        index_client.delete_index(search_index_name)
-    except Exception as e:
-        print(f"Index '{search_index_name}' not found or error deleting. Continuing... ({e})")
-        
-    print(f"Creating new index '{search_index_name}'...")
-    index_client.create_index(index)
-    print("Index created successfully.")
+    problems = []
+    if summary["load_errors"]:
+        problems.append(f"{summary['load_errors']} source files could not be loaded")
+    if summary["failed_uploads"]:
+        problems.append(f"{summary['failed_uploads']} chunks failed to upload")
 
-def ingest_docs(config, docs):
+    expected = summary["indexed"]
+    deadline = time.monotonic() + config.get("INDEX_VALIDATE_TIMEOUT_S", 60.0)
+    count = backend.count()
+    while count != expected and time.monotonic() < deadline:
+        time.sleep(1.0)
+        count = backend.count()
+    if count != expected:
+        problems.append(f"the index holds {count} documents, expected {expected}")
+
+    min_ratio = config.get("INDEX_MIN_COUNT_RATIO", 0.9)
+    if live_count and count < min_ratio * live_count:
+        problems.append(f"{count} documents is under {min_ratio:.0%} of the live index's {live_count}")
+    return problems
+
+def _discard_version(backend, version, manifest_path):
+    backend.drop_version(version)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def rebuild_index(config, source_paths, replace_index=False):
     """
-    Uploads a batch of documents to the search index.
-    
+    Rebuilds the index from scratch without taking search offline.
+
+    A new version of the index is built next to the live one and validated
+    with `validate_version`. Only then are the servers switched to it, in one
+    step, by promoting it in the retrieval backend. A version that fails to
+    build or validate is deleted and the live one keeps serving. Old versions
+    beyond INDEX_VERSIONS_KEPT (counting the live one) are deleted afterwards,
+    so the previous version stays around for a rollback.
+
+    On Azure AI Search the servers query an alias. If an unversioned index
+    still holds its name, nothing is built unless `replace_index` is set: that
+    one-time migration deletes the index before creating the alias, so search
+    is unavailable for a moment.
+
     Args:
         config (dict): The application configuration.
-        docs (list): A list of dictionaries representing the documents to ingest.
+        source_paths (list): The PDF and CSV files that should be indexed.
+        replace_index (bool): Allow the one-time migration described above.
+
+    Returns:
+        str: The version now live, or None if the rebuild was rejected.
     """
-    search_client = SearchClient(
-        endpoint=config["SEARCH_ENDPOINT"],
-        index_name=config["INDEX_NAME"],
-        credential=AzureKeyCredential(config["SEARCH_API_KEY"])
-    )
-    
-    batch = []
-    for d in docs:
-        # Preprocess text and generate the embedding
-        processed_text = TextPreprocessor.preprocess_with_nltk(d["content"])
-        emb = embed(config["openai_client"], processed_text, config["OPENAI_EMBED_MODEL"])
-        batch.append({
-            "id": d["id"],
-            "content": d["content"],
-            "contentVector": emb,
-            "source": d["metadata"].get("source"),
-            "doc_type": d["metadata"].get("doc_type"),
-            "metadata": json.dumps(d["metadata"])
-        })
-    print(f"Uploading {len(batch)} documents to the index...")
-    search_client.upload_documents(batch)
-    print("Documents uploaded successfully.")
+    backend = get_retrieval_backend(config)
+    if not replace_index and backend.index_blocks_alias():
+        print(f"Index '{config['INDEX_NAME']}' is not versioned yet, so a rebuild cannot be swapped in under "
+              f"its name. Either set AZURE_SEARCH_INDEX to a new name, rebuild, redeploy the servers with it "
+              f"and delete the old index, or run once with --replace-index and accept a moment of downtime.")
+        return None
+    live = backend.live_version()
+    try:
+        live_count = backend.count()
+    except Exception:
+        live_count = None  # nothing has been indexed yet
+
+    version = version_name(config["INDEX_NAME"])
+    version_config = backend.version_config(version)
+    manifest = IndexManifest(f"{config['INDEX_MANIFEST_PATH']}.{version}", version)
+    print(f"Building index version '{version}' (live: '{live or config['INDEX_NAME']}')...")
+    try:
+        create_index(version_config, recreate=True)
+        summary = sync_index(version_config, source_paths, manifest, bump_generation=False)
+        problems = validate_version(config, get_retrieval_backend(version_config), summary, live_count)
+    except Exception:
+        print(f"Building '{version}' failed. Deleting it; the live index is unchanged.")
+        _discard_version(backend, version, manifest.path)
+        raise
+    if problems:
+        print(f"Not promoting '{version}': {'; '.join(problems)}. Deleting it; the live index is unchanged.")
+        _discard_version(backend, version, manifest.path)
+        return None
+
+    try:
+        backend.promote(version, replace_index=replace_index)
+    except Exception:
+        _discard_version(backend, version, manifest.path)
+        raise
+    print(f"Index version '{version}' is live with {summary['indexed']} documents.")
+    bump_index_generation(config["INDEX_GENERATION_PATH"])
+    # Later incremental runs update the live version through INDEX_NAME.
+    os.remove(manifest.path)
+    manifest.path, manifest.index_name = config["INDEX_MANIFEST_PATH"], config["INDEX_NAME"]
+    manifest.save()
+
+    keep = max(config.get("INDEX_VERSIONS_KEPT", 2), 1)
+    old_versions = [v for v in backend.versions() if v != version]
+    for old in old_versions[:max(len(old_versions) - (keep - 1), 0)]:
+        print(f"Deleting old index version '{old}'...")
+        backend.drop_version(old)
+    return version
 
 # --- MAIN EXECUTION BLOCK ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the sample PDFs and CSVs into Azure AI Search.")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="Re-ingest every document into a new index version and swap it in "
+                             "once it passes validation.")
+    parser.add_argument("--replace-index", action="store_true",
+                        help="With --full-rebuild on Azure, replace an unversioned index with an alias to "
+                             "the new version once; search is unavailable for a moment.")
+    parser.add_argument("--in-place", action="store_true",
+                        help="With --full-rebuild, drop and re-create the live index instead; "
+                             "search is unavailable until it is refilled.")
+    args = parser.parse_args()
+    startup_clock = StartupClock("ingest", STARTED)
+    startup_clock.mark("imports")
+
     try:
         # 1. Load all configuration and secrets
         app_config = load_config()
+        startup_clock.mark("config")
         
-        # Configure OpenAI client
+        # Configure the embedding client (OpenAI, or a local provider per EMBED_PROVIDER)
         #openai.api_type = "azure"
         #openai.api_base = app_config["OPENAI_ENDPOINT"]
         #openai.api_version = "2023-05-15"
         #openai.api_key = app_config["OPENAI_KEY"]
-        app_config["openai_client"] = OpenAI(api_key=app_config["OPENAI_KEY"])
+        app_config["openai_client"] = get_embedding_client(app_config)
+        startup_clock.mark("clients")
+        print(startup_clock.finish())
 
-        # 2. Create the search index
-        create_index(app_config)
+        source_paths = list_source_files("data/pdfs", "data/csvs")
+        if args.full_rebuild and not args.in_place:
+            # 2. Build a new index version and swap it in once it is complete
+            rebuild_index(app_config, source_paths, replace_index=args.replace_index)
+        else:
+            # 2. Create the search index, or keep the existing one for an incremental run
+            create_index(app_config, recreate=args.full_rebuild)
 
-        # 3. Ingest documents (example)
-        # Note: The 'data/contoso_policy.pdf' path is hardcoded for this example.
-        # You would typically make this more dynamic.
-        pdf_text = load_pdfs("data/pdfs")
-        pdf_chunks = chunk_text(pdf_text)
-        
-        pdf_docs = [
-            {
-                "id": str(uuid.uuid4()),
-                "content": chunk,
-                "metadata": {
-                    "source": "contoso_policy.pdf",
-                    "doc_type": "policy"
-                }
-            }
-            for chunk in pdf_chunks
-        ]
-        
-        # Example: CSV ingestion
-        csv_docs = load_csvs_from_directory("data/csvs", text_field="description")
-        all_docs = pdf_docs + csv_docs
-        
-         # Add OpenAI client to config for embedding function
-        ingest_docs(app_config, all_docs)
+            # 3. Ingest only what changed since the last run
+            manifest = IndexManifest.load(app_config["INDEX_MANIFEST_PATH"], app_config["INDEX_NAME"])
+            if args.full_rebuild:
+                manifest.files = {}
+            sync_index(app_config, source_paths, manifest)
 
     except ValueError as e:
         print(f"Configuration error: {e}")
@@ -0,0 +1,148 @@
+"""
+Coalesces concurrent query embeddings into batched upstream calls.
+
+Under load, many requests need a query embedded within the same few
+milliseconds. Rather than one `embeddings.create` call each, requests are
+collected for up to `window_s` (or until `max_batch` distinct texts are
+waiting) and sent as one batched call, and the vectors are handed back to the
+waiting requests. A text already waiting or in flight is not sent again: its
+requests share the pending result. Fewer, larger calls keep the server under
+the provider's request-rate limit and cut tail latency during bursts.
+
+Batching runs on threads, so the Flask server waits on the returned future
+directly and the async server awaits it through `asyncio.wrap_future`.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+EMBED_BATCH_INPUTS = REGISTRY.histogram(
+    "rag_embed_batch_inputs", "Distinct query texts per coalesced embeddings call.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+
+class EmbeddingMicroBatcher:
+    """
+    Collects texts submitted from many threads into batches for `embed_many`.
+
+    Args:
+        embed_many (callable): Embeds a list of texts, returning one vector
+                               per text in order, e.g.
+                               `embedding_pipeline.BatchEmbedder.embed_many`.
+        window_s (float): How long the first text of a batch waits for others.
+        max_batch (int): Distinct texts per batch; a full batch is sent at once.
+        max_concurrency (int): Batches in flight upstream at once.
+        metrics_enabled (bool): Record batch sizes in `rag_embed_batch_inputs`.
+    """
+
+    def __init__(self, embed_many, window_s=0.005, max_batch=64, max_concurrency=4, metrics_enabled=True):
+        self.embed_many = embed_many
+        self.metrics_enabled = metrics_enabled
+        self.window_s = window_s
+        self.max_batch = max(1, max_batch)
+        self.max_concurrency = max(1, max_concurrency)
+        self._queue = queue.SimpleQueue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pool = None
+        self.counters = {"requests": 0, "deduplicated": 0, "batches": 0, "inputs": 0, "errors": 0}
+
+    @classmethod
+    def from_config(cls, config, embed_many):
+        """
+        Returns a batcher configured by EMBED_COALESCE_*, or None when
+        EMBED_COALESCE_WINDOW_MS is 0 (coalescing disabled).
+        """
+        window_ms = config.get("EMBED_COALESCE_WINDOW_MS", 5.0)
+        if window_ms <= 0:
+            return None
+        return cls(
+            embed_many,
+            window_s=window_ms / 1000.0,
+            max_batch=config.get("EMBED_COALESCE_MAX_BATCH", 64),
+            max_concurrency=config.get("EMBED_COALESCE_CONCURRENCY", 4),
+            metrics_enabled=config.get("METRICS_ENABLED", True),
+        )
+
+    def submit(self, text):
+        """
+        Queues `text` for embedding.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the embedding, or raises
+            what the upstream call raised. Identical texts submitted while one
+            is pending share a future.
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+            future = self._pending.get(text)
+            if future is not None:
+                self.counters["deduplicated"] += 1
+                return future
+            future = self._pending[text] = Future()
+            if self._thread is None:
+                # Started on first use, so a server that forks workers after
+                # import gets a collector in each worker.
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                thread_name_prefix="embed-batch")
+                self._thread = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+                self._thread.start()
+        self._queue.put(text)
+        return future
+
+    def embed(self, text, timeout=None):
+        """
+        Returns the embedding of `text`, waiting for its batch.
+        """
+        return self.submit(text).result(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["pending"] = len(self._pending)
+        stats["mean_batch_inputs"] = stats["inputs"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            # Wait out the window, or until the batch is full, for more texts.
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._flush, batch)
+
+    def _flush(self, texts):
+        vectors, error = None, None
+        try:
+            if self.metrics_enabled:
+                EMBED_BATCH_INPUTS.observe(len(texts))
+            vectors = self.embed_many(texts)
+            if vectors is None or len(vectors) != len(texts):
+                raise RuntimeError(f"Expected {len(texts)} embeddings, got "
+                                   f"{'none' if vectors is None else len(vectors)}.")
+        except BaseException as e:
+            error = e
+        finally:
+            # Every waiting request must be resolved, or it would hang forever.
+            with self._lock:
+                futures = [self._pending.pop(text) for text in texts]
+                self.counters["batches"] += 1
+                self.counters["inputs"] += len(texts)
+                self.counters["errors"] += int(error is not None)
+            for i, future in enumerate(futures):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(vectors[i])
+
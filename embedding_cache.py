@@ -0,0 +1,240 @@
+"""
+Content-addressed, persistent embedding cache.
+
+Vectors are appended to a single binary file of fixed-width records, each a
+16-byte key, the token count of the embedded text and the float32 vector, and read back through a NumPy
+memory map. The key -> row index is rebuilt from the file on open, and records
+appended by other processes are picked up on the next miss, so the indexer and
+the search server can share one cache directory. Hot vectors are served from an
+in-process LRU bounded by size.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from token_counter import count_tokens
+
+KEY_BYTES = 16
+# Files written before records carried a token count; migrated on open.
+LEGACY_FILE = "embeddings-{dim}.bin"
+CACHE_FILE = "embeddings-{dim}-v2.bin"
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def make_cache_key(model_name, dimensions, text):
+    """
+    Returns the content hash identifying an embedding of `text`.
+
+    Args:
+        model_name (str): The embedding model name.
+        dimensions (int): The embedding dimension.
+        text (str): The exact text sent to the model (already preprocessed).
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest.
+    """
+    h = hashlib.blake2b(digest_size=KEY_BYTES)
+    h.update(f"{model_name}\x00{dimensions}\x00".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+class EmbeddingCache:
+    """
+    A disk-backed embedding cache with an in-memory LRU front.
+
+    Args:
+        cache_dir (str): Directory holding the cache file.
+        dim (int): Dimension of the cached vectors.
+        max_memory_bytes (int): Upper bound on vector bytes kept in the LRU.
+    """
+
+    def __init__(self, cache_dir, dim, max_memory_bytes=64 * 1024 * 1024):
+        self.dim = dim
+        self.path = os.path.join(cache_dir, CACHE_FILE.format(dim=dim))
+        self.record_dtype = np.dtype([("key", f"S{KEY_BYTES}"), ("tokens", "<u4"), ("vector", "<f4", (dim,))])
+        self.max_entries = max(1, max_memory_bytes // (dim * 4))
+
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._rows = {}
+        self._written = set()
+        self._mmap = None
+        self._indexed_rows = 0
+        self._upstream_seconds = 0.0
+        self._upstream_calls = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "saved_tokens": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._migrate(os.path.join(cache_dir, LEGACY_FILE.format(dim=dim)))
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+        # Drop a torn trailing record left by an interrupted write.
+        size = os.fstat(self._fd).st_size
+        if size % self.record_dtype.itemsize:
+            os.ftruncate(self._fd, size - size % self.record_dtype.itemsize)
+        with self._lock:
+            self._refresh_index()
+
+    def _migrate(self, legacy_path):
+        """
+        Converts a cache file without token counts, which count as 0.
+        """
+        if os.path.exists(self.path) or not os.path.exists(legacy_path):
+            return
+        legacy_dtype = np.dtype([("key", f"S{KEY_BYTES}"), ("vector", "<f4", (self.dim,))])
+        rows = os.path.getsize(legacy_path) // legacy_dtype.itemsize
+        legacy = np.fromfile(legacy_path, dtype=legacy_dtype, count=rows)
+        records = np.zeros(rows, dtype=self.record_dtype)
+        records["key"] = legacy["key"]
+        records["vector"] = legacy["vector"]
+        tmp_path = f"{self.path}.tmp"
+        records.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        os.remove(legacy_path)
+
+    def key(self, model_name, text):
+        return make_cache_key(model_name, self.dim, text)
+
+    def _refresh_index(self):
+        """
+        Maps any records appended since the last refresh. Caller holds the lock.
+        """
+        size = os.fstat(self._fd).st_size
+        rows = size // self.record_dtype.itemsize
+        if rows <= self._indexed_rows:
+            return
+        self._mmap = np.memmap(self.path, dtype=self.record_dtype, mode="r", shape=(rows,))
+        new_keys = self._mmap["key"][self._indexed_rows:rows]
+        for offset, key in enumerate(new_keys.tolist(), start=self._indexed_rows):
+            self._rows.setdefault(key, offset)
+        self._indexed_rows = rows
+
+    def _remember(self, key, vector, tokens):
+        self._lru[key] = (vector, tokens)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, key):
+        """
+        Looks up a vector by key.
+
+        Args:
+            key (bytes): A key from `key()` or `make_cache_key()`.
+
+        Returns:
+            list or None: The cached embedding, or None on a miss.
+        """
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                vector, tokens = entry
+                self._lru.move_to_end(key)
+                self.counters["memory_hits"] += 1
+            else:
+                row = self._rows.get(key)
+                if row is None:
+                    self._refresh_index()
+                    row = self._rows.get(key)
+                if row is None:
+                    self.counters["misses"] += 1
+                    return None
+                record = self._mmap[row]
+                vector = np.array(record["vector"], dtype=np.float32)
+                tokens = int(record["tokens"])
+                self._remember(key, vector, tokens)
+                self.counters["disk_hits"] += 1
+            self.counters["saved_tokens"] += tokens
+        return vector.tolist()
+
+    def put(self, key, embedding, text=None, tokens=None):
+        """
+        Stores a vector in memory and appends it to the cache file.
+
+        Args:
+            key (bytes): A key from `key()` or `make_cache_key()`.
+            embedding (list): The vector.
+            text (str): The embedded text, counted for the saved-token stats
+                        when `tokens` is not given.
+            tokens (int): The token count of the text, if already known.
+        """
+        if tokens is None:
+            tokens = count_tokens(text) if text else 0
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dim,):
+            print(f"Not caching embedding of shape {vector.shape}; cache expects ({self.dim},).")
+            return
+        record = np.zeros(1, dtype=self.record_dtype)
+        record["key"] = key
+        record["tokens"] = tokens
+        record["vector"] = vector
+        with self._lock:
+            self._remember(key, vector, tokens)
+            if key in self._rows or key in self._written:
+                return
+            # One write per record keeps O_APPEND records whole across processes.
+            os.write(self._fd, record.tobytes())
+            self._written.add(key)
+            self.counters["writes"] += 1
+
+    def observe_upstream_latency(self, seconds, calls=1):
+        """
+        Records time spent calling the embedding API on misses, so stats can
+        estimate how much latency the hits saved.
+        """
+        with self._lock:
+            self._upstream_seconds += seconds
+            self._upstream_calls += calls
+
+    def stats(self):
+        """
+        Returns hit/miss counters and derived savings.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            hits = stats["memory_hits"] + stats["disk_hits"]
+            lookups = hits + stats["misses"]
+            avg_latency = self._upstream_seconds / self._upstream_calls if self._upstream_calls else 0.0
+            stats.update({
+                "hits": hits,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+                "disk_entries": self._indexed_rows,
+                "avg_upstream_latency_s": avg_latency,
+                "estimated_latency_saved_s": hits * avg_latency,
+            })
+            return stats
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
+            self._mmap = None
+
+
+def get_embedding_cache(config):
+    """
+    Returns the process-wide cache for the configured directory and dimension.
+
+    Args:
+        config (dict): The application configuration.
+
+    Returns:
+        EmbeddingCache or None: None when EMBED_CACHE_DIR is empty (cache disabled).
+    """
+    cache_dir = config.get("EMBED_CACHE_DIR")
+    if not cache_dir:
+        return None
+    key = (os.path.abspath(cache_dir), config["EMBED_DIM"])
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(
+                cache_dir,
+                config["EMBED_DIM"],
+                max_memory_bytes=config.get("EMBED_CACHE_MEMORY_MB", 64) * 1024 * 1024,
+            )
+        return _caches[key]
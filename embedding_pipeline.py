@@ -0,0 +1,313 @@
+"""
+Batched, concurrent embedding stage for the indexer.
+
+Packs many inputs into each `embeddings.create` call, keeps several requests in
+flight at once, and backs off adaptively when the provider throttles us.
+"""
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from embedding_cache import get_embedding_cache
+from token_counter import count_tokens, truncate_to_tokens
+
+# Service limits for the OpenAI embeddings endpoint.
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300000
+MAX_TOKENS_PER_INPUT = 8191
+
+# Models that accept `dimensions` and return shortened (Matryoshka) embeddings.
+SHORTENABLE_MODEL_PREFIXES = ("text-embedding-3",)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError"}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def embedding_request_options(model_name, dimensions):
+    """
+    Returns extra `embeddings.create` arguments for the configured dimension.
+
+    text-embedding-3 models shorten their output to `dimensions`; older models
+    only produce their native size, so nothing is added for them.
+    """
+    if dimensions and model_name.startswith(SHORTENABLE_MODEL_PREFIXES):
+        return {"dimensions": dimensions}
+    return {}
+
+
+def parse_rate_limit_duration(value):
+    """
+    Parses a rate-limit reset value such as "1s", "6m0s" or "20ms" into seconds.
+
+    Args:
+        value (str): The header value. Plain numbers are treated as seconds.
+
+    Returns:
+        float or None: The duration in seconds, or None if it cannot be parsed.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers):
+    """
+    Reads the server-requested retry delay from response headers, if any.
+    """
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    return parse_rate_limit_duration(headers.get("retry-after"))
+
+
+def _error_status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def _error_headers(exc):
+    return getattr(getattr(exc, "response", None), "headers", None) or {}
+
+
+def _is_retryable(exc):
+    return (
+        _error_status_code(exc) in RETRYABLE_STATUS_CODES
+        or type(exc).__name__ in RETRYABLE_ERROR_NAMES
+    )
+
+
+class _AdaptiveLimiter:
+    """
+    Caps in-flight requests with additive-increase/multiplicative-decrease.
+
+    Every throttled response halves the allowed concurrency and can pause all
+    workers until the provider's reset time; every success grows it back.
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.pause_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                if self.in_flight < max(1, int(self.limit)):
+                    break
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False, pause=0.0):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / max(1.0, self.limit))
+            if pause and pause > 0:
+                self.pause_until = max(self.pause_until, time.monotonic() + pause)
+            self._cond.notify_all()
+
+
+class BatchEmbedder:
+    """
+    Embeds many texts with as few, and as parallel, API calls as the limits allow.
+
+    Works with any client exposing the OpenAI `embeddings.create` interface, so a
+    local fake can stand in for the real service when measuring throughput.
+    """
+
+    def __init__(self, client, model_name, max_batch_size=256, max_batch_tokens=200000,
+                 concurrency=4, max_retries=6, base_backoff=0.5, max_backoff=60.0, cache=None,
+                 dimensions=None):
+        self.client = client
+        self.cache = cache
+        self.model_name = model_name
+        self.request_options = embedding_request_options(model_name, dimensions)
+        self.max_batch_size = min(max_batch_size, MAX_INPUTS_PER_REQUEST)
+        self.max_batch_tokens = min(max_batch_tokens, MAX_TOKENS_PER_REQUEST)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._limiter = _AdaptiveLimiter(self.concurrency)
+        self._stats_lock = threading.Lock()
+        self.stats = {"inputs": 0, "cache_hits": 0, "requests": 0, "retries": 0, "throttled": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds an embedder from the application configuration.
+        """
+        return cls(
+            config["openai_client"],
+            config["OPENAI_EMBED_MODEL"],
+            max_batch_size=config.get("EMBED_BATCH_SIZE", 256),
+            max_batch_tokens=config.get("EMBED_MAX_BATCH_TOKENS", 200000),
+            concurrency=config.get("EMBED_CONCURRENCY", 4),
+            cache=get_embedding_cache(config),
+            dimensions=config.get("EMBED_DIM"),
+        )
+
+    def embed_many(self, texts):
+        """
+        Generates embeddings for a list of texts.
+
+        Args:
+            texts (list): The texts to embed.
+
+        Returns:
+            list: One embedding per input text, in input order.
+        """
+        results = [None] * len(texts)
+        if not texts:
+            return results
+
+        # Only texts missing from the cache go to the API.
+        missing = list(range(len(texts)))
+        keys = None
+        if self.cache is not None:
+            keys = [self.cache.key(self.model_name, t) for t in texts]
+            missing = []
+            for i, key in enumerate(keys):
+                results[i] = self.cache.get(key)
+                if results[i] is None:
+                    missing.append(i)
+
+        pending = [self._prepare(texts[i]) for i in missing]
+        started = time.perf_counter()
+        requests_before = self.stats["requests"]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {
+                pool.submit(self._embed_batch, batch, tokens): start
+                for start, batch, tokens in self._make_batches(pending)
+            }
+            for future in as_completed(futures):
+                start = futures[future]
+                vectors = future.result()
+                for offset, vector in enumerate(vectors, start=start):
+                    i = missing[offset]
+                    results[i] = vector
+                    if keys is not None:
+                        self.cache.put(keys[i], vector, tokens=pending[offset][1])
+
+        if self.cache is not None and pending:
+            self.cache.observe_upstream_latency(
+                time.perf_counter() - started, calls=self.stats["requests"] - requests_before)
+        with self._stats_lock:
+            self.stats["inputs"] += len(texts)
+            self.stats["cache_hits"] += len(texts) - len(pending)
+        return results
+
+    def _prepare(self, text):
+        """
+        Returns (text, token count), with the text made acceptable to the API.
+        """
+        # The API rejects empty strings and inputs over the per-input token limit.
+        # Counted in tokens: CJK text or emoji can have more tokens than characters.
+        if not text:
+            return " ", 1
+        tokens = count_tokens(text, self.model_name)
+        if tokens > MAX_TOKENS_PER_INPUT:
+            text = truncate_to_tokens(text, MAX_TOKENS_PER_INPUT, self.model_name)
+            tokens = count_tokens(text, self.model_name)
+        return text, tokens
+
+    def _make_batches(self, prepared):
+        """
+        Yields (start index, texts, token count) for contiguous, limit-respecting
+        batches of `_prepare()` results.
+        """
+        start = 0
+        batch = []
+        batch_tokens = 0
+        for i, (text, tokens) in enumerate(prepared):
+            if batch and (len(batch) >= self.max_batch_size
+                          or batch_tokens + tokens > self.max_batch_tokens):
+                yield start, batch, batch_tokens
+                start, batch, batch_tokens = i, [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield start, batch, batch_tokens
+
+    def _create(self, batch):
+        raw_api = getattr(self.client.embeddings, "with_raw_response", None)
+        if raw_api is not None:
+            raw = raw_api.create(input=batch, model=self.model_name, **self.request_options)
+            return raw.parse(), raw.headers
+        return self.client.embeddings.create(input=batch, model=self.model_name, **self.request_options), {}
+
+    def _proactive_pause(self, headers, batch_tokens):
+        """
+        Returns how long to pause when the rate-limit headers say the budget is spent.
+        """
+        if not headers:
+            return 0.0
+        try:
+            remaining_requests = int(headers.get("x-ratelimit-remaining-requests", 1))
+            remaining_tokens = int(headers.get("x-ratelimit-remaining-tokens", batch_tokens))
+        except ValueError:
+            return 0.0
+        if remaining_requests <= 0:
+            return parse_rate_limit_duration(headers.get("x-ratelimit-reset-requests")) or 0.0
+        if remaining_tokens < batch_tokens:
+            return parse_rate_limit_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0
+        return 0.0
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _embed_batch(self, batch, batch_tokens):
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            try:
+                response, headers = self._create(batch)
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self._limiter.release()
+                    raise
+                throttled = _error_status_code(e) == 429
+                delay = retry_after_seconds(_error_headers(e)) or self._backoff(attempt)
+                self._limiter.release(throttled=throttled, pause=delay if throttled else 0.0)
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                    self.stats["throttled"] += int(throttled)
+                if not throttled:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+
+            self._limiter.release(pause=self._proactive_pause(headers, batch_tokens))
+            with self._stats_lock:
+                self.stats["requests"] += 1
+            data = sorted(response.data, key=lambda d: d.index)
+            return [d.embedding for d in data]
@@ -0,0 +1,197 @@
+"""
+Embedding providers selected by EMBED_PROVIDER.
+
+    openai                 the OpenAI embeddings API (the default)
+    hashing                feature hashing of words and word pairs on the CPU;
+                           no model, no network, deterministic across processes
+    sentence-transformers  a sentence-transformers model run locally on the CPU,
+                           named by EMBED_MODEL; needs the optional
+                           `sentence-transformers` package
+
+Local providers expose the same `embeddings.create` call as `openai.OpenAI`, so
+the indexer, servers, benchmarks and eval use whichever is configured without
+knowing which. Large requests are split into EMBED_LOCAL_BATCH_SIZE inputs and
+embedded on a pool of EMBED_LOCAL_WORKERS threads. Hashing spends most of its
+time holding the GIL, so it gains little from more than one.
+
+Vectors from different providers are not comparable: switch providers with a
+full rebuild of the index. The embedding cache keys on the model name, and each
+local provider has its own default EMBED_MODEL, so cached vectors never mix.
+"""
+import itertools
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+_PAIR_MULTIPLIER = np.uint64(0x9E3779B1)
+_LOW_32_BITS = np.uint64(0xFFFFFFFF)
+
+
+class LocalEmbeddingClient:
+    """
+    Runs `embed_batch` behind an OpenAI-compatible `embeddings.create`.
+
+    Args:
+        dim (int): Dimension of the returned vectors.
+        batch_size (int): Inputs per `embed_batch` call.
+        workers (int): Threads embedding the batches of one request.
+    """
+
+    def __init__(self, dim, batch_size=64, workers=1):
+        self.dim = dim
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.embeddings = SimpleNamespace(create=self.create)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "inputs": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config["EMBED_DIM"],
+            batch_size=config.get("EMBED_LOCAL_BATCH_SIZE", 64),
+            workers=config.get("EMBED_LOCAL_WORKERS", 1),
+        )
+
+    def embed_batch(self, texts, dim):
+        """
+        Returns a (len(texts), dim) float32 array of unit vectors.
+        """
+        raise NotImplementedError
+
+    def create(self, input, model=None, dimensions=None, **kwargs):
+        """
+        Embeds one text or a list of texts, returning a response shaped like
+        the OpenAI client's.
+        """
+        texts = [input] if isinstance(input, str) else list(input)
+        dim = dimensions or self.dim
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) > 1 and self.workers > 1:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed-local")
+            vectors = list(self._pool.map(lambda batch: self.embed_batch(batch, dim), batches))
+        else:
+            vectors = [self.embed_batch(batch, dim) for batch in batches]
+        vectors = np.vstack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["inputs"] += len(texts)
+        tokens = sum(len(text.split()) for text in texts)
+        data = [SimpleNamespace(index=i, embedding=vector, object="embedding")
+                for i, vector in enumerate(vectors.tolist())]
+        return SimpleNamespace(data=data, model=model, object="list",
+                               usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+@lru_cache(maxsize=1 << 18)
+def _word_hash(word):
+    return zlib.crc32(word.encode("utf-8"))
+
+
+class HashingEmbeddingClient(LocalEmbeddingClient):
+    """
+    Embeds text by hashing its lower-cased words and adjacent word pairs into
+    `dim` signed buckets, weighting repeats by 1 + log(count).
+
+    The vectors capture lexical overlap, not meaning, but cost microseconds
+    each and are the same in every process, which suits air-gapped
+    deployments, tests, benchmarks and bulk re-indexing.
+    """
+
+    def embed_batch(self, texts, dim):
+        words = [_TOKEN.findall(text.lower()) for text in texts]
+        lengths = np.fromiter(map(len, words), dtype=np.intp, count=len(texts))
+        hashes = np.fromiter(map(_word_hash, itertools.chain.from_iterable(words)), dtype=np.uint64,
+                             count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(texts), dtype=np.uint64), lengths)
+        # Pair hashes are derived from the word hashes, so only words are
+        # hashed in Python. Pairs spanning two texts are dropped.
+        same_text = rows[:-1] == rows[1:]
+        pairs = (hashes[:-1][same_text] * _PAIR_MULTIPLIER + hashes[1:][same_text]) & _LOW_32_BITS
+        keys = np.concatenate([(rows << 32) | hashes, (rows[:-1][same_text] << 32) | pairs])
+        keys, counts = np.unique(keys, return_counts=True)
+
+        features = keys & _LOW_32_BITS
+        # The low bits pick the bucket and the top bit the sign, so colliding
+        # features tend to cancel out rather than add up.
+        signs = np.where(features & 0x80000000, 1.0, -1.0)
+        cells = (keys >> 32).astype(np.intp) * dim + (features % dim).astype(np.intp)
+        vectors = np.bincount(cells, weights=signs * (1.0 + np.log(counts)),
+                              minlength=len(texts) * dim).reshape(len(texts), dim).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        # Empty text still needs a unit vector for cosine similarity.
+        empty = norms == 0
+        vectors[empty, 0] = 1.0
+        norms[empty] = 1.0
+        return vectors / norms[:, None]
+
+
+class SentenceTransformerEmbeddingClient(LocalEmbeddingClient):
+    """
+    Embeds text with a sentence-transformers model on the CPU.
+
+    Args:
+        model_name (str): The model to load, e.g.
+                          "sentence-transformers/all-MiniLM-L6-v2".
+
+    Raises:
+        ValueError: If the model's dimension differs from `dim`.
+    """
+
+    def __init__(self, model_name, dim, batch_size=64, workers=1):
+        # Imported here so the package is only needed when this provider is used.
+        from sentence_transformers import SentenceTransformer
+
+        super().__init__(dim, batch_size, workers)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        model_dim = self.model.get_sentence_embedding_dimension()
+        if model_dim != dim:
+            raise ValueError(f"Model '{model_name}' produces {model_dim}-dimensional embeddings; "
+                             f"set EMBED_DIM={model_dim}.")
+
+    @classmethod
+    def from_config(cls, config):
+        # The model parallelizes each batch itself, so batches run one at a time.
+        return cls(config["OPENAI_EMBED_MODEL"], config["EMBED_DIM"],
+                   batch_size=config.get("EMBED_LOCAL_BATCH_SIZE", 64), workers=1)
+
+    def embed_batch(self, texts, dim):
+        if dim != self.dim:
+            raise ValueError(f"This model only produces {self.dim}-dimensional embeddings.")
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                 normalize_embeddings=True).astype(np.float32)
+
+
+PROVIDERS = {"hashing": HashingEmbeddingClient, "sentence-transformers": SentenceTransformerEmbeddingClient}
+
+
+def get_embedding_client(config, openai_client=None):
+    """
+    Returns the client that embeddings go through for EMBED_PROVIDER.
+
+    Args:
+        config (dict): The application configuration.
+        openai_client: The OpenAI client to use for the "openai" provider; one
+                       is created if not given.
+
+    Raises:
+        ValueError: If the name is not a known provider.
+    """
+    name = config.get("EMBED_PROVIDER", "openai")
+    if name == "openai":
+        if openai_client is None:
+            from openai import OpenAI
+            openai_client = OpenAI(api_key=config["OPENAI_KEY"], timeout=config.get("OPENAI_TIMEOUT_S", 60.0))
+        return openai_client
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown EMBED_PROVIDER '{name}'; expected one of {sorted(PROVIDERS) + ['openai']}.")
+    return PROVIDERS[name].from_config(config)
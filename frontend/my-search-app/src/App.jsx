@@ -12,29 +12,6 @@ const App = () => {
     setIsAppLoading(false);
   }, []);
 
-  const embedText = async (text) => {
-    try {
-      const response = await fetch('/api/embed', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ text }),
-      });
-
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(errorData.error || "Failed to generate embedding.");
-      }
-
-      const data = await response.json();
-      return data.embedding;
-    } catch (error) {
-      console.error("Error generating embedding:", error);
-      throw error;
-    }
-  };
-
   const handleSearch = async (event) => {
     event.preventDefault();
     if (!query /*|| !config*/) return;
@@ -45,36 +22,16 @@ const App = () => {
     setResults([]);
 
     try {
-      // Generate embedding for the search query via the backend
-      const queryVector = await embedText(query);
-      if (!queryVector) {
-        setError("Failed to generate embedding for the query.");
-        setLoading(false);
-        return;
-      }
-
-      // Perform the vector search by calling the new backend search endpoint
-      const searchPayload = {
-        vectorQueries: [{
-          "kind": "vector",
-          "vector": queryVector,
-          "k": 3,
-          "fields": "contentVector",
-          "exhaustive": true
-        }],
-        "select": "id, content, source, metadata",
-        "queryType": "semantic",
-        "semanticConfiguration": "my-semantic-config"
-      };
-
-      const response = await fetch('/api/search', {
+      // The backend embeds the query, searches, and streams the answer back as
+      // Server-Sent Events: "results" first, then "token"s, then "done".
+      const response = await fetch('/api/search/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          searchPayload: searchPayload,
-          query: query
+          query: query,
+          k: 3
         })
       });
 
@@ -83,15 +40,51 @@ const App = () => {
         throw new Error(`Search request failed: ${errorData.error.message || errorData.error}`);
       }
 
-      const data = await response.json();
-      const lowerAnswer = data.answer.toLowerCase();
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let streamedAnswer = '';
+      let streamedResults = [];
+
+      const handleEvent = (rawEvent) => {
+        let eventName = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) eventName = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (!data) return;
+        const payload = JSON.parse(data);
+        if (eventName === 'results') {
+          streamedResults = payload || [];
+          setResults(streamedResults);
+        } else if (eventName === 'token') {
+          streamedAnswer += payload;
+          setAnswer(streamedAnswer);
+        } else if (eventName === 'done') {
+          streamedAnswer = payload.answer;
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          handleEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+        }
+      }
+
+      const lowerAnswer = streamedAnswer.toLowerCase();
       // Handle "I don't know" and similar responses from the backend
       if (lowerAnswer.includes("i don't know.") || lowerAnswer.includes("i'm sorry")) {
         setAnswer("Sorry, I couldn't find an answer in the provided documents.");
         setResults([]);
       } else {
-        setAnswer(data.answer);
-        setResults(data.results);
+        setAnswer(streamedAnswer);
+        setResults(streamedResults);
       }
 
     } catch (err) {
@@ -0,0 +1,122 @@
+"""
+Deterministic chunk ids and a local manifest of what has been indexed.
+
+The manifest records, per source file, the file's content hash and the ids and
+content hashes of the chunks uploaded from it. Comparing it against the current
+sources tells the indexer which chunks to embed and upload and which to delete.
+"""
+import hashlib
+import json
+import os
+
+
+def content_hash(text):
+    """
+    Returns the SHA-256 hex digest of a chunk's text.
+    """
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """
+    Returns the SHA-256 hex digest of a file's bytes, read in blocks.
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_key(file_path):
+    """
+    Normalizes a file path into the key used for it in ids and the manifest.
+    """
+    return os.path.normpath(file_path).replace(os.sep, "/")
+
+
+def chunk_id(source, position, text):
+    """
+    Derives a stable document id from the source file, position and content.
+
+    The same chunk of the same file always gets the same id, so re-running the
+    indexer updates documents in place instead of duplicating them. The result
+    only uses characters that are valid in an Azure AI Search key.
+
+    Args:
+        source (str): The source key of the file the chunk came from.
+        position (int): The chunk's position (row or chunk number) in the file.
+        text (str): The chunk's content.
+
+    Returns:
+        str: A 40-character hex id.
+    """
+    h = hashlib.sha1(f"{source}\x00{position}\x00{content_hash(text)}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class IndexManifest:
+    """
+    The set of source files and chunks currently believed to be in the index.
+
+    Args:
+        path (str): Where the manifest is stored as JSON.
+        index_name (str): The index the manifest describes. A manifest written
+                          for a different index is ignored.
+    """
+
+    def __init__(self, path, index_name):
+        self.path = path
+        self.index_name = index_name
+        self.files = {}
+
+    @classmethod
+    def load(cls, path, index_name):
+        manifest = cls(path, index_name)
+        if not os.path.exists(path):
+            return manifest
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read manifest {path}, starting from scratch: {e}")
+            return manifest
+        if data.get("index_name") == index_name:
+            manifest.files = data.get("files", {})
+        else:
+            print(f"Manifest {path} belongs to index '{data.get('index_name')}', ignoring it.")
+        return manifest
+
+    def save(self):
+        """
+        Writes the manifest atomically so an interrupted run never leaves it half-written.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"index_name": self.index_name, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def file_unchanged(self, source, digest):
+        entry = self.files.get(source)
+        return entry is not None and entry.get("hash") == digest
+
+    def chunk_ids(self, source):
+        return set(self.files.get(source, {}).get("chunks", {}))
+
+    def update_file(self, source, digest, chunk_hashes):
+        """
+        Records the chunks now indexed for a source file.
+
+        Args:
+            source (str): The source key of the file.
+            digest (str): The file hash, or None to force re-processing next run.
+            chunk_hashes (dict): Maps each chunk id to its content hash.
+        """
+        self.files[source] = {"hash": digest, "chunks": dict(chunk_hashes)}
+
+    def remove_file(self, source):
+        """
+        Forgets a source file and returns the ids of the chunks it contributed.
+        """
+        return set(self.files.pop(source, {}).get("chunks", {}))
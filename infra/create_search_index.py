@@ -1,13 +1,19 @@
-import os
 import requests
-from pathlib import Path
 from utils.azure_util import load_config
+from utils.index_naming import ALIAS_API_VERSION, version_name
+
+COMPRESSION_API_VERSION = "2025-05-01-Preview"
 
 
 def create_search_index(config):
     """
-    Deletes and re-creates the Azure AI Search index using the provided configuration.
-    
+    Creates the Azure AI Search index behind an alias named INDEX_NAME, the way
+    `elt_indexer.py --full-rebuild` builds its versions.
+
+    An index or alias that already exists is left alone, so running this
+    against a live service never takes search offline. Rebuild it with
+    `python elt_indexer.py --full-rebuild` instead.
+
     Args:
         config (dict): A dictionary containing all necessary configuration values.
     """
@@ -15,14 +21,20 @@ def create_search_index(config):
         print("API key not available. Exiting index creation.")
         return
 
-    index_url = f"{config['SEARCH_ENDPOINT']}/indexes/{config['INDEX_NAME']}?api-version={config['SEARCH_API_VERSION']}"
+    compression = config.get("VECTOR_COMPRESSION", "none")
+    # Rescoring options need a newer API version than the rest of the definition.
+    api_version = config["SEARCH_API_VERSION"] if compression == "none" else COMPRESSION_API_VERSION
+    alias_name = config["INDEX_NAME"]
+    version = version_name(alias_name)
+    index_url = f"{config['SEARCH_ENDPOINT']}/indexes/{version}?api-version={api_version}"
+    alias_url = f"{config['SEARCH_ENDPOINT']}/aliases/{alias_name}?api-version={ALIAS_API_VERSION}"
     headers = {
         "Content-Type": "application/json",
         "api-key": config["SEARCH_API_KEY"]
     }
 
     index_definition = {
-      "name": config["INDEX_NAME"],
+      "name": version,
       "fields": [
         {"name": "id", "type": "Edm.String", "key": True, "searchable": False},
         {"name": "content", "type": "Edm.String", "searchable": True, "analyzer": "en.lucene"},
@@ -59,29 +71,51 @@ def create_search_index(config):
       }
     }
 
+    if compression != "none":
+        compression_definition = {
+            "name": "my-compression",
+            "kind": "scalarQuantization" if compression == "int8" else "binaryQuantization",
+            "rescoringOptions": {
+                "enableRescoring": True,
+                "defaultOversampling": config["RESCORE_OVERSAMPLING"],
+                "rescoreStorageMethod": "preserveOriginals"
+            }
+        }
+        if compression == "int8":
+            compression_definition["scalarQuantizationParameters"] = {"quantizedDataType": "int8"}
+        index_definition["vectorSearch"]["compressions"] = [compression_definition]
+        index_definition["vectorSearch"]["profiles"][0]["compression"] = "my-compression"
+
     # -------------------------------------------------------------------------
-    # 2. Delete and create the index
+    # 2. Create the index and point the alias at it, unless either exists
     # -------------------------------------------------------------------------
-    print(f"Deleting existing index '{config['INDEX_NAME']}' if it exists...")
-    del_url = f"{config['SEARCH_ENDPOINT']}/indexes/{config['INDEX_NAME']}?api-version={config['SEARCH_API_VERSION']}"
     try:
-        resp = requests.delete(del_url, headers=headers)
-        if resp.status_code not in (200, 204, 404):
-            print("Warning deleting index:", resp.status_code, resp.text)
+        for kind, url in (("Alias", alias_url),
+                          ("Index", f"{config['SEARCH_ENDPOINT']}/indexes/{alias_name}?api-version={api_version}")):
+            resp = requests.get(url, headers=headers)
+            if resp.status_code == 200:
+                print(f"{kind} '{alias_name}' already exists; leaving it in place. "
+                      f"Run 'python elt_indexer.py --full-rebuild' to rebuild it without downtime.")
+                return
     except requests.exceptions.RequestException as e:
-        print(f"Error deleting index: {e}")
+        print(f"Error checking for an existing index: {e}")
         return
-        
-    print(f"Creating new index '{config['INDEX_NAME']}'...")
+
+    print(f"Creating new index '{version}'...")
     try:
         resp = requests.put(index_url, headers=headers, json=index_definition)
+        if resp.status_code not in (200, 201):
+            print(f"Failed to create index: {resp.status_code} {resp.text}")
+            return
+        print("Index created successfully.")
+        resp = requests.put(alias_url, headers=headers, json={"name": alias_name, "indexes": [version]})
         if resp.status_code in (200, 201):
-            print("Index created successfully.")
+            print(f"Alias '{alias_name}' now points to '{version}'.")
         else:
-            print(f"Failed to create index: {resp.status_code} {resp.text}")
+            print(f"Failed to create alias: {resp.status_code} {resp.text}")
     except requests.exceptions.RequestException as e:
         print(f"Error creating index: {e}")
-        
+
 if __name__ == "__main__":
     app_config = load_config()
     create_search_index(app_config)
@@ -1,8 +1,36 @@
+import json
 import os
-from azure.keyvault.secrets import SecretClient
-from azure.identity import DefaultAzureCredential
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+# The Azure SDKs are imported on first use: they are slow to import and
+# processes that take their keys from the environment never need them.
+_credential = None
+_secret_clients = {}
+_client_lock = threading.Lock()
+
+
+def _secret_client(vault_url):
+    """
+    Returns a SecretClient for the vault, sharing one DefaultAzureCredential
+    (and its token cache) across every vault and secret in the process.
+    """
+    global _credential
+    with _client_lock:
+        if vault_url not in _secret_clients:
+            from azure.identity import DefaultAzureCredential
+            from azure.keyvault.secrets import SecretClient
+
+            if _credential is None:
+                # Use DefaultAzureCredential to automatically handle authentication.
+                # It will try multiple methods (e.g., Azure CLI, Managed Identity, etc.)
+                _credential = DefaultAzureCredential()
+            _secret_clients[vault_url] = SecretClient(vault_url=vault_url, credential=_credential)
+        return _secret_clients[vault_url]
+
+
 def get_secret_from_key_vault(vault_url, secret_name, secret_version=""):
     """
     Authenticates with Azure and retrieves a secret from Key Vault.
@@ -20,20 +48,66 @@ def get_secret_from_key_vault(vault_url, secret_name, secret_version=""):
         an error message will be printed, and None will be returned.
     """
     try:
-        # Use DefaultAzureCredential to automatically handle authentication.
-        # It will try multiple methods (e.g., Azure CLI, Managed Identity, etc.)
-        credential = DefaultAzureCredential()
-        
-        # Create a SecretClient for your Key Vault
-        client = SecretClient(vault_url=vault_url, credential=credential)
-        
         # Get the secret
-        secret = client.get_secret(secret_name, version=secret_version)
+        secret = _secret_client(vault_url).get_secret(secret_name, version=secret_version or "")
         
         return secret.value
     except Exception as ex:
         print(f"Error retrieving secret version '{secret_version}': {ex}")
         return None
+
+
+def _read_secret_cache(path, ttl_s):
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    now = time.time()
+    return {key: entry["value"] for key, entry in entries.items() if now - entry["fetched_at"] < ttl_s}
+
+
+def _write_secret_cache(path, secrets):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    tmp_path = f"{path}.tmp"
+    # Owner-only: the file holds credentials in plain text.
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({key: {"value": value, "fetched_at": now} for key, value in secrets.items()}, f)
+    os.replace(tmp_path, path)
+
+
+def get_secrets_from_key_vault(vault_url, secrets, cache_path=None, cache_ttl_s=0):
+    """
+    Retrieves several secrets from Key Vault concurrently.
+
+    Args:
+        vault_url (str): The URL of the Azure Key Vault.
+        secrets (dict): Maps a result name to a (secret_name, secret_version) pair.
+        cache_path (str): Optional file caching the values between process
+                          starts, readable by the owner only.
+        cache_ttl_s (float): Seconds a cached value is reused; 0 disables the cache.
+
+    Returns:
+        dict: Result name -> secret value, or None where retrieval failed.
+    """
+    use_cache = bool(cache_path) and cache_ttl_s > 0
+    keys = {name: f"{vault_url}|{secret_name}|{version or ''}" for name, (secret_name, version) in secrets.items()}
+    cached = _read_secret_cache(cache_path, cache_ttl_s) if use_cache else {}
+    values = {name: cached[key] for name, key in keys.items() if key in cached}
+
+    missing = [name for name in secrets if name not in values]
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            fetched = pool.map(lambda name: get_secret_from_key_vault(vault_url, *secrets[name]), missing)
+            values.update(zip(missing, fetched))
+        if use_cache and all(values[name] for name in missing):
+            _write_secret_cache(cache_path, {**cached, **{keys[name]: values[name] for name in secrets}})
+    return values
+
     
 def load_config():
     """
@@ -44,6 +118,14 @@ def load_config():
     """
     load_dotenv()
 
+    # Each embedding provider has its own default model, so their vectors are
+    # cached under different names.
+    embed_provider = os.getenv("EMBED_PROVIDER", "openai").lower()
+    default_embed_model = {
+        "hashing": "local-hashing-v1",
+        "sentence-transformers": "sentence-transformers/all-MiniLM-L6-v2",
+    }.get(embed_provider, "text-embedding-3-small")
+
     config = {
         "SEARCH_ENDPOINT": os.getenv("AZURE_SEARCH_ENDPOINT"),
         "KEY_VAULT_URL": os.getenv("AZURE_KEY_VAULT_URL"),
@@ -55,33 +137,77 @@ def load_config():
         "OPENAI_ENDPOINT": os.getenv("OPENAI_ENDPOINT"),
         "OPENAI_KEY_VAULT_NAME": os.getenv("AZURE_KEY_VAULT_OI_SECRET_NAME"),     
         "OPENAI_KEY_VAULT_SECRET_VERSION": os.getenv("AZURE_KEY_VAULT_OI_SECRET_VERSION"),
-        "OPENAI_EMBED_MODEL": os.getenv("EMBED_MODEL", "text-embedding-3-small"), 
+        "OPENAI_EMBED_MODEL": os.getenv("EMBED_MODEL", default_embed_model),
+        "EMBED_PROVIDER": embed_provider,
+        "EMBED_LOCAL_BATCH_SIZE": int(os.getenv("EMBED_LOCAL_BATCH_SIZE", "64")),
+        "EMBED_LOCAL_WORKERS": int(os.getenv("EMBED_LOCAL_WORKERS", "1")),
+        "EMBED_BATCH_SIZE": int(os.getenv("EMBED_BATCH_SIZE", "256")),
+        "EMBED_MAX_BATCH_TOKENS": int(os.getenv("EMBED_MAX_BATCH_TOKENS", "200000")),
+        "EMBED_CONCURRENCY": int(os.getenv("EMBED_CONCURRENCY", "4")),
+        "EMBED_CACHE_DIR": os.getenv("EMBED_CACHE_DIR", ".cache/embeddings"),
+        "EMBED_CACHE_MEMORY_MB": int(os.getenv("EMBED_CACHE_MEMORY_MB", "64")),
+        "EMBED_COALESCE_WINDOW_MS": float(os.getenv("EMBED_COALESCE_WINDOW_MS", "5")),
+        "EMBED_COALESCE_MAX_BATCH": int(os.getenv("EMBED_COALESCE_MAX_BATCH", "64")),
+        "EMBED_COALESCE_CONCURRENCY": int(os.getenv("EMBED_COALESCE_CONCURRENCY", "4")),
+        "INDEX_MANIFEST_PATH": os.getenv("INDEX_MANIFEST_PATH", ".cache/index_manifest.json"),
+        "INGEST_BATCH_SIZE": int(os.getenv("INGEST_BATCH_SIZE", "500")),
+        "CHUNK_TOKENS": int(os.getenv("CHUNK_TOKENS", "512")),
+        "CHUNK_OVERLAP_TOKENS": int(os.getenv("CHUNK_OVERLAP_TOKENS", "64")),
+        "PREPROCESS_FAST": os.getenv("PREPROCESS_FAST", "false").lower() == "true",
+        "PREPROCESS_WORKERS": int(os.getenv("PREPROCESS_WORKERS", "1")),
+        "LOADER_WORKERS": int(os.getenv("LOADER_WORKERS", str(os.cpu_count() or 1))),
+        "UPLOAD_WORKERS": int(os.getenv("UPLOAD_WORKERS", "4")),
+        "UPLOAD_BATCH_DOCS": int(os.getenv("UPLOAD_BATCH_DOCS", "1000")),
+        "UPLOAD_BATCH_BYTES": int(os.getenv("UPLOAD_BATCH_BYTES", str(8 * 1024 * 1024))),
+        "SEARCH_TIMEOUT_S": float(os.getenv("SEARCH_TIMEOUT_S", "10")),
+        "OPENAI_TIMEOUT_S": float(os.getenv("OPENAI_TIMEOUT_S", "60")),
+        "UPSTREAM_MAX_CONNECTIONS": int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "50")),
+        "COMPLETION_CONCURRENCY": int(os.getenv("COMPLETION_CONCURRENCY", "16")),
+        "COMPLETION_QUEUE_TIMEOUT_S": float(os.getenv("COMPLETION_QUEUE_TIMEOUT_S", "5")),
+        "ANSWER_CACHE_MAX_ENTRIES": int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+        "ANSWER_CACHE_THRESHOLD": float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        "ANSWER_CACHE_TTL_S": float(os.getenv("ANSWER_CACHE_TTL_S", "3600")),
+        "ANSWER_CACHE_VERSION_CHECK_S": float(os.getenv("ANSWER_CACHE_VERSION_CHECK_S", "30")),
+        "INDEX_VERSIONS_KEPT": int(os.getenv("INDEX_VERSIONS_KEPT", "2")),
+        "INDEX_MIN_COUNT_RATIO": float(os.getenv("INDEX_MIN_COUNT_RATIO", "0.9")),
+        "INDEX_VALIDATE_TIMEOUT_S": float(os.getenv("INDEX_VALIDATE_TIMEOUT_S", "60")),
+        "INDEX_GENERATION_PATH": os.getenv("INDEX_GENERATION_PATH", ".cache/index_generation"),
+        "RETRIEVAL_BACKEND": os.getenv("RETRIEVAL_BACKEND", "azure"),
+        "LOCAL_STORE_DIR": os.getenv("LOCAL_STORE_DIR", ".cache/vector_store"),
+        "LOCAL_STORE_MODE": os.getenv("LOCAL_STORE_MODE", "auto"),
+        "LOCAL_IVF_NPROBE": int(os.getenv("LOCAL_IVF_NPROBE", "8")),
+        "HYBRID_SEARCH": os.getenv("HYBRID_SEARCH", "false").lower() == "true",
+        "VECTOR_COMPRESSION": os.getenv("VECTOR_COMPRESSION", "none"),
+        "RESCORE_OVERSAMPLING": float(os.getenv("RESCORE_OVERSAMPLING", "4")),
+        "CONTEXT_TOKEN_BUDGET": int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+        "METRICS_ENABLED": os.getenv("METRICS_ENABLED", "true").lower() == "true",
+        "SECRET_CACHE_PATH": os.getenv("SECRET_CACHE_PATH", ""),
+        "SECRET_CACHE_TTL_S": float(os.getenv("SECRET_CACHE_TTL_S", "900")),
     }
 
-    # Add API key from Key Vault to the config
+    # Fetch the API keys from Key Vault, all at once
+    secrets = {}
     if not config["KEY_VAULT_URL"] or not config["SEARCH_SECRET_NAME"]:
         print("Please set the KEY_VAULT_URL and SECRET_NAME environment variables.")
         config["api_key"] = None
     else:
-        api_key = get_secret_from_key_vault(
-            config["KEY_VAULT_URL"], 
-            config["SEARCH_SECRET_NAME"], 
-            config["SEARCH_SECRET_VERSION"]
-        )
-        if api_key:
-            print(f"Successfully retrieved API key. Length: {len(api_key)}")
-            config["SEARCH_API_KEY"] = api_key
-        else:
-            config["SEARCH_API_KEY"] = None
-            
+        secrets["SEARCH_API_KEY"] = (config["SEARCH_SECRET_NAME"], config["SEARCH_SECRET_VERSION"])
+
     if not config["KEY_VAULT_URL"] or not config["OPENAI_KEY_VAULT_NAME"]:
         print("Please set the KEY_VAULT_URL and OPENAI_KEY_VAULT_NAME environment variables.")
         config["OPENAI_KEY"] = None
     else:
-        config["OPENAI_KEY"] = get_secret_from_key_vault(
-            config["KEY_VAULT_URL"], 
-            config["OPENAI_KEY_VAULT_NAME"],
-            config["OPENAI_KEY_VAULT_SECRET_VERSION"]
+        secrets["OPENAI_KEY"] = (config["OPENAI_KEY_VAULT_NAME"], config["OPENAI_KEY_VAULT_SECRET_VERSION"])
+
+    if secrets:
+        values = get_secrets_from_key_vault(
+            config["KEY_VAULT_URL"],
+            secrets,
+            cache_path=config["SECRET_CACHE_PATH"],
+            cache_ttl_s=config["SECRET_CACHE_TTL_S"]
         )
+        config.update(values)
+        if values.get("SEARCH_API_KEY"):
+            print(f"Successfully retrieved API key. Length: {len(values['SEARCH_API_KEY'])}")
             
     return config
@@ -0,0 +1,22 @@
+"""
+Names of blue/green index versions, shared by the indexer, the retrieval
+backends and the standalone infra scripts. Kept free of third-party imports.
+"""
+import re
+import time
+
+# Index aliases are a preview feature of the REST API.
+ALIAS_API_VERSION = "2025-05-01-Preview"
+_VERSION_SUFFIX = re.compile(r"-v\d{14}$")
+
+
+def version_name(base_name, now=None):
+    """
+    Returns the name of a new version of an index built at `now`, e.g.
+    "rag-demo-index-v20250101120000". Names sort by build time.
+    """
+    return f"{base_name}-v{time.strftime('%Y%m%d%H%M%S', time.gmtime(now))}"
+
+
+def is_version_of(name, base_name):
+    return name.startswith(f"{base_name}-v") and bool(_VERSION_SUFFIX.search(name))
@@ -0,0 +1,255 @@
+"""
+Per-stage latency metrics for the servers and the indexer.
+
+Stage durations are recorded in histograms. The servers' /metrics route serves
+them in the Prometheus text exposition format, without depending on the
+prometheus_client package. Every server response also carries a `Server-Timing`
+header with its stage durations, which browser dev tools show next to the
+request.
+
+With METRICS_ENABLED=false, timers are a shared no-op object, so each
+instrumented stage costs one method call and nothing is recorded.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = {labels: (list(value) if isinstance(value, list) else value)
+                      for labels, value in self._series.items()}
+        for labels, value in sorted(series.items()):
+            lines.extend(self._render_series(labels, value))
+        return lines
+
+    def _render_series(self, labels, value):
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._series[label_values] = value
+
+
+class Histogram(_Metric):
+    """
+    Counts observations into cumulative buckets, Prometheus style.
+
+    Args:
+        buckets (tuple): Upper bounds in seconds, ascending.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Bucket counts, then +Inf, sum and count.
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _render_series(self, labels, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), series):
+            cumulative += count
+            le = bound if bound == "+Inf" else repr(float(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-2]}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics a process exports. Each server worker process has its own.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, label_names, buckets)
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in each stage of a request or ingestion run.", ("component", "stage"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_http_request_seconds", "Time to produce each HTTP response.", ("method", "route", "status"))
+INGEST_DOCUMENTS = REGISTRY.counter(
+    "rag_ingest_documents_total", "Documents that completed each ingestion stage.", ("stage",))
+UPLOAD_QUEUE_BATCHES = REGISTRY.gauge(
+    "rag_ingest_upload_queue_batches", "Upload batches queued or in flight.")
+ANSWER_CACHE_DISABLED = REGISTRY.gauge(
+    "rag_answer_cache_disabled", "1 once the answer cache has turned itself off after a dimension mismatch.")
+STARTUP_SECONDS = REGISTRY.gauge(
+    "rag_startup_seconds", "Time each startup phase of this process took.", ("component", "phase"))
+
+
+class StageTimer:
+    """
+    Accumulates the stage durations of one request or ingestion run and
+    records each in the `rag_stage_seconds` histogram.
+
+    Args:
+        component (str): The "component" label, e.g. "search" or "ingest".
+    """
+
+    def __init__(self, component):
+        self.component = component
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, self.component, name)
+
+    def server_timing(self):
+        """
+        Returns the durations as a Server-Timing header value.
+        """
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items())
+
+    def summary(self, items):
+        """
+        Describes each stage's total time and throughput for `items` items.
+        """
+        return ", ".join(
+            f"{name} {seconds:.2f}s ({items / seconds:,.1f}/s)" if seconds else f"{name} 0.00s"
+            for name, seconds in self.durations.items()
+        )
+
+
+class StartupClock:
+    """
+    Times the startup phases of a process, such as imports, configuration and
+    client setup, into the `rag_startup_seconds` gauge.
+
+    Args:
+        component (str): The "component" label, e.g. "search" or "ingest".
+        started (float): `time.perf_counter()` when startup began, taken before
+                         the module's imports to include them.
+    """
+
+    def __init__(self, component, started=None):
+        self.component = component
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+        self._last = self.started
+
+    def mark(self, phase):
+        """
+        Ends `phase`, which began when the previous one ended.
+        """
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+        STARTUP_SECONDS.set(self.phases[phase], self.component, phase)
+
+    def finish(self):
+        """
+        Records the total and returns a one-line description of the phases.
+        """
+        total = self._last - self.started
+        STARTUP_SECONDS.set(total, self.component, "total")
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+        return f"{self.component} startup took {total:.2f}s ({phases})"
+
+
+class _NullTimer:
+    durations = {}
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def record(self, name, seconds):
+        pass
+
+    def server_timing(self):
+        return ""
+
+    def summary(self, items):
+        return ""
+
+
+NULL_TIMER = _NullTimer()
+
+
+def stage_timer(component, enabled=True):
+    """
+    Returns a StageTimer, or the shared no-op timer when metrics are disabled.
+    """
+    return StageTimer(component) if enabled else NULL_TIMER
@@ -1,22 +1,323 @@
-import pandas as pd
+"""
+Evaluates the RAG pipeline against a golden set of queries.
+
+Each query goes through the same retrieval and answer path as /api/search:
+embed (through the shared embedding cache), search the configured retrieval
+backend, pack the context and generate the answer. Queries run concurrently on
+a bounded pool, and completions are cached on disk by their exact request, so a
+re-run only pays for queries whose context or prompt changed.
+
+Two sets of numbers are reported, so a speed optimization can be judged on
+quality as well as latency:
+
+    retrieval   recall@k and MRR of the expected sources among the hits
+    answers     share of answers containing the expected answer, token F1
+    latency     p50/p95/p99 per stage and in total
+
+Cache hits skip the upstream calls, so measure latency with
+`--completion-cache ""` and an empty EMBED_CACHE_DIR. Run from the repository
+root:
+
+    python -m prompts.eval.run_eval
+    python -m prompts.eval.run_eval --concurrency 16 --k 5 --retrieval-only
+
+The golden set is a CSV with "query", "expected_answer" and "expected_source"
+columns; several expected sources are separated by ";".
+"""
+import argparse
+import hashlib
 import json
+import os
 import re
-from backend import rag_query  # assume you wrap your RAG pipeline in rag_query()
-
-df = pd.read_csv("eval/golden_set.csv")
-results = []
-
-for _, row in df.iterrows():
-    answer, sources = rag_query(row["query"])
-    match = row["expected_answer"].lower() in answer.lower()
-    source_match = row["expected_source"].lower() in " ".join(sources).lower()
-    results.append({
-        "query": row["query"],
-        "got_answer": match,
-        "got_source": source_match,
-        "answer": answer,
-        "sources": sources
-    })
-
-pd.DataFrame(results).to_csv("eval/results.csv", index=False)
-print("Evaluation complete. Results saved to eval/results.csv")
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from embedding_cache import get_embedding_cache
+from embedding_pipeline import embedding_request_options
+from embedding_providers import get_embedding_client
+from infra.utils.azure_util import load_config
+from metrics import stage_timer
+from retrieval import get_retrieval_backend
+from search_core import (
+    build_context,
+    chat_request,
+    is_exact_lookup,
+    load_prompt_template,
+    parse_search_options
+)
+from text_preprocessor import TextPreprocessor
+
+EVAL_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("embed", "search", "context", "chat", "total")
+
+_WORD = re.compile(r"\w+")
+
+
+class CompletionCache:
+    """
+    Chat completions keyed by a hash of the full request, appended to a JSON
+    lines file so they survive between runs.
+
+    Args:
+        path (str): The cache file; created on the first store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._answers = {}
+        self.counters = {"hits": 0, "misses": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a torn line from an interrupted run
+                    self._answers[entry["key"]] = entry["answer"]
+
+    @staticmethod
+    def key(request):
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            answer = self._answers.get(key)
+            self.counters["hits" if answer is not None else "misses"] += 1
+            return answer
+
+    def put(self, key, answer):
+        with self._lock:
+            self._answers[key] = answer
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "answer": answer}) + "\n")
+
+
+class EvalPipeline:
+    """
+    The /api/search query path, without the HTTP server or the answer cache.
+
+    Args:
+        config (dict): The application configuration.
+        client: An OpenAI client.
+        k (int): Hits retrieved per query.
+        completion_cache (CompletionCache): Optional cache of answers.
+        embedding_client: What queries are embedded with, from
+                          `get_embedding_client`; defaults to `client`.
+    """
+
+    def __init__(self, config, client, k=5, completion_cache=None, embedding_client=None):
+        self.config = config
+        self.client = client
+        self.embedding_client = embedding_client or client
+        self.options = parse_search_options({"k": k})
+        self.completion_cache = completion_cache
+        self.embed_model = config["OPENAI_EMBED_MODEL"]
+        self.embed_options = embedding_request_options(self.embed_model, config["EMBED_DIM"])
+        self.embedding_cache = get_embedding_cache(config)
+        self.backend = get_retrieval_backend(config)
+        self.template = load_prompt_template()
+
+    def embed(self, text, timer):
+        cache = self.embedding_cache
+        key = cache.key(self.embed_model, text) if cache else None
+        embedding = cache.get(key) if key else None
+        if embedding is None:
+            started = time.perf_counter()
+            with timer.stage("embed"):
+                response = self.embedding_client.embeddings.create(input=text, model=self.embed_model, **self.embed_options)
+            embedding = response.data[0].embedding
+            if key:
+                cache.observe_upstream_latency(time.perf_counter() - started)
+                cache.put(key, embedding, text)
+        return embedding
+
+    def retrieve(self, query, timer):
+        text = query if self.config["HYBRID_SEARCH"] else None
+        if text and is_exact_lookup(TextPreprocessor.search_tokens(query, drop_stopwords=False)):
+            with timer.stage("search"):
+                results = self.backend.search(None, text=text, **self.options)
+            if results:
+                return results
+        vector = self.embed(query, timer)
+        with timer.stage("search"):
+            return self.backend.search(vector, text=text, **self.options)
+
+    def answer(self, query, results, timer):
+        with timer.stage("context"):
+            retrieved_chunks, structured_records, citations = build_context(
+                results, self.config["CONTEXT_TOKEN_BUDGET"])
+        request = chat_request(self.template, query, retrieved_chunks, structured_records)
+        key = CompletionCache.key(request) if self.completion_cache else None
+        answer = self.completion_cache.get(key) if key else None
+        if answer is None:
+            with timer.stage("chat"):
+                response = self.client.chat.completions.create(**request)
+            answer = response.choices[0].message.content or ""
+            if key:
+                self.completion_cache.put(key, answer)
+        return answer, citations
+
+
+def _result_source(result):
+    if result.get("source"):
+        return result["source"]
+    metadata = result.get("metadata") or "{}"
+    metadata = json.loads(metadata) if isinstance(metadata, str) else metadata
+    return metadata.get("source") or ""
+
+
+def expected_sources(value):
+    return [s.strip().lower() for s in str(value or "").split(";") if s.strip()]
+
+
+def retrieval_scores(sources, expected, k):
+    """
+    Returns (recall@k, reciprocal rank) of the expected sources among the
+    ranked hit sources.
+    """
+    if not expected:
+        return None, None
+    ranked = [source.lower() for source in sources[:k]]
+    found = [e for e in expected if any(e in source for source in ranked)]
+    first = next((rank for rank, source in enumerate(ranked, 1) if any(e in source for e in expected)), None)
+    return len(found) / len(expected), (1.0 / first if first else 0.0)
+
+
+def token_f1(expected, answer):
+    """
+    SQuAD-style token overlap between the expected and generated answers.
+    """
+    expected_tokens = _WORD.findall(expected.lower())
+    answer_tokens = _WORD.findall(answer.lower())
+    if not expected_tokens or not answer_tokens:
+        return 0.0
+    remaining = list(answer_tokens)
+    common = 0
+    for token in expected_tokens:
+        if token in remaining:
+            remaining.remove(token)
+            common += 1
+    if not common:
+        return 0.0
+    precision, recall = common / len(answer_tokens), common / len(expected_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def evaluate_row(pipeline, row, k, retrieval_only=False):
+    """
+    Runs one golden-set query and scores it.
+    """
+    timer = stage_timer("eval")
+    started = time.perf_counter()
+    outcome = {"query": row["query"]}
+    try:
+        results = pipeline.retrieve(row["query"], timer)
+        sources = [_result_source(result) for result in results]
+        expected = expected_sources(row.get("expected_source"))
+        outcome["recall_at_k"], outcome["reciprocal_rank"] = retrieval_scores(sources, expected, k)
+        outcome["sources"] = sources
+        if not retrieval_only:
+            answer, citations = pipeline.answer(row["query"], results, timer)
+            expected_answer = str(row.get("expected_answer") or "")
+            outcome["answer"] = answer
+            outcome["got_answer"] = expected_answer.lower() in answer.lower()
+            outcome["answer_f1"] = token_f1(expected_answer, answer)
+            cited = " ".join(c["source"] for c in citations).lower()
+            outcome["got_source"] = any(e in cited for e in expected) if expected else None
+    except Exception as e:
+        outcome["error"] = f"{type(e).__name__}: {e}"
+    outcome["latency_s"] = time.perf_counter() - started
+    outcome["stage_s"] = dict(timer.durations, total=outcome["latency_s"])
+    return outcome
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return float(np.mean(values)) if values else None
+
+
+def summarize(outcomes, k, elapsed_s):
+    """
+    Aggregates per-query outcomes into quality and latency figures.
+    """
+    scored = [o for o in outcomes if "error" not in o]
+    summary = {
+        "queries": len(outcomes),
+        "errors": len(outcomes) - len(scored),
+        "queries_per_sec": len(outcomes) / elapsed_s if elapsed_s else None,
+        f"recall@{k}": _mean(o.get("recall_at_k") for o in scored),
+        "mrr": _mean(o.get("reciprocal_rank") for o in scored),
+    }
+    if any("answer" in o for o in scored):
+        summary["answer_accuracy"] = _mean(float(o["got_answer"]) for o in scored)
+        summary["answer_f1"] = _mean(o["answer_f1"] for o in scored)
+        summary["citation_accuracy"] = _mean(
+            float(o["got_source"]) if o["got_source"] is not None else None for o in scored)
+    latency = {}
+    for stage in STAGES:
+        durations = [o["stage_s"][stage] for o in scored if stage in o["stage_s"]]
+        if durations:
+            p50, p95, p99 = np.percentile(np.asarray(durations) * 1000, [50, 95, 99])
+            latency[stage] = {"calls": len(durations), "p50_ms": float(p50), "p95_ms": float(p95),
+                              "p99_ms": float(p99)}
+    summary["latency"] = latency
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=os.path.join(EVAL_DIR, "golden_set.csv"))
+    parser.add_argument("--output", default=os.path.join(EVAL_DIR, "results.csv"),
+                        help="Per-query results as CSV.")
+    parser.add_argument("--summary", help="Write the summary JSON here as well as to stdout.")
+    parser.add_argument("--k", type=int, default=5, help="Hits retrieved and scored per query.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Queries in flight at once.")
+    parser.add_argument("--limit", type=int, help="Evaluate only the first N queries.")
+    parser.add_argument("--retrieval-only", action="store_true", help="Skip answer generation.")
+    parser.add_argument("--completion-cache", default=".cache/eval/completions.jsonl",
+                        help='Answer cache file; "" disables it.')
+    args = parser.parse_args()
+
+    load_dotenv()
+    config = load_config()
+    # A retrieval-only run with a local embedding provider needs no OpenAI access.
+    client = None
+    if not args.retrieval_only or config["EMBED_PROVIDER"] == "openai":
+        client = OpenAI(api_key=config["OPENAI_KEY"], timeout=config["OPENAI_TIMEOUT_S"])
+    completion_cache = CompletionCache(args.completion_cache) if args.completion_cache else None
+    pipeline = EvalPipeline(config, client, k=args.k, completion_cache=completion_cache,
+                            embedding_client=get_embedding_client(config, client))
+
+    golden = pd.read_csv(args.golden).fillna("")
+    rows = golden.to_dict("records")[:args.limit]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(lambda row: evaluate_row(pipeline, row, args.k, args.retrieval_only), rows))
+    elapsed_s = time.perf_counter() - started
+
+    summary = summarize(outcomes, args.k, elapsed_s)
+    summary["caches"] = {
+        "embedding": pipeline.embedding_cache.stats() if pipeline.embedding_cache else None,
+        "completion": completion_cache.counters if completion_cache else None,
+    }
+    pd.DataFrame(outcomes).to_csv(args.output, index=False)
+    output = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    print(f"Evaluation complete. Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
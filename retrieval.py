@@ -0,0 +1,479 @@
+"""
+Retrieval backends: where the indexer writes chunks and the servers search them.
+
+RETRIEVAL_BACKEND selects one:
+
+    azure  Azure AI Search (the default).
+    local  An in-process LocalVectorStore under LOCAL_STORE_DIR, for running
+           and benchmarking the stack without the cloud.
+
+Both take optional query text alongside the vector. Azure AI Search fuses its
+full-text and vector results itself; the local backend scores the text with
+its BM25 index and fuses the two rankings with `reciprocal_rank_fusion`.
+
+Both also support blue/green rebuilds: a new version is built next to the live
+one, then the name the servers query is repointed at it in one step. On Azure
+INDEX_NAME becomes an index alias; locally a CURRENT file in LOCAL_STORE_DIR
+names the live version's directory.
+"""
+import os
+import shutil
+
+import requests
+
+from bm25_index import BM25Index
+from infra.utils.index_naming import ALIAS_API_VERSION, is_version_of, version_name
+from search_core import DEFAULT_K, DEFAULT_SELECT, build_search_payload, search_headers, search_url
+from search_uploader import BulkUploader
+from text_preprocessor import TextPreprocessor
+from vector_store import LocalStoreWriter, LocalVectorStore
+
+# File in LOCAL_STORE_DIR naming the live version's directory.
+LOCAL_POINTER_FILE = "CURRENT"
+
+# Rank constant from the original RRF paper, also used by Azure AI Search.
+RRF_K = 60
+# Hits taken from each ranking before fusion.
+HYBRID_CANDIDATES = 50
+
+
+def vector_compression(config):
+    """
+    Returns the compression configuration for VECTOR_COMPRESSION ("int8" or
+    "binary"), or None when vectors are stored uncompressed.
+
+    Original vectors are preserved so the service can rescore the
+    `RESCORE_OVERSAMPLING * k` candidates found on the compressed ones.
+    """
+    kind = config.get("VECTOR_COMPRESSION", "none")
+    if kind == "none":
+        return None
+    from azure.search.documents.indexes.models import (
+        BinaryQuantizationCompression,
+        RescoringOptions,
+        ScalarQuantizationCompression,
+        ScalarQuantizationParameters,
+    )
+
+    rescoring = RescoringOptions(
+        enable_rescoring=True,
+        default_oversampling=config.get("RESCORE_OVERSAMPLING", 4.0),
+        rescore_storage_method="preserveOriginals"
+    )
+    if kind == "int8":
+        return ScalarQuantizationCompression(
+            compression_name="my-compression",
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+            rescoring_options=rescoring
+        )
+    if kind == "binary":
+        return BinaryQuantizationCompression(compression_name="my-compression", rescoring_options=rescoring)
+    raise ValueError(f"Unknown VECTOR_COMPRESSION '{kind}'; expected none, int8 or binary.")
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges ranked lists of document ids by reciprocal rank fusion.
+
+    Args:
+        rankings (list): Lists of ids, each ordered best first.
+        k (int): The rank constant; larger values flatten the weighting.
+
+    Returns:
+        list: (doc_id, fused score) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class AliasConflictError(RuntimeError):
+    """
+    An unversioned index holds the name a version was to be promoted under.
+    """
+
+
+class RetrievalBackend:
+    """
+    The operations the indexer and the servers need from a search index.
+    """
+
+    name = None
+
+    def create_index(self, recreate=True):
+        """
+        Creates the index, dropping the existing one first when `recreate` is set.
+        """
+        raise NotImplementedError
+
+    def writer(self):
+        """
+        Returns an object with `add`, `add_many`, `delete_many`,
+        `pending_batches` and `close` methods and a `failed` dict, like
+        search_uploader.BulkUploader.
+        """
+        raise NotImplementedError
+
+    def search(self, vector, k=DEFAULT_K, filters=None, select=DEFAULT_SELECT, exhaustive=False, text=None):
+        """
+        Returns the best documents for a query, shaped like the "value" list of
+        an Azure AI Search response.
+
+        Args:
+            vector (list): The query embedding, or None for a text-only search.
+            text (str): Query text for lexical matching, or None for a
+                        vector-only search.
+        """
+        raise NotImplementedError
+
+    def count(self):
+        """
+        Returns the number of documents in the index.
+        """
+        raise NotImplementedError
+
+    def live_version(self):
+        """
+        Returns the version the servers query, or None when the index is not
+        versioned (built in place before blue/green rebuilds were used).
+        """
+        raise NotImplementedError
+
+    def versions(self):
+        """
+        Returns the names of all built versions, oldest first.
+        """
+        raise NotImplementedError
+
+    def version_config(self, version):
+        """
+        Returns the configuration that reads and writes `version` directly.
+        """
+        raise NotImplementedError
+
+    def index_blocks_alias(self):
+        """
+        Returns True when an unversioned index holds the name the servers query,
+        so `promote` cannot take it over without deleting it first.
+        """
+        return False
+
+    def promote(self, version, replace_index=False):
+        """
+        Atomically points the servers at `version`.
+
+        Args:
+            replace_index (bool): Delete an unversioned index holding the name
+                                  first; search is unavailable until the
+                                  alias exists. Used once, to migrate.
+
+        Raises:
+            AliasConflictError: If an unversioned index holds the name and
+                                `replace_index` is False.
+        """
+        raise NotImplementedError
+
+    def drop_version(self, version):
+        """
+        Deletes a version that is no longer live.
+        """
+        raise NotImplementedError
+
+
+class AzureSearchBackend(RetrievalBackend):
+    """
+    Azure AI Search, written through the REST bulk uploader and queried over REST.
+
+    Args:
+        config (dict): The application configuration.
+        session (requests.Session): Session for search requests; one is created
+                                    if not given.
+    """
+
+    name = "azure"
+
+    def __init__(self, config, session=None):
+        self.config = config
+        self.session = session
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.headers.update(search_headers(config))
+
+    def create_index(self, recreate=True):
+        # The management SDK is only needed here, so servers start without it.
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents.indexes import SearchIndexClient
+        from azure.search.documents.indexes.models import (
+            ExhaustiveKnnAlgorithmConfiguration,
+            HnswAlgorithmConfiguration,
+            SearchableField,
+            SearchField,
+            SearchFieldDataType,
+            SearchIndex,
+            SimpleField,
+            VectorSearch,
+            VectorSearchProfile,
+        )
+
+        config = self.config
+        # When INDEX_NAME is an alias, act on the index behind it.
+        search_index_name = self.live_version() or config["INDEX_NAME"]
+        index_client = SearchIndexClient(config["SEARCH_ENDPOINT"], AzureKeyCredential(config["SEARCH_API_KEY"]))
+
+        fields = [
+            SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+            SearchableField(name="content", type=SearchFieldDataType.String),
+            SearchableField(name="source", type=SearchFieldDataType.String, filterable=True),
+            SearchableField(name="doc_type", type=SearchFieldDataType.String, filterable=True),
+            SearchableField(name="metadata", type=SearchFieldDataType.String, searchable=False),
+            SearchField(
+                name="contentVector",
+                type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+                vector_search_dimensions=config["EMBED_DIM"],
+                vector_search_profile_name="my-vector-profile"
+            )
+        ]
+
+        compression = vector_compression(config)
+        vector_search = VectorSearch(
+            algorithms=[
+                HnswAlgorithmConfiguration(name="my-hnsw-vector-config-1", kind="hnsw"),
+                ExhaustiveKnnAlgorithmConfiguration(name="my-eknn-vector-config", kind="exhaustiveKnn")
+            ],
+            profiles=[
+                VectorSearchProfile(
+                    name="my-vector-profile",
+                    algorithm_configuration_name="my-hnsw-vector-config-1",
+                    compression_name=compression.compression_name if compression else None
+                )
+            ],
+            compressions=[compression] if compression else None
+        )
+
+        index = SearchIndex(name=search_index_name, fields=fields, vector_search=vector_search)
+
+        if not recreate:
+            print(f"Creating or updating index '{search_index_name}'...")
+            index_client.create_or_update_index(index)
+            print("Index is ready.")
+            return
+
+        try:
+            print(f"Deleting index '{search_index_name}'...")
+            index_client.delete_index(search_index_name)
+        except Exception as e:
+            print(f"Index '{search_index_name}' not found or error deleting. Continuing... ({e})")
+
+        print(f"Creating new index '{search_index_name}'...")
+        index_client.create_index(index)
+        print("Index created successfully.")
+
+    def writer(self):
+        return BulkUploader.from_config(self.config)
+
+    def search(self, vector, k=DEFAULT_K, filters=None, select=DEFAULT_SELECT, exhaustive=False, text=None):
+        return self.search_raw(build_search_payload(vector, k, filters, select, exhaustive, text))
+
+    def search_raw(self, payload):
+        """
+        Sends a raw search request body and returns the "value" list.
+
+        Raises:
+            requests.HTTPError: If the service rejects the request.
+        """
+        response = self.session.post(
+            search_url(self.config),
+            json=payload,
+            timeout=self.config.get("SEARCH_TIMEOUT_S", 10.0)
+        )
+        response.raise_for_status()
+        return response.json().get("value", [])
+
+    def _service_url(self, path, api_version=None):
+        return (f"{self.config['SEARCH_ENDPOINT']}/{path}"
+                f"?api-version={api_version or self.config.get('SEARCH_API_VERSION', ALIAS_API_VERSION)}")
+
+    def _request(self, method, path, api_version=None, **kwargs):
+        response = self.session.request(method, self._service_url(path, api_version),
+                                        timeout=self.config.get("SEARCH_TIMEOUT_S", 10.0), **kwargs)
+        return response
+
+    def count(self):
+        response = self._request("GET", f"indexes/{self.config['INDEX_NAME']}/docs/$count", ALIAS_API_VERSION)
+        response.raise_for_status()
+        return int(response.text.lstrip("\ufeff"))
+
+    def live_version(self):
+        response = self._request("GET", f"aliases/{self.config['INDEX_NAME']}", ALIAS_API_VERSION)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        indexes = response.json().get("indexes") or [None]
+        return indexes[0]
+
+    def versions(self):
+        response = self._request("GET", "indexes", params={"$select": "name"})
+        response.raise_for_status()
+        names = [index["name"] for index in response.json().get("value", [])]
+        return sorted(name for name in names if is_version_of(name, self.config["INDEX_NAME"]))
+
+    def version_config(self, version):
+        return {**self.config, "INDEX_NAME": version}
+
+    def index_blocks_alias(self):
+        return self._index_exists(self.config["INDEX_NAME"])
+
+    def promote(self, version, replace_index=False):
+        alias = self.config["INDEX_NAME"]
+        body = {"name": alias, "indexes": [version]}
+        response = self._request("PUT", f"aliases/{alias}", ALIAS_API_VERSION, json=body)
+        if response.status_code == 400 and self._index_exists(alias):
+            if not replace_index:
+                raise AliasConflictError(f"Index '{alias}' is not versioned, so '{version}' cannot be "
+                                         f"promoted under its name.")
+            # Queries fail between the deletion and the alias creation.
+            print(f"Replacing index '{alias}' with an alias; queries fail until the alias is created.")
+            self._request("DELETE", f"indexes/{alias}").raise_for_status()
+            response = self._request("PUT", f"aliases/{alias}", ALIAS_API_VERSION, json=body)
+        response.raise_for_status()
+
+    def _index_exists(self, name):
+        return self._request("GET", f"indexes/{name}").status_code == 200
+
+    def drop_version(self, version):
+        response = self._request("DELETE", f"indexes/{version}")
+        if response.status_code != 404:
+            response.raise_for_status()
+
+
+class LocalBackend(RetrievalBackend):
+    """
+    A LocalVectorStore and a BM25Index in LOCAL_STORE_DIR, searched in-process.
+
+    The BM25 index is only kept with HYBRID_SEARCH on; otherwise `lexical` is
+    None and queries use the vector store alone.
+    """
+
+    name = "local"
+
+    def __init__(self, config, store=None, lexical=None):
+        self.config = config
+        self.root = config["LOCAL_STORE_DIR"]
+        self.pointer_path = os.path.join(self.root, LOCAL_POINTER_FILE)
+        self._pointer_id = None
+        if store is None:
+            self._open(self._read_pointer())
+        else:
+            self.store = store
+            self.lexical = lexical or self._lexical(store)
+
+    def _read_pointer(self):
+        try:
+            st = os.stat(self.pointer_path)
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                version = f.read().strip() or None
+        except FileNotFoundError:
+            return None
+        self._pointer_id = (st.st_ino, st.st_mtime_ns)
+        return version
+
+    def _open(self, version):
+        # Unversioned stores live in LOCAL_STORE_DIR itself.
+        config = self.version_config(version) if version else self.config
+        store = LocalVectorStore.from_config(config)
+        lexical = self._lexical(store)
+        # Searches in flight keep the pair they started with.
+        self.store, self.lexical = store, lexical
+
+    def _lexical(self, store):
+        if not self.config.get("HYBRID_SEARCH"):
+            return None
+        return BM25Index(os.path.join(store.directory, "bm25"))
+
+    def _follow_pointer(self):
+        """
+        Switches to the live version if it was promoted since the last check.
+        """
+        try:
+            st = os.stat(self.pointer_path)
+        except FileNotFoundError:
+            return
+        if (st.st_ino, st.st_mtime_ns) != self._pointer_id:
+            self._open(self._read_pointer())
+
+    def create_index(self, recreate=True):
+        if recreate:
+            print(f"Clearing local vector store in '{self.store.directory}'...")
+            self.store.reset()
+            if self.lexical is not None:
+                self.lexical.reset()
+        print(f"Local vector store ready ({self.store.count()} documents).")
+
+    def writer(self):
+        return LocalStoreWriter(self.store, batch_size=self.config.get("UPLOAD_BATCH_DOCS", 1000),
+                                lexical=self.lexical)
+
+    def search(self, vector, k=DEFAULT_K, filters=None, select=DEFAULT_SELECT, exhaustive=False, text=None):
+        self._follow_pointer()
+        store, lexical = self.store, self.lexical
+        tokens = TextPreprocessor.search_tokens(text) if text and lexical is not None else []
+        if not tokens:
+            return store.search(vector, k, filters, select, exhaustive) if vector is not None else []
+
+        candidates = max(k, HYBRID_CANDIDATES)
+        lexical_ids = [doc_id for doc_id, _ in lexical.search(tokens, candidates, filters)]
+        if vector is None:
+            fused = reciprocal_rank_fusion([lexical_ids])
+        else:
+            vector_hits = store.search(vector, candidates, filters, "id", exhaustive)
+            fused = reciprocal_rank_fusion([[hit["id"] for hit in vector_hits], lexical_ids])
+        return store.documents_by_id(fused[:k], select)
+
+    def count(self):
+        self._follow_pointer()
+        return self.store.count()
+
+    def live_version(self):
+        return self._read_pointer()
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if is_version_of(name, self.config["INDEX_NAME"])
+                      and os.path.isdir(os.path.join(self.root, name)))
+
+    def version_config(self, version):
+        return {**self.config, "LOCAL_STORE_DIR": os.path.join(self.root, version)}
+
+    def promote(self, version, replace_index=False):
+        # An unversioned store is simply no longer read once CURRENT exists.
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer_path)
+        self._open(self._read_pointer())
+
+    def drop_version(self, version):
+        shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+
+
+BACKENDS = {"azure": AzureSearchBackend, "local": LocalBackend}
+
+
+def get_retrieval_backend(config, **kwargs):
+    """
+    Returns the backend named by RETRIEVAL_BACKEND.
+
+    Raises:
+        ValueError: If the name is not a known backend.
+    """
+    name = config.get("RETRIEVAL_BACKEND", "azure")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown RETRIEVAL_BACKEND '{name}'; expected one of {sorted(BACKENDS)}.")
+    return BACKENDS[name](config, **kwargs)
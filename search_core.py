@@ -0,0 +1,194 @@
+"""
+Request handling shared by the Flask server (search_server.py) and the async
+server (async_search_server.py): URLs, prompt assembly and chat parameters.
+"""
+import json
+
+from context_packer import pack_context
+
+SEARCH_QUERY_API_VERSION = "2025-05-01-Preview"
+CHAT_MODEL = "gpt-4"  # Or another appropriate chat model
+FALLBACK_ANSWER = "Sorry, I am unable to generate an answer at this time."
+# Configuration keys the /config route never echoes back to the client.
+SECRET_CONFIG_KEYS = {"SEARCH_API_KEY", "OPENAI_KEY", "api_key"}
+
+
+def load_prompt_template(path="./prompts/base_prompt.txt"):
+    """
+    Loads the prompt template used to generate answers.
+    """
+    with open(path, "r") as f:
+        return f.read()
+
+
+def search_url(config):
+    """
+    Returns the REST URL for querying the configured index.
+    """
+    return (f"{config['SEARCH_ENDPOINT']}/indexes/{config['INDEX_NAME']}"
+            f"/docs/search?api-version={SEARCH_QUERY_API_VERSION}")
+
+
+def search_headers(config):
+    return {
+        'Content-Type': 'application/json',
+        'api-key': config.get("SEARCH_API_KEY") or ""
+    }
+
+
+def build_context(results, max_tokens=None):
+    """
+    Turns search hits into the prompt's context text and structured records,
+    packed under a token budget by `context_packer.pack_context`.
+
+    Args:
+        results (list): The "value" list of a search response.
+        max_tokens (int): Token budget for the context; None packs every
+                          distinct hit.
+
+    Returns:
+        tuple: (retrieved_chunks, structured_records, citations).
+    """
+    context = pack_context(results, max_tokens, CHAT_MODEL)
+    return context["chunks"], context["records"], context["citations"]
+
+
+def chat_request(template, query, retrieved_chunks, structured_records):
+    """
+    Builds the keyword arguments for `chat.completions.create`.
+    """
+    # Format the prompt with the retrieved data
+    prompt = template.format(
+        retrieved_chunks=retrieved_chunks,
+        structured_records=json.dumps(structured_records),
+        query=query
+    )
+    return {
+        "model": CHAT_MODEL,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 500,
+    }
+
+
+FILTERABLE_FIELDS = ("source", "doc_type")
+DEFAULT_SELECT = "id, content, source, metadata"
+DEFAULT_K = 3
+MAX_K = 50
+
+
+def parse_search_options(data):
+    """
+    Validates the query options a client may send instead of a raw payload.
+
+    Args:
+        data (dict): The request body. Recognized keys are "k", "filters" (a
+                     mapping of filterable field to string value), "select" and
+                     "exhaustive".
+
+    Returns:
+        dict: Keyword arguments for `build_search_payload`.
+
+    Raises:
+        ValueError: If an option is malformed.
+    """
+    try:
+        k = int(data.get("k", DEFAULT_K))
+    except (TypeError, ValueError):
+        raise ValueError("'k' must be an integer.")
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"'k' must be between 1 and {MAX_K}.")
+
+    filters = data.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise ValueError("'filters' must be an object.")
+    unknown = set(filters) - set(FILTERABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot filter on {sorted(unknown)}; filterable fields are {list(FILTERABLE_FIELDS)}.")
+    for field, value in filters.items():
+        if not isinstance(value, str):
+            raise ValueError(f"Filter value for '{field}' must be a string.")
+
+    select = data.get("select") or DEFAULT_SELECT
+    if not isinstance(select, str):
+        raise ValueError("'select' must be a comma-separated string.")
+
+    return {"k": k, "filters": filters, "select": select, "exhaustive": bool(data.get("exhaustive", False))}
+
+
+def build_filter(filters):
+    """
+    Builds an OData filter such as "source eq 'a.pdf' and doc_type eq 'policy'".
+    """
+    clauses = []
+    for field, value in sorted(filters.items()):
+        escaped = str(value).replace("'", "''")
+        clauses.append(f"{field} eq '{escaped}'")
+    return " and ".join(clauses) or None
+
+
+def build_search_payload(vector, k=DEFAULT_K, filters=None, select=DEFAULT_SELECT, exhaustive=False, text=None):
+    """
+    Builds the search request body for a query embedding, query text, or both.
+
+    With both, Azure AI Search runs a hybrid query: full-text and vector
+    results are merged by reciprocal rank fusion on the service.
+    """
+    payload = {"select": select, "top": k}
+    if vector is not None:
+        payload["vectorQueries"] = [{
+            "kind": "vector",
+            "vector": vector,
+            "k": k,
+            "fields": "contentVector",
+            "exhaustive": exhaustive
+        }]
+    if text:
+        payload["search"] = text
+        payload["searchFields"] = "content"
+    odata_filter = build_filter(filters or {})
+    if odata_filter:
+        payload["filter"] = odata_filter
+    return payload
+
+
+def is_exact_lookup(tokens):
+    """
+    Returns True when every query token looks like an identifier, such as a
+    product code ("abc123") or SKU number, which lexical search answers
+    without embedding the query.
+
+    Args:
+        tokens (list): Tokens from `TextPreprocessor.search_tokens`. Stopwords
+                       need not be dropped; having no digits, they already
+                       make the query a non-lookup.
+    """
+    return bool(tokens) and all(len(t) >= 3 and any(c.isdigit() for c in t) for t in tokens)
+
+
+class SearchRequestError(Exception):
+    """
+    A search request the server cannot serve, with the HTTP status to return.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    # Stop reverse proxies from buffering the stream.
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event, data):
+    """
+    Formats one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,32 +1,128 @@
-import json
+import time
+
+# Taken before the other imports so the startup time includes them.
+STARTED = time.perf_counter()
+
+import httpx
 import openai
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
 from infra.utils.azure_util import load_config
+from answer_cache import AnswerCache, cache_scope
+from embedding_batcher import EmbeddingMicroBatcher
+from embedding_cache import get_embedding_cache
+from embedding_pipeline import embedding_request_options
+from embedding_providers import get_embedding_client
+from metrics import CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, StartupClock, stage_timer
+from retrieval import get_retrieval_backend
+from text_preprocessor import TextPreprocessor
+from search_core import (
+    FALLBACK_ANSWER,
+    SECRET_CONFIG_KEYS,
+    SSE_HEADERS,
+    SearchRequestError,
+    build_context,
+    chat_request,
+    is_exact_lookup,
+    load_prompt_template,
+    parse_search_options,
+    search_headers,
+    sse_event
+)
 
 
 # Initialize the Flask application
 app = Flask(__name__)
 CORS(app) # Enable CORS for all routes
+startup_clock = StartupClock("search", STARTED)
+startup_clock.mark("imports")
 
 # Load environment variables from the .env file in the root directory
 load_dotenv()
 config_data = load_config()
+startup_clock.mark("config")
 
-# Configure OpenAI client
-openai_client = openai.OpenAI(api_key=config_data["OPENAI_KEY"])
+# Configure OpenAI client with a bounded keep-alive connection pool
+openai_client = openai.OpenAI(
+    api_key=config_data["OPENAI_KEY"],
+    timeout=config_data["OPENAI_TIMEOUT_S"],
+    http_client=openai.DefaultHttpxClient(limits=httpx.Limits(
+        max_connections=config_data["UPSTREAM_MAX_CONNECTIONS"],
+        max_keepalive_connections=config_data["UPSTREAM_MAX_CONNECTIONS"]
+    ))
+)
+# Embeddings go through OpenAI or a local provider, per EMBED_PROVIDER
+embedding_client = get_embedding_client(config_data, openai_client)
 embed_model = config_data["OPENAI_EMBED_MODEL"]
+embed_options = embedding_request_options(embed_model, config_data["EMBED_DIM"])
+embedding_cache = get_embedding_cache(config_data)
+
+
+def _embed_texts(texts):
+    """
+    Embeds a batch of coalesced queries with one upstream call.
+    """
+    response = embedding_client.embeddings.create(input=texts, model=embed_model, **embed_options)
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+# Concurrent query embeddings share batched upstream calls
+embed_batcher = EmbeddingMicroBatcher.from_config(config_data, _embed_texts)
+
+# Reuse TLS connections to the search service across requests
+search_session = requests.Session()
+search_session.mount("https://", HTTPAdapter(pool_maxsize=config_data["UPSTREAM_MAX_CONNECTIONS"]))
+search_session.mount("http://", HTTPAdapter(pool_maxsize=config_data["UPSTREAM_MAX_CONNECTIONS"]))
+search_session.headers.update(search_headers(config_data))
+retrieval_backend = get_retrieval_backend(config_data, **(
+    {"session": search_session} if config_data["RETRIEVAL_BACKEND"] == "azure" else {}
+))
+answer_cache = AnswerCache.from_config(config_data, retrieval_backend)
 
 # Load the prompt template from the base_prompt.txt file
-with open("./prompts/base_prompt.txt", "r") as f:
-    PROMPT_TEMPLATE = f.read()
+PROMPT_TEMPLATE = load_prompt_template()
+startup_clock.mark("clients")
+if config_data["HYBRID_SEARCH"] and config_data["RETRIEVAL_BACKEND"] == "local":
+    # The local BM25 index drops stopwords from queries. Load them now, so a
+    # missing NLTK corpus fails the start instead of the first query.
+    TextPreprocessor.stopword_set()
+    startup_clock.mark("nltk")
+print(startup_clock.finish())
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    g.timer = stage_timer("search", config_data["METRICS_ENABLED"])
+
+
+@app.after_request
+def record_timing(response):
+    if config_data["METRICS_ENABLED"] and "timer" in g:
+        total = time.perf_counter() - g.started
+        timing = g.timer.server_timing()
+        response.headers["Server-Timing"] = f"{timing + ', ' if timing else ''}total;dur={total * 1000:.1f}"
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(total, request.method, route, str(response.status_code))
+    return response
+
 
 @app.route('/config', methods=['GET'])
 def get_config():
+    # Never echo credentials back to the client.
+    return jsonify({key: value for key, value in config_data.items() if key not in SECRET_CONFIG_KEYS})
 
-    return jsonify(config_data)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Serves request and stage latency histograms in the Prometheus text format.
+    """
+    if not config_data["METRICS_ENABLED"]:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
 
 # You can add a simple route to serve the static frontend files
 @app.route('/')
@@ -38,10 +134,34 @@ def serve_static(path):
     return send_from_directory('dist', path)
 
 
+def _embed_query(text):
+    """
+    Embeds a query, serving repeated queries from the embedding cache.
+    """
+    key = embedding_cache.key(embed_model, text) if embedding_cache else None
+    embedding = embedding_cache.get(key) if key else None
+    if embedding is None:
+        started = time.perf_counter()
+        with g.timer.stage("embed"):
+            if embed_batcher:
+                embedding = embed_batcher.embed(text)
+            else:
+                response = embedding_client.embeddings.create(
+                    input=text,
+                    model=embed_model,
+                    **embed_options
+                )
+                embedding = response.data[0].embedding
+        if key:
+            embedding_cache.observe_upstream_latency(time.perf_counter() - started)
+            embedding_cache.put(key, embedding, text)
+    return embedding
+
+
 @app.route('/api/embed', methods=['POST'])
 def embed_text():
     """
-    Endpoint to generate an embedding for a given text using OpenAI.
+    Endpoint to generate an embedding for a given text with the configured provider.
     This protects the OpenAI API key by keeping it on the backend.
     """
     data = request.get_json()
@@ -51,102 +171,212 @@ def embed_text():
         return jsonify({"error": "No text provided"}), 400
 
     try:
-        response = openai_client.embeddings.create(
-            input=text,
-            model=embed_model,
-        )
-        embedding = response.data[0].embedding
-        return jsonify({"embedding": embedding})
+        return jsonify({"embedding": _embed_query(text)})
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return jsonify({"error": "Failed to generate embedding"}), 500
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Returns hit/miss counters for the server's caches and the embedding
+    batcher's coalescing counters.
+    """
+    return jsonify({
+        "embedding": embedding_cache.stats() if embedding_cache else None,
+        "answer": answer_cache.stats() if answer_cache else None,
+        "embed_batcher": embed_batcher.stats() if embed_batcher else None,
+    })
+
+
 def _generate_answer(query, retrieved_chunks, structured_records):
     """
     Generates an answer using the provided context and prompt template.
     """
-    # Format the prompt with the retrieved data
-    prompt = PROMPT_TEMPLATE.format(
-        retrieved_chunks=retrieved_chunks,
-        structured_records=json.dumps(structured_records),
-        query=query
-    )
-    
     # Use the OpenAI API to get a completion
     try:
         response = openai_client.chat.completions.create(
-            model="gpt-4",  # Or another appropriate chat model
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=500
+            **chat_request(PROMPT_TEMPLATE, query, retrieved_chunks, structured_records)
         )
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error generating answer from OpenAI: {e}")
-        return "Sorry, I am unable to generate an answer at this time."
+        return FALLBACK_ANSWER
     
 
+def _stream_answer(query, retrieved_chunks, structured_records):
+    """
+    Yields the answer text as the model generates it.
+    """
+    stream = openai_client.chat.completions.create(
+        stream=True,
+        **chat_request(PROMPT_TEMPLATE, query, retrieved_chunks, structured_records)
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _search(vector, options, text=None, payload=None):
+    """
+    Queries the retrieval backend, or sends `payload` as a raw Azure request.
+    """
+    try:
+        with g.timer.stage("search"):
+            if payload is not None:
+                return retrieval_backend.search_raw(payload)
+            return retrieval_backend.search(vector, text=text, **options)
+    except requests.HTTPError as e:
+        raise SearchRequestError(e.response.text, e.response.status_code)
+
+
+def _retrieve(data):
+    """
+    Validates a search request and runs the search, unless the answer cache
+    already holds a response for the query.
+
+    Clients normally send just the query text and options ("k", "filters",
+    "select"); the query is embedded here and the vector query built
+    server-side. A raw Azure Search request body may be passed as
+    "searchPayload" instead.
+
+    Returns:
+        dict: "query", "cached" (a cached response body or None), "results"
+              and "cache_entry" (what `_cache_answer` needs to store the answer).
+
+    Raises:
+        SearchRequestError: If the request is invalid or the search fails.
+    """
+    search_payload = data.get('searchPayload')
+    query = data.get('query')
+
+    if not query:
+        raise SearchRequestError("No query provided.")
+
+    if search_payload:
+        if retrieval_backend.name != "azure":
+            raise SearchRequestError("searchPayload requires the azure retrieval backend.")
+        results = _search(None, None, payload=search_payload)
+        return {"query": query, "cached": None, "results": results, "cache_entry": None}
+
+    try:
+        options = parse_search_options(data)
+    except ValueError as e:
+        raise SearchRequestError(str(e))
+
+    text = query if config_data["HYBRID_SEARCH"] else None
+    if text and is_exact_lookup(TextPreprocessor.search_tokens(query, drop_stopwords=False)):
+        # Identifier lookups resolve lexically, without embedding the query.
+        results = _search(None, options, text)
+        if results:
+            return {"query": query, "cached": None, "results": results, "cache_entry": None}
+
+    query_vector = _embed_query(query)
+    cache_entry = None
+    if answer_cache:
+        scope = cache_scope(options)
+        with g.timer.stage("cache"):
+            cached = answer_cache.lookup(query_vector, scope)
+        if cached:
+            return {"query": query, "cached": cached}
+        cache_entry = (query_vector, scope, time.perf_counter())
+
+    results = _search(query_vector, options, text)
+    return {"query": query, "cached": None, "results": results, "cache_entry": cache_entry}
+
+
+def _cache_answer(retrieval, body):
+    if retrieval["cache_entry"] and body["answer"] != FALLBACK_ANSWER:
+        query_vector, scope, started = retrieval["cache_entry"]
+        answer_cache.store(query_vector, scope, body, time.perf_counter() - started)
+
+
 @app.route('/api/search', methods=['POST'])
 def search_documents():
     """
-    Performs a vector search on the Azure AI Search index.
-    The search key is used securely on the backend.
+    Performs a vector search on the Azure AI Search index and answers the query.
+    The search key is used securely on the backend. See `_retrieve` for the
+    request format.
     """
     try:
-        data = request.get_json()
-        search_payload = data.get('searchPayload')
-        
-        query = data.get('query')
-        
-        if not search_payload:
-            return jsonify({"error": "No search payload provided."}), 400
-        
-        if not query:
-            return jsonify({"error": "No query provided."}), 400
-
-        search_endpoint = config_data["SEARCH_ENDPOINT"]
-        index_name = config_data["INDEX_NAME"]
-        search_key = config_data["SEARCH_API_KEY"]
-        
-        search_url = f"{search_endpoint}/indexes/{index_name}/docs/search?api-version=2025-05-01-Preview"
-        print(f"Search URL: {search_url}")
-        print(f"search key: {search_key}")
-        response = requests.post(
-            search_url,
-            headers={
-                'Content-Type': 'application/json',
-                'api-key': search_key
-            },
-            json=search_payload
-        )
+        retrieval = _retrieve(request.get_json())
+        if retrieval["cached"]:
+            return jsonify(retrieval["cached"])
 
-        if not response.ok:
-            return jsonify({"error": response.text}), response.status_code
-
-        search_results = response.json()
-        
-        retrieved_chunks = ""
-        structured_records = []
-        
-        for result in search_results.get("value", []):
-            retrieved_chunks += f"Document ID: {result.get('id')}\n"
-            retrieved_chunks += f"Content: {result.get('content')}\n"
-            retrieved_chunks += f"Source: {result.get('source')}\n\n"
-            
-            # Assuming 'metadata' is a stringified JSON object
-            metadata = json.loads(result.get('metadata', '{}'))
-            structured_records.append(metadata)
+        results = retrieval["results"]
+        with g.timer.stage("context"):
+            retrieved_chunks, structured_records, citations = build_context(results, config_data["CONTEXT_TOKEN_BUDGET"])
 
         # Generate the final answer using the retrieved context and the query
-        final_answer = _generate_answer(query, retrieved_chunks, structured_records)
+        with g.timer.stage("chat"):
+            final_answer = _generate_answer(retrieval["query"], retrieved_chunks, structured_records)
 
-        return jsonify({"answer": final_answer, "results": search_results.get("value")})
+        body = {"answer": final_answer, "results": results, "citations": citations}
+        _cache_answer(retrieval, body)
+        return jsonify(body)
 
+    except SearchRequestError as e:
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/search/stream', methods=['POST'])
+def search_documents_stream():
+    """
+    Streaming variant of /api/search using Server-Sent Events.
+
+    Sends a "results" event with the search hits as soon as they arrive, then
+    a "token" event per piece of answer text as it is generated, and finally a
+    "done" event with the whole answer and its citations.
+    """
+    try:
+        retrieval = _retrieve(request.get_json())
+    except SearchRequestError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Headers, and with them Server-Timing, are sent before the answer is
+    # generated, so generation is only recorded in the histograms.
+    timer = g.timer
+
+    def events():
+        cached = retrieval["cached"]
+        if cached:
+            yield sse_event("results", cached["results"])
+            yield sse_event("token", cached["answer"])
+            yield sse_event("done", {"answer": cached["answer"], "citations": cached.get("citations", [])})
+            return
+
+        results = retrieval["results"]
+        yield sse_event("results", results)
+        with timer.stage("context"):
+            retrieved_chunks, structured_records, citations = build_context(results, config_data["CONTEXT_TOKEN_BUDGET"])
+
+        answer = ""
+        failed = False
+        started = time.perf_counter()
+        try:
+            for text in _stream_answer(retrieval["query"], retrieved_chunks, structured_records):
+                if not answer:
+                    timer.record("chat_first_token", time.perf_counter() - started)
+                answer += text
+                yield sse_event("token", text)
+            timer.record("chat", time.perf_counter() - started)
+        except Exception as e:
+            print(f"Error streaming answer from OpenAI: {e}")
+            failed = True
+            if not answer:
+                answer = FALLBACK_ANSWER
+                yield sse_event("token", answer)
+
+        if not failed:
+            _cache_answer(retrieval, {"answer": answer, "results": results, "citations": citations})
+        yield sse_event("done", {"answer": answer, "citations": citations})
+
+    return Response(stream_with_context(events()), headers=SSE_HEADERS)
     
 
 if __name__ == '__main__':
@@ -0,0 +1,244 @@
+"""
+Bounded, parallel, retrying bulk uploads to an Azure AI Search index.
+
+Talks to the index's REST `docs/index` endpoint directly, so a local HTTP
+stand-in (see benchmarks/fakes.py) can replace the real service in tests and
+benchmarks.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Service limits for one indexing request.
+MAX_DOCS_PER_BATCH = 1000
+MAX_BYTES_PER_BATCH = 16 * 1024 * 1024
+
+# Per-document status codes Azure AI Search documents as transient.
+RETRYABLE_DOC_STATUS = {409, 422, 429, 503}
+RETRYABLE_HTTP_STATUS = {429, 500, 502, 503, 504}
+
+
+class BulkUploader:
+    """
+    Sends documents to a search index in size- and count-bounded batches.
+
+    Batches are sent by a small worker pool. `add()` blocks while
+    `max_pending_batches` batches are queued or in flight, which slows the
+    producer (the embedding stage) down to the rate the service accepts. When a
+    request partially succeeds, only the failed keys with transient errors are
+    retried.
+
+    Args:
+        endpoint (str): The search service endpoint.
+        index_name (str): The target index.
+        api_key (str): The admin API key.
+        api_version (str): The REST API version.
+        workers (int): Batches uploaded concurrently.
+        max_batch_docs (int): Maximum documents per request.
+        max_batch_bytes (int): Maximum JSON body size per request.
+        max_pending_batches (int): Batches queued or in flight before `add()` blocks.
+        max_retries (int): Attempts per document before it is reported as failed.
+        timeout (float): Seconds to wait for each request.
+    """
+
+    def __init__(self, endpoint, index_name, api_key, api_version, workers=4,
+                 max_batch_docs=MAX_DOCS_PER_BATCH, max_batch_bytes=8 * 1024 * 1024,
+                 max_pending_batches=None, max_retries=5, timeout=60.0):
+        self.url = f"{endpoint}/indexes/{index_name}/docs/index?api-version={api_version}"
+        self.max_batch_docs = min(max_batch_docs, MAX_DOCS_PER_BATCH)
+        self.max_batch_bytes = min(max_batch_bytes, MAX_BYTES_PER_BATCH)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        self._session.headers.update({"Content-Type": "application/json", "api-key": api_key})
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending_batches or workers * 2)
+        self._futures = []
+        self._batch = []
+        self._batch_bytes = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.stats = {"succeeded": 0, "failed": 0, "requests": 0, "retried_docs": 0, "batches": 0}
+        self.failed = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds an uploader for the configured index.
+        """
+        return cls(
+            config["SEARCH_ENDPOINT"],
+            config["INDEX_NAME"],
+            config["SEARCH_API_KEY"],
+            config["SEARCH_API_VERSION"],
+            workers=config.get("UPLOAD_WORKERS", 4),
+            max_batch_docs=config.get("UPLOAD_BATCH_DOCS", MAX_DOCS_PER_BATCH),
+            max_batch_bytes=config.get("UPLOAD_BATCH_BYTES", 8 * 1024 * 1024),
+        )
+
+    def add(self, doc, action="mergeOrUpload"):
+        """
+        Queues one document, sending the current batch first if it is full.
+
+        Args:
+            doc (dict): The document; must contain "id".
+            action (str): The indexing action, e.g. "mergeOrUpload" or "delete".
+        """
+        action_doc = {"@search.action": action, **doc}
+        size = len(json.dumps(action_doc)) + 1
+        if self._batch and (len(self._batch) >= self.max_batch_docs
+                            or self._batch_bytes + size > self.max_batch_bytes):
+            self._send_current()
+        self._batch.append(action_doc)
+        self._batch_bytes += size
+
+    def add_many(self, docs, action="mergeOrUpload"):
+        for doc in docs:
+            self.add(doc, action)
+
+    def delete_many(self, doc_ids):
+        for doc_id in doc_ids:
+            self.add({"id": doc_id}, action="delete")
+
+    def _send_current(self):
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        # Backpressure: wait for a free slot before queueing another batch.
+        self._slots.acquire()
+        future = self._pool.submit(self._upload_batch, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+        self._futures = [f for f in self._futures if not f.done() or f.exception()]
+
+    def pending_batches(self):
+        """
+        Returns the number of batches queued or in flight.
+        """
+        return sum(1 for future in self._futures if not future.done())
+
+    def flush(self):
+        """
+        Sends any partial batch and waits for every queued batch to finish.
+        """
+        if self._batch:
+            self._send_current()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """
+        Flushes, shuts the worker pool down and returns the final stats.
+        """
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown()
+            self._session.close()
+        return self.report()
+
+    def report(self):
+        """
+        Returns upload counters with the overall docs/sec rate.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        elapsed = time.perf_counter() - self._started
+        stats["elapsed_s"] = elapsed
+        stats["docs_per_sec"] = stats["succeeded"] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def _post(self, batch):
+        with self._lock:
+            self.stats["requests"] += 1
+        return self._session.post(self.url, data=json.dumps({"value": batch}), timeout=self.timeout)
+
+    def _upload_batch(self, batch):
+        attempt = 0
+        while batch:
+            try:
+                response = self._post(batch)
+            except requests.exceptions.RequestException as e:
+                response, error = None, str(e)
+
+            if response is not None and response.status_code == 413 and len(batch) > 1:
+                # Too large for the service: split it and send the halves.
+                middle = len(batch) // 2
+                self._upload_batch(batch[:middle])
+                batch = batch[middle:]
+                continue
+
+            if response is None or response.status_code in RETRYABLE_HTTP_STATUS:
+                if response is not None:
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if attempt >= self.max_retries:
+                    self._record_failures(batch, error)
+                    return
+                delay = self._backoff(attempt, response.headers.get("Retry-After") if response is not None else None)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code not in (200, 207):
+                self._record_failures(batch, f"HTTP {response.status_code}: {response.text[:200]}")
+                return
+
+            batch = self._retryable_failures(batch, response.json().get("value", []), attempt)
+            if batch:
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+
+        with self._lock:
+            self.stats["batches"] += 1
+
+    def _retryable_failures(self, batch, results, attempt):
+        """
+        Counts the outcome of each document and returns those worth retrying.
+
+        Documents the response says nothing about are retried too, and
+        recorded as failed once the retries run out, so none is lost silently.
+        """
+        by_key = {doc["id"]: doc for doc in batch}
+        retry = []
+        succeeded = 0
+        for result in results:
+            key = result.get("key")
+            doc = by_key.pop(key, None)
+            if result.get("status"):
+                succeeded += 1
+            elif result.get("statusCode") in RETRYABLE_DOC_STATUS and attempt < self.max_retries and doc:
+                retry.append(doc)
+            else:
+                self._record_failures([doc or {"id": key}], result.get("errorMessage"))
+        if by_key:
+            if attempt < self.max_retries:
+                retry.extend(by_key.values())
+            else:
+                self._record_failures(list(by_key.values()), "Missing from the indexing response.")
+        with self._lock:
+            self.stats["succeeded"] += succeeded
+            self.stats["retried_docs"] += len(retry)
+        return retry
+
+    def _record_failures(self, docs, error):
+        with self._lock:
+            for doc in docs:
+                self.failed[doc["id"]] = error
+            self.stats["failed"] += len(docs)
+        print(f"Failed to index {len(docs)} documents: {error}")
@@ -0,0 +1,12 @@
+import pytest
+
+from text_preprocessor import TextPreprocessor
+
+# A few English stopwords, so tests need no NLTK corpus download.
+STOPWORDS = frozenset({"a", "an", "and", "are", "is", "of", "the", "to", "what"})
+
+
+@pytest.fixture
+def stopwords(monkeypatch):
+    monkeypatch.setattr(TextPreprocessor, "_stopwords", STOPWORDS)
+    return STOPWORDS
@@ -0,0 +1,112 @@
+import itertools
+
+import pytest
+import requests
+
+import elt_indexer
+from benchmarks.fakes import FakeOpenAIClient, FakeSearchService
+from infra.utils.index_naming import ALIAS_API_VERSION, version_name
+from retrieval import get_retrieval_backend
+from search_uploader import BulkUploader
+
+INDEX = "docs"
+
+
+def _write_csv(path, rows):
+    path.write_text("name,description\n" + "".join(f"item{i},Item {i} is a useful widget.\n" for i in range(rows)))
+    return str(path)
+
+
+@pytest.fixture
+def service():
+    with FakeSearchService() as service:
+        yield service
+
+
+@pytest.fixture
+def config(service, tmp_path, monkeypatch, stopwords):
+    def create_index(cfg, recreate=True):
+        url = f"{cfg['SEARCH_ENDPOINT']}/indexes/{cfg['INDEX_NAME']}?api-version={ALIAS_API_VERSION}"
+        requests.put(url, json={"name": cfg["INDEX_NAME"]}).raise_for_status()
+
+    # One version per rebuild, however fast they follow each other.
+    clock = itertools.count(1_800_000_000)
+    monkeypatch.setattr(elt_indexer, "create_index", create_index)
+    monkeypatch.setattr(elt_indexer, "version_name", lambda name: version_name(name, next(clock)))
+    return {
+        "RETRIEVAL_BACKEND": "azure",
+        "SEARCH_ENDPOINT": service.endpoint,
+        "INDEX_NAME": INDEX,
+        "SEARCH_API_KEY": "key",
+        "SEARCH_API_VERSION": "2024-07-01",
+        "EMBED_DIM": 8,
+        "OPENAI_EMBED_MODEL": "text-embedding-3-small",
+        "openai_client": FakeOpenAIClient(dim=8, latency_s=0.0, per_input_latency_s=0.0),
+        "EMBED_CACHE_DIR": "",
+        "INDEX_MANIFEST_PATH": str(tmp_path / "manifest.json"),
+        "INDEX_GENERATION_PATH": str(tmp_path / "generation"),
+        "INDEX_VALIDATE_TIMEOUT_S": 0,
+        "INDEX_VERSIONS_KEPT": 2,
+        "LOADER_WORKERS": 1,
+        "PREPROCESS_FAST": True,
+        "METRICS_ENABLED": False,
+    }
+
+
+def test_rebuild_promotes_a_new_version_and_prunes_old_ones(service, config, tmp_path):
+    sources = [_write_csv(tmp_path / "products.csv", 5)]
+
+    first = elt_indexer.rebuild_index(config, sources)
+    assert service.aliases == {INDEX: first}
+    assert len(service.indexes[first]) == 5
+    assert get_retrieval_backend(config).count() == 5
+
+    second = elt_indexer.rebuild_index(config, sources)
+    third = elt_indexer.rebuild_index(config, sources)
+
+    assert first < second < third
+    assert service.aliases == {INDEX: third}
+    # The live version and one previous one, for a rollback.
+    assert sorted(service.indexes) == [second, third]
+
+
+def test_rebuild_leaves_the_manifest_describing_the_live_index(config, tmp_path):
+    sources = [_write_csv(tmp_path / "products.csv", 5)]
+    elt_indexer.rebuild_index(config, sources)
+
+    manifest = elt_indexer.IndexManifest.load(config["INDEX_MANIFEST_PATH"], INDEX)
+    assert len(manifest.chunk_ids(elt_indexer.source_key(sources[0]))) == 5
+    assert list(tmp_path.glob("manifest.json.*")) == []
+
+
+def test_a_shrunken_rebuild_is_not_promoted(service, config, tmp_path):
+    live = elt_indexer.rebuild_index(config, [_write_csv(tmp_path / "products.csv", 10)])
+
+    rejected = elt_indexer.rebuild_index(config, [_write_csv(tmp_path / "products.csv", 5)])
+
+    assert rejected is None
+    assert service.aliases == {INDEX: live}
+    assert sorted(service.indexes) == [live]
+    assert len(service.indexes[live]) == 10
+
+
+def test_a_version_with_failed_uploads_is_not_promoted(service, config, tmp_path, monkeypatch):
+    monkeypatch.setattr(BulkUploader, "_backoff", lambda self, attempt, retry_after=None: 0.0)
+    live = elt_indexer.rebuild_index(config, [_write_csv(tmp_path / "products.csv", 5)])
+    service.doc_failure_rate = 1.0
+
+    assert elt_indexer.rebuild_index(config, [_write_csv(tmp_path / "products.csv", 5)]) is None
+    assert service.aliases == {INDEX: live}
+    assert sorted(service.indexes) == [live]
+
+
+def test_an_unversioned_index_blocks_the_rebuild_unless_replaced(service, config, tmp_path):
+    service.indexes[INDEX] = {"old": {"id": "old"}}
+    sources = [_write_csv(tmp_path / "products.csv", 3)]
+
+    assert elt_indexer.rebuild_index(config, sources) is None
+    assert service.aliases == {} and list(service.indexes) == [INDEX]
+
+    version = elt_indexer.rebuild_index(config, sources, replace_index=True)
+    assert service.aliases == {INDEX: version}
+    assert sorted(service.indexes) == [version]
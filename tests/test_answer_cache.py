@@ -0,0 +1,143 @@
+import time
+
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, bump_index_generation, cache_scope
+from metrics import ANSWER_CACHE_DISABLED
+
+SCOPE = cache_scope({"k": 3, "filters": {}})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    return clock
+
+
+def _wait_for(condition, timeout_s=2.0):
+    deadline = time.time() + timeout_s
+    while not condition():
+        assert time.time() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_similar_query_with_the_same_scope_hits():
+    cache = AnswerCache(dim=3, threshold=0.95, max_entries=4)
+    cache.store([1.0, 0.0, 0.0], SCOPE, {"answer": "yes"}, latency_s=2.0)
+
+    assert cache.lookup([0.99, 0.05, 0.0], SCOPE) == {"answer": "yes"}
+    assert cache.lookup([0.0, 1.0, 0.0], SCOPE) is None
+    assert cache.lookup([1.0, 0.0, 0.0], cache_scope({"k": 5, "filters": {}})) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["latency_saved_s"]) == (1, 2, 2.0)
+
+
+def test_most_similar_entry_wins():
+    cache = AnswerCache(dim=2, threshold=0.9, max_entries=4)
+    cache.store([1.0, 0.1], SCOPE, {"answer": "near"})
+    cache.store([1.0, 0.4], SCOPE, {"answer": "far"})
+
+    assert cache.lookup([1.0, 0.12], SCOPE) == {"answer": "near"}
+
+
+def test_scope_ignores_key_order():
+    assert cache_scope({"k": 3, "filters": {"source": "a"}}) == cache_scope({"filters": {"source": "a"}, "k": 3})
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(dim=2, ttl_s=60.0, max_entries=4)
+    cache.store([1.0, 0.0], SCOPE, {"answer": "old"})
+
+    clock.now += 59.0
+    assert cache.lookup([1.0, 0.0], SCOPE) == {"answer": "old"}
+    clock.now += 2.0
+    assert cache.lookup([1.0, 0.0], SCOPE) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(dim=3, max_entries=2)
+    cache.store([1.0, 0.0, 0.0], SCOPE, {"answer": "a"})
+    cache.store([0.0, 1.0, 0.0], SCOPE, {"answer": "b"})
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE) == {"answer": "a"}
+
+    cache.store([0.0, 0.0, 1.0], SCOPE, {"answer": "c"})
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup([0.0, 1.0, 0.0], SCOPE) is None
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE) == {"answer": "a"}
+    assert cache.lookup([0.0, 0.0, 1.0], SCOPE) == {"answer": "c"}
+
+
+def test_bumping_the_generation_file_clears_the_cache(tmp_path):
+    path = str(tmp_path / "generation")
+    bump_index_generation(path)
+    cache = AnswerCache(dim=2, max_entries=4, generation_path=path)
+    cache.store([1.0, 0.0], SCOPE, {"answer": "stale"})
+    assert cache.lookup([1.0, 0.0], SCOPE) == {"answer": "stale"}
+
+    time.sleep(0.01)
+    bump_index_generation(path)
+
+    assert cache.lookup([1.0, 0.0], SCOPE) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_a_new_index_version_clears_the_cache():
+    version = {"value": ("idx-v1", 10)}
+    cache = AnswerCache(dim=2, max_entries=4, index_version=lambda: version["value"], version_check_s=0.01)
+    _wait_for(lambda: cache._index_version == ("idx-v1", 10))
+    cache.store([1.0, 0.0], SCOPE, {"answer": "stale"})
+
+    version["value"] = ("idx-v2", 10)
+    _wait_for(lambda: cache.stats()["invalidations"] == 1)
+
+    assert cache.lookup([1.0, 0.0], SCOPE) is None
+
+
+def test_a_failing_version_check_keeps_the_cache():
+    def broken():
+        raise ConnectionError("search service down")
+
+    cache = AnswerCache(dim=2, max_entries=4, index_version=broken, version_check_s=0.01)
+    cache.store([1.0, 0.0], SCOPE, {"answer": "kept"})
+    time.sleep(0.05)
+
+    assert cache.lookup([1.0, 0.0], SCOPE) == {"answer": "kept"}
+
+
+def test_dimension_is_taken_from_the_first_vector():
+    cache = AnswerCache(max_entries=4)
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE) is None
+    cache.store([1.0, 0.0, 0.0], SCOPE, {"answer": "a"})
+
+    assert cache.dim == 3
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE) == {"answer": "a"}
+
+
+def test_a_mismatched_dimension_disables_the_cache():
+    cache = AnswerCache(dim=3, max_entries=4)
+    cache.store([1.0, 0.0, 0.0], SCOPE, {"answer": "a"})
+
+    assert cache.lookup([1.0, 0.0], SCOPE) is None
+    assert cache.stats()["disabled"]
+    assert ANSWER_CACHE_DISABLED._series[()] == 1
+    cache.store([1.0, 0.0, 0.0], SCOPE, {"answer": "b"})
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE) is None
+
+
+def test_from_config_is_off_without_entries():
+    assert AnswerCache.from_config({"ANSWER_CACHE_MAX_ENTRIES": 0}) is None
+    cache = AnswerCache.from_config({"ANSWER_CACHE_MAX_ENTRIES": 8, "ANSWER_CACHE_THRESHOLD": 0.9})
+    assert (cache.max_entries, cache.threshold, cache.index_version) == (8, 0.9, None)
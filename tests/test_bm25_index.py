@@ -0,0 +1,115 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from bm25_index import ARRAYS, BM25Index
+
+WORDS = [f"w{i}" for i in range(30)]
+
+
+def _compiled(index):
+    with open(index.meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(index._array_path(name, meta["version"])) for name in ARRAYS}
+    return meta, arrays
+
+
+def _random_updates(rng, index):
+    index.add_many(
+        (f"d{rng.randrange(80)}", [rng.choice(WORDS) for _ in range(rng.randrange(8))],
+         {"source": f"s{rng.randrange(3)}.pdf", "doc_type": "policy"})
+        for _ in range(rng.randrange(10))
+    )
+    index.delete([f"d{rng.randrange(80)}" for _ in range(rng.randrange(3))])
+
+
+def test_search_ranks_rarer_and_more_frequent_terms_higher(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add_many([
+        ("a", ["abc123", "widget"], {"source": "a.csv", "doc_type": "csv"}),
+        ("b", ["widget", "widget", "gadget"], {"source": "b.csv", "doc_type": "csv"}),
+        ("c", ["gadget"], {"source": "b.csv", "doc_type": "csv"}),
+    ])
+    assert index.build() == 3
+
+    assert [doc_id for doc_id, _ in index.search(["abc123"])] == ["a"]
+    assert [doc_id for doc_id, _ in index.search(["widget"])] == ["b", "a"]
+    assert index.search(["missing"]) == []
+
+
+def test_filters_match_only_stored_values(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add_many([
+        ("a", ["widget"], {"source": "a.csv", "doc_type": "csv"}),
+        ("b", ["widget"], {"source": "b.csv", "doc_type": "csv"}),
+    ])
+    index.build()
+
+    assert [doc_id for doc_id, _ in index.search(["widget"], filters={"source": "b.csv"})] == ["b"]
+    assert index.search(["widget"], filters={"source": "nope.csv"}) == []
+    assert set(index._filter_masks) == {("source", "b.csv")}
+
+
+def test_deletes_and_replacements_apply_on_build(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add_many([("a", ["old"], {}), ("b", ["old"], {})])
+    index.build()
+    index.add_many([("a", ["new"], {})])
+    index.delete(["b"])
+    assert index.build() == 1
+
+    assert index.search(["old"]) == []
+    assert [doc_id for doc_id, _ in index.search(["new"])] == ["a"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_builds_match_a_full_build(tmp_path, seed):
+    rng = random.Random(seed)
+    index = BM25Index(str(tmp_path))
+    for step in range(40):
+        _random_updates(rng, index)
+        live = index.build()
+        if step % 10 == 9:
+            incremental_meta, incremental = _compiled(index)
+            assert index._build_full() == live
+            full_meta, full = _compiled(index)
+            for key in ("terms", "doc_ids", "fields"):
+                assert incremental_meta[key] == full_meta[key]
+            for name in ARRAYS:
+                np.testing.assert_array_equal(incremental[name], full[name])
+
+
+def test_incremental_build_reads_only_new_records(tmp_path, monkeypatch):
+    index = BM25Index(str(tmp_path))
+    index.add_many((f"d{i}", ["word"], {}) for i in range(10))
+    index.build()
+    index.add_many([("d0", ["other"], {})])
+
+    full_builds = []
+    monkeypatch.setattr(index, "_build_full", lambda: full_builds.append(1))
+    assert index.build() == 10
+    assert full_builds == []
+    assert [doc_id for doc_id, _ in index.search(["other"])] == ["d0"]
+
+
+def test_log_is_compacted_when_superseded_records_dominate(tmp_path):
+    index = BM25Index(str(tmp_path))
+    for _ in range(5):
+        index.add_many([("a", ["word"], {})])
+        index.build()
+
+    with open(index.log_path, encoding="utf-8") as f:
+        assert len(f.readlines()) <= 2
+    assert [doc_id for doc_id, _ in index.search(["word"])] == ["a"]
+
+
+def test_reset_forgets_everything(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add_many([("a", ["word"], {})])
+    index.build()
+    index.reset()
+
+    assert index.search(["word"]) == []
+    assert index.build() == 0
@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from chunker import TokenChunker
+from token_counter import count_tokens
+
+
+def _document(paragraphs=6, sentences=8):
+    return "\n\n".join(
+        " ".join(f"Paragraph {p} sentence {s} talks about widget number {p * 10 + s}."
+                 for s in range(sentences))
+        for p in range(paragraphs)
+    )
+
+
+def test_chunks_fit_the_target_and_map_back_to_the_text():
+    text = _document()
+    chunks = TokenChunker(target_tokens=60, overlap_tokens=15).chunk_text(text)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["tokens"] <= 60
+        assert count_tokens(chunk["text"]) <= 60
+        assert text[chunk["char_start"]:chunk["char_end"]] == chunk["text"]
+
+
+def test_chunks_cover_every_word_in_order():
+    text = _document()
+    chunks = TokenChunker(target_tokens=60, overlap_tokens=15).chunk_text(text)
+
+    covered = [False] * len(text)
+    for chunk in chunks:
+        for i in range(chunk["char_start"], chunk["char_end"]):
+            covered[i] = True
+    assert all(covered[m.start()] for m in re.finditer(r"\S", text))
+    starts = [chunk["char_start"] for chunk in chunks]
+    assert starts == sorted(starts)
+
+
+def test_overlap_repeats_whole_sentences_from_the_previous_chunk():
+    text = _document(paragraphs=1, sentences=30)
+    chunks = TokenChunker(target_tokens=60, overlap_tokens=20).chunk_text(text)
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["char_start"] < previous["char_end"]
+        assert chunk["text"].startswith("Paragraph")
+
+
+def test_long_sentence_without_boundaries_is_cut_at_whitespace():
+    text = " ".join(f"word{i}" for i in range(500))
+    chunks = TokenChunker(target_tokens=50, overlap_tokens=0).chunk_text(text)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["tokens"] <= 50
+        assert text[chunk["char_start"]:chunk["char_end"]] == chunk["text"]
+        assert re.fullmatch(r"word\d+( word\d+)*", chunk["text"])
+
+
+def test_pages_are_recorded_and_offsets_index_the_joined_pages():
+    pages = [(page, _document(paragraphs=2, sentences=6)) for page in (1, 2, 3)]
+    chunks = list(TokenChunker(target_tokens=60, overlap_tokens=10).iter_chunks(pages))
+    joined = "\n".join(text for _, text in pages)
+
+    assert chunks[0]["page_start"] == 1
+    assert chunks[-1]["page_end"] == 3
+    for chunk in chunks:
+        assert chunk["page_start"] <= chunk["page_end"]
+        assert joined[chunk["char_start"]:chunk["char_end"]] == chunk["text"]
+
+
+def test_empty_text_has_no_chunks():
+    assert TokenChunker(target_tokens=60, overlap_tokens=10).chunk_text("") == []
+
+
+def test_overlap_must_be_smaller_than_target():
+    with pytest.raises(ValueError):
+        TokenChunker(target_tokens=10, overlap_tokens=10)
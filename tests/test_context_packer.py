@@ -0,0 +1,69 @@
+import json
+
+from context_packer import pack_context
+from token_counter import count_tokens
+
+
+def _hit(doc_id, content, score, **metadata):
+    return {"id": doc_id, "content": content, "@search.score": score,
+            "source": metadata.pop("source", "handbook.pdf"), "metadata": json.dumps(metadata)}
+
+
+LEAVE = "Employees accrue twenty days of paid leave per calendar year, prorated for partial years."
+EXPENSES = "Expense reports must be filed within thirty days with itemised receipts attached."
+
+
+def test_hits_are_packed_best_first_with_citation_headers():
+    packed = pack_context([
+        _hit("b", EXPENSES, 0.5, page_start=4, page_end=5),
+        _hit("a", LEAVE, 0.9, page_start=2, page_end=2),
+    ])
+
+    assert packed["chunks"] == (
+        f"[source: handbook.pdf, chunk 1] (page 2)\n{LEAVE}\n\n"
+        f"[source: handbook.pdf, chunk 2] (pages 4-5)\n{EXPENSES}\n\n"
+    )
+    assert packed["citations"] == [
+        {"chunk": 1, "id": "a", "source": "handbook.pdf", "page_start": 2, "page_end": 2},
+        {"chunk": 2, "id": "b", "source": "handbook.pdf", "page_start": 4, "page_end": 5},
+    ]
+    assert packed["dropped"] == 0
+    assert packed["tokens"] == count_tokens(packed["chunks"])
+
+
+def test_exact_and_near_duplicates_are_dropped():
+    packed = pack_context([
+        _hit("a", LEAVE, 0.9),
+        _hit("a-again", LEAVE, 0.8),
+        _hit("overlap", LEAVE + " Unused days expire.", 0.7),
+        _hit("empty", "", 0.6),
+        _hit("b", EXPENSES, 0.5),
+    ])
+
+    assert [c["id"] for c in packed["citations"]] == ["a", "b"]
+    assert packed["dropped"] == 3
+
+
+def test_budget_drops_hits_that_do_not_fit():
+    first_cost = count_tokens(f"[source: handbook.pdf, chunk 1]\n{LEAVE}\n\n")
+    packed = pack_context([_hit("a", LEAVE, 0.9), _hit("b", EXPENSES, 0.5)], max_tokens=first_cost + 5)
+
+    assert [c["id"] for c in packed["citations"]] == ["a"]
+    assert packed["dropped"] == 1
+    assert packed["tokens"] <= first_cost + 5
+
+
+def test_best_hit_is_truncated_rather_than_dropped():
+    packed = pack_context([_hit("a", LEAVE, 0.9)], max_tokens=15)
+
+    assert [c["id"] for c in packed["citations"]] == ["a"]
+    assert packed["chunks"].startswith("[source: handbook.pdf, chunk 1]\n")
+    assert packed["tokens"] <= 15
+
+
+def test_structured_records_keep_only_fields_not_in_the_header():
+    packed = pack_context([_hit("row", "Widget A costs 10 USD.", 0.9, source="prices.csv",
+                                doc_type="csv", product="Widget A", price="10",
+                                description="Widget A costs 10 USD.")])
+
+    assert packed["records"] == [{"chunk": 1, "product": "Widget A", "price": "10"}]
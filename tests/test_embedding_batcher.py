@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from embedding_batcher import EmbeddingMicroBatcher
+
+
+class Recorder:
+    def __init__(self, release=None):
+        self.calls = []
+        self.release = release
+
+    def __call__(self, texts):
+        if self.release is not None:
+            self.release.wait(5)
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_texts_are_batched_and_answered_in_order():
+    embed = Recorder()
+    batcher = EmbeddingMicroBatcher(embed, window_s=0.2, max_batch=8, metrics_enabled=False)
+    texts = ["a", "bb", "ccc", "dddd"]
+    futures = [batcher.submit(text) for text in texts]
+
+    assert [future.result(5) for future in futures] == [[1.0], [2.0], [3.0], [4.0]]
+    assert embed.calls == [texts]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_identical_pending_texts_share_one_input():
+    release = threading.Event()
+    embed = Recorder(release)
+    batcher = EmbeddingMicroBatcher(embed, window_s=0.05, metrics_enabled=False)
+    first, second = batcher.submit("same"), batcher.submit("same")
+    other = batcher.submit("other")
+    release.set()
+
+    assert first is second
+    assert first.result(5) == [4.0] and other.result(5) == [5.0]
+    assert embed.calls == [["same", "other"]]
+    stats = batcher.stats()
+    assert (stats["requests"], stats["deduplicated"], stats["inputs"], stats["pending"]) == (3, 1, 2, 0)
+
+
+def test_full_batches_are_sent_without_waiting_for_the_window():
+    embed = Recorder()
+    batcher = EmbeddingMicroBatcher(embed, window_s=10.0, max_batch=2, metrics_enabled=False)
+    futures = [batcher.submit(text) for text in ("a", "b")]
+
+    assert [future.result(5) for future in futures] == [[1.0], [1.0]]
+
+
+def test_upstream_errors_reach_every_waiting_request():
+    def broken(texts):
+        raise ConnectionError("upstream down")
+
+    batcher = EmbeddingMicroBatcher(broken, window_s=0.05, metrics_enabled=False)
+    futures = [batcher.submit(text) for text in ("a", "b")]
+
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result(5)
+    assert batcher.stats()["errors"] == 1
+
+
+def test_a_short_response_fails_the_batch_instead_of_hanging():
+    batcher = EmbeddingMicroBatcher(lambda texts: [[0.0]], window_s=0.05, metrics_enabled=False)
+    futures = [batcher.submit(text) for text in ("a", "b")]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="Expected 2 embeddings, got 1"):
+            future.result(5)
+
+
+def test_from_config_is_off_with_a_zero_window():
+    assert EmbeddingMicroBatcher.from_config({"EMBED_COALESCE_WINDOW_MS": 0}, Recorder()) is None
+    batcher = EmbeddingMicroBatcher.from_config({"EMBED_COALESCE_WINDOW_MS": 8, "METRICS_ENABLED": False},
+                                                Recorder())
+    assert (batcher.window_s, batcher.metrics_enabled) == (0.008, False)
@@ -0,0 +1,65 @@
+import json
+
+from index_manifest import IndexManifest, chunk_id, content_hash, file_hash, source_key
+
+
+def test_chunk_id_is_stable_and_depends_on_every_input():
+    chunk = chunk_id("data/a.pdf", 3, "text")
+
+    assert chunk == chunk_id("data/a.pdf", 3, "text")
+    assert len(chunk) == 40 and all(c in "0123456789abcdef" for c in chunk)
+    assert len({chunk, chunk_id("data/b.pdf", 3, "text"), chunk_id("data/a.pdf", 4, "text"),
+                chunk_id("data/a.pdf", 3, "other")}) == 4
+
+
+def test_file_hash_reads_in_blocks(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"x" * 100)
+
+    assert file_hash(str(path), block_size=7) == file_hash(str(path)) == content_hash("x" * 100)
+
+
+def test_source_key_normalizes_the_path():
+    assert source_key("./data/../data/a.pdf") == "data/a.pdf"
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "state" / "manifest.json")
+    manifest = IndexManifest(path, "docs")
+    manifest.update_file("a.pdf", "h1", {"id1": "c1", "id2": "c2"})
+    manifest.save()
+
+    loaded = IndexManifest.load(path, "docs")
+    assert loaded.file_unchanged("a.pdf", "h1")
+    assert not loaded.file_unchanged("a.pdf", "h2")
+    assert not loaded.file_unchanged("b.pdf", "h1")
+    assert loaded.chunk_ids("a.pdf") == {"id1", "id2"}
+    assert not (tmp_path / "state" / "manifest.json.tmp").exists()
+
+
+def test_manifest_of_another_index_is_ignored(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = IndexManifest(path, "docs")
+    manifest.update_file("a.pdf", "h1", {"id1": "c1"})
+    manifest.save()
+
+    assert IndexManifest.load(path, "other").files == {}
+
+
+def test_unreadable_manifest_starts_from_scratch(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json")
+
+    assert IndexManifest.load(str(path), "docs").files == {}
+    assert IndexManifest.load(str(tmp_path / "missing.json"), "docs").files == {}
+
+
+def test_remove_file_returns_its_chunk_ids(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "manifest.json"), "docs")
+    manifest.update_file("a.pdf", None, {"id1": "c1"})
+
+    assert not manifest.file_unchanged("a.pdf", "h1")
+    assert manifest.remove_file("a.pdf") == {"id1"}
+    assert manifest.remove_file("a.pdf") == set()
+    manifest.save()
+    assert json.loads((tmp_path / "manifest.json").read_text())["files"] == {}
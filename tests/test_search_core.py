@@ -0,0 +1,70 @@
+import pytest
+
+from retrieval import reciprocal_rank_fusion
+from search_core import (DEFAULT_K, DEFAULT_SELECT, MAX_K, build_filter, build_search_payload,
+                         is_exact_lookup, parse_search_options)
+
+
+def test_defaults():
+    assert parse_search_options({}) == {"k": DEFAULT_K, "filters": {}, "select": DEFAULT_SELECT,
+                                        "exhaustive": False}
+
+
+def test_valid_options_are_passed_through():
+    options = parse_search_options({"k": "5", "filters": {"source": "a.pdf"}, "select": "id", "exhaustive": 1})
+    assert options == {"k": 5, "filters": {"source": "a.pdf"}, "select": "id", "exhaustive": True}
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"k": "many"}, "'k' must be an integer"),
+    ({"k": None}, "'k' must be an integer"),
+    ({"k": 0}, "'k' must be between"),
+    ({"k": MAX_K + 1}, "'k' must be between"),
+    ({"filters": ["source"]}, "'filters' must be an object"),
+    ({"filters": {"content": "x"}}, "Cannot filter on ['content']"),
+    ({"filters": {"source": ["a.pdf"]}}, "Filter value for 'source' must be a string"),
+    ({"filters": {"doc_type": 3}}, "Filter value for 'doc_type' must be a string"),
+    ({"select": ["id"]}, "'select' must be a comma-separated string"),
+])
+def test_malformed_options_are_rejected(data, message):
+    with pytest.raises(ValueError) as excinfo:
+        parse_search_options(data)
+    assert message in str(excinfo.value)
+
+
+def test_filter_is_sorted_and_escapes_quotes():
+    assert build_filter({}) is None
+    assert build_filter({"source": "o'brien.pdf", "doc_type": "policy"}) == \
+        "doc_type eq 'policy' and source eq 'o''brien.pdf'"
+
+
+def test_hybrid_payload_has_vector_and_text_queries():
+    payload = build_search_payload([0.1, 0.2], k=4, filters={"source": "a.pdf"}, text="leave policy")
+
+    assert payload["top"] == 4
+    assert payload["vectorQueries"][0]["vector"] == [0.1, 0.2]
+    assert payload["vectorQueries"][0]["k"] == 4
+    assert payload["search"] == "leave policy"
+    assert payload["filter"] == "source eq 'a.pdf'"
+    assert "search" not in build_search_payload([0.1, 0.2])
+    assert "vectorQueries" not in build_search_payload(None, text="abc123")
+
+
+@pytest.mark.parametrize("tokens, expected", [
+    (["abc123"], True),
+    (["sku9001", "x12"], True),
+    (["abc123", "price"], False),
+    (["a1"], False),
+    ([], False),
+])
+def test_exact_lookup(tokens, expected):
+    assert is_exact_lookup(tokens) is expected
+
+
+def test_rrf_rewards_ids_ranked_well_in_several_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+    assert dict(fused)["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert dict(fused)["c"] == pytest.approx(1 / 63)
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,93 @@
+import pytest
+
+from benchmarks.fakes import FakeSearchService
+from search_uploader import BulkUploader
+
+
+@pytest.fixture
+def service():
+    with FakeSearchService() as service:
+        yield service
+
+
+def _uploader(service, **kwargs):
+    uploader = BulkUploader(service.endpoint, "docs", "key", "2024-07-01", **kwargs)
+    uploader._backoff = lambda attempt, retry_after=None: 0.0
+    return uploader
+
+
+def _docs(n):
+    return [{"id": f"d{i}", "content": f"document {i}"} for i in range(n)]
+
+
+def test_documents_are_uploaded_in_bounded_batches(service):
+    uploader = _uploader(service, workers=2, max_batch_docs=7)
+    uploader.add_many(_docs(50))
+    stats = uploader.close()
+
+    assert len(service.indexes["docs"]) == 50
+    assert (stats["succeeded"], stats["failed"], stats["batches"]) == (50, 0, 8)
+
+
+def test_batches_are_split_by_size(service):
+    uploader = _uploader(service, max_batch_bytes=200)
+    uploader.add_many(_docs(10))
+    stats = uploader.close()
+
+    assert stats["batches"] > 1
+    assert len(service.indexes["docs"]) == 10
+
+
+def test_partial_failures_retry_only_the_failed_keys(service):
+    service.doc_failure_rate = 0.3
+    uploader = _uploader(service, max_batch_docs=20, max_retries=20)
+    uploader.add_many(_docs(100))
+    stats = uploader.close()
+
+    assert len(service.indexes["docs"]) == 100
+    assert (stats["succeeded"], stats["failed"]) == (100, 0)
+    assert 0 < stats["retried_docs"] < 100 * stats["requests"]
+    assert uploader.failed == {}
+
+
+def test_documents_failing_every_attempt_are_reported(service):
+    service.doc_failure_rate = 1.0
+    uploader = _uploader(service, max_retries=2)
+    uploader.add_many(_docs(3))
+    stats = uploader.close()
+
+    assert (stats["succeeded"], stats["failed"], stats["requests"]) == (0, 3, 3)
+    assert set(uploader.failed) == {"d0", "d1", "d2"}
+
+
+def test_failed_requests_are_retried(service):
+    service.request_failure_rate = 0.5
+    uploader = _uploader(service, max_batch_docs=5, max_retries=20)
+    uploader.add_many(_docs(40))
+    stats = uploader.close()
+
+    assert len(service.indexes["docs"]) == 40
+    assert stats["requests"] > stats["batches"]
+
+
+def test_deletes(service):
+    uploader = _uploader(service)
+    uploader.add_many(_docs(5))
+    uploader.flush()
+    uploader.delete_many(["d1", "d3"])
+    uploader.close()
+
+    assert sorted(service.indexes["docs"]) == ["d0", "d2", "d4"]
+
+
+def test_documents_missing_from_the_response_are_retried_then_failed(service):
+    uploader = _uploader(service, max_retries=1)
+    batch = [{"@search.action": "upload", "id": key} for key in ("a", "b", "c")]
+    results = [{"key": "a", "status": True, "statusCode": 200}]
+
+    assert [doc["id"] for doc in uploader._retryable_failures(batch, results, attempt=0)] == ["b", "c"]
+    assert uploader._retryable_failures(batch[1:], [], attempt=1) == []
+    assert uploader.failed == {"b": "Missing from the indexing response.",
+                               "c": "Missing from the indexing response."}
+    assert uploader.report()["succeeded"] == 1
+    uploader.close()
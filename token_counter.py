@@ -0,0 +1,95 @@
+"""
+Token counting helpers shared by the embedding stage.
+
+Uses tiktoken when it is installed and its encoding files can be loaded, and
+falls back to a conservative character-based estimate otherwise (for example
+in an offline container where tiktoken cannot download its BPE ranks).
+"""
+import math
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# Roughly 4 characters per token for English text; 3 over-estimates on
+# purpose so request limits are never exceeded when tiktoken is unavailable.
+FALLBACK_CHARS_PER_TOKEN = 3
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model_name=None):
+    """
+    Returns the tiktoken encoding for a model, or None when unavailable.
+
+    Args:
+        model_name (str): The OpenAI model name. Unknown models use cl100k_base.
+
+    Returns:
+        tiktoken.Encoding or None: The cached encoding, or None if tiktoken is
+        not installed or its encoding data cannot be loaded.
+    """
+    if tiktoken is None:
+        return None
+
+    key = model_name or DEFAULT_ENCODING
+    with _encodings_lock:
+        if key in _encodings:
+            return _encodings[key]
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name) if model_name else None
+            except KeyError:
+                encoding = None
+            if encoding is None:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as e:
+            print(f"tiktoken encoding unavailable, estimating token counts instead: {e}")
+            encoding = None
+        _encodings[key] = encoding
+        return encoding
+
+
+def count_tokens(text, model_name=None):
+    """
+    Counts the tokens in a piece of text.
+
+    Args:
+        text (str): The text to measure.
+        model_name (str): The model whose tokenizer should be used.
+
+    Returns:
+        int: The exact token count, or a conservative estimate without tiktoken.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model_name=None):
+    """
+    Truncates text so that it fits within a token budget.
+
+    Args:
+        text (str): The text to truncate.
+        max_tokens (int): The maximum number of tokens to keep.
+        model_name (str): The model whose tokenizer should be used.
+
+    Returns:
+        str: The original text if it already fits, otherwise its longest prefix
+        that does.
+    """
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return text[:max_tokens * FALLBACK_CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,708 @@
+"""
+In-process vector store for running retrieval without Azure AI Search.
+
+Vectors are L2-normalized and appended to a raw float32 file that is read back
+through a NumPy memory map, so cosine similarity is a plain dot product.
+Document fields live in an append-only JSON-lines sidecar; deletes and
+replacements append tombstones and are dropped on compaction. Queries are
+answered by an exact, batched matrix multiply, or, for large corpora, by an
+inverted-file (IVF) index that scores only the rows in the clusters nearest to
+the query.
+
+With compression enabled, an int8 or binary copy of every vector is kept
+alongside the float32 file. Exact search scans the compact copy (4x or 32x
+fewer bytes per vector) to pick `oversampling * k` candidates, then rescores
+only those with the full-precision vectors.
+
+Only the indexer writes to a store. Readers such as the search server pick up
+its changes on their next query.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from text_preprocessor import TextPreprocessor
+
+FILTERABLE_FIELDS = ("source", "doc_type")
+STORED_FIELDS = ("id", "content", "source", "doc_type", "metadata")
+
+# Rows scored per block by exact search, bounding the temporary score matrix.
+SEARCH_BLOCK_ROWS = 65536
+
+COMPRESSIONS = ("none", "int8", "binary")
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT_TABLE[values]
+
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """
+    Returns the indices of the `k` highest scores, best first.
+    """
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class LocalVectorStore:
+    """
+    A memory-mapped vector store with a document sidecar.
+
+    Args:
+        directory (str): Directory holding the store's files.
+        dim (int): Dimension of the stored vectors.
+        mode (str): "exact" for brute-force search, "ivf" for approximate
+                    search, or "auto" to use IVF once the store holds at least
+                    `ivf_min_rows` rows.
+        nprobe (int): IVF clusters scored per query.
+        ivf_min_rows (int): Row count at which "auto" switches to IVF.
+        compression (str): "none", "int8" or "binary" copies for exact search.
+        oversampling (float): Candidates per requested result rescored with the
+                              full-precision vectors when compression is on.
+    """
+
+    def __init__(self, directory, dim, mode="exact", nprobe=8, ivf_min_rows=20000,
+                 compression="none", oversampling=4.0):
+        if mode not in ("exact", "ivf", "auto"):
+            raise ValueError(f"Unknown local store mode '{mode}'; expected exact, ivf or auto.")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'; expected one of {COMPRESSIONS}.")
+        self.directory = directory
+        self.dim = dim
+        self.mode = mode
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.compression = compression
+        self.oversampling = oversampling
+        self.vectors_path = os.path.join(directory, f"vectors-{dim}.f32")
+        self.docs_path = os.path.join(directory, "docs.jsonl")
+        self.ivf_path = os.path.join(directory, f"ivf-{dim}.npz")
+        self.quantized_path = os.path.join(directory, f"vectors-{dim}.{compression}")
+        self.scale_path = os.path.join(directory, f"int8-scale-{dim}.npy")
+
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._reset_state()
+        self.refresh()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config["LOCAL_STORE_DIR"],
+            config["EMBED_DIM"],
+            mode=config.get("LOCAL_STORE_MODE", "exact"),
+            nprobe=config.get("LOCAL_IVF_NPROBE", 8),
+            compression=config.get("VECTOR_COMPRESSION", "none"),
+            oversampling=config.get("RESCORE_OVERSAMPLING", 4.0),
+        )
+
+    # ------------------------------------------------------------------ loading
+
+    def _reset_state(self):
+        self._file_id = None
+        self._docs_offset = 0
+        self._rows = 0
+        self._ids = []
+        self._offsets = []
+        self._fields = {field: [] for field in FILTERABLE_FIELDS}
+        self._row_of = {}
+        self._dead = set()
+        self._matrix = None
+        self._quantized = None
+        self._int8_scale = None
+        self._live = np.zeros(0, dtype=bool)
+        self._field_arrays = {}
+        self._field_values = {}
+        self._filter_masks = {}
+        self._ivf = None
+
+    def refresh(self):
+        """
+        Loads records appended since the last call, or everything if the files
+        were replaced by a compaction or reset.
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.docs_path)
+            except FileNotFoundError:
+                if self._file_id is not None:
+                    self._reset_state()
+                return
+            file_id = (st.st_ino, st.st_dev)
+            if file_id != self._file_id:
+                self._reset_state()
+                self._file_id = file_id
+            if st.st_size == self._docs_offset:
+                return
+            self._read_docs(st.st_size)
+            self._map_vectors()
+
+    def _read_docs(self, size):
+        with open(self.docs_path, "rb") as f:
+            f.seek(self._docs_offset)
+            offset = self._docs_offset
+            for line in f:
+                if offset + len(line) > size or not line.endswith(b"\n"):
+                    break  # A record still being written.
+                record = json.loads(line)
+                if record.get("op") == "delete":
+                    row = self._row_of.pop(record["id"], None)
+                    if row is not None:
+                        self._dead.add(row)
+                else:
+                    previous = self._row_of.get(record["id"])
+                    if previous is not None:
+                        self._dead.add(previous)
+                    self._row_of[record["id"]] = record["row"]
+                    self._ids.append(record["id"])
+                    self._offsets.append(offset)
+                    for field in FILTERABLE_FIELDS:
+                        self._fields[field].append(record.get(field))
+                offset += len(line)
+        self._docs_offset = offset
+
+    def _map_vectors(self):
+        rows = len(self._ids)
+        self._rows = rows
+        if rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self._live = np.ones(rows, dtype=bool)
+        if self._dead:
+            self._live[np.fromiter(self._dead, dtype=np.int64)] = False
+        self._field_arrays = {field: np.array(values, dtype=object) for field, values in self._fields.items()}
+        self._field_values = {field: set(values) for field, values in self._fields.items()}
+        self._filter_masks = {}
+        self._map_quantized()
+        self._load_ivf()
+
+    def _quantized_row_bytes(self):
+        return self.dim if self.compression == "int8" else (self.dim + 7) // 8
+
+    def _quantized_rows(self):
+        try:
+            return os.path.getsize(self.quantized_path) // self._quantized_row_bytes()
+        except FileNotFoundError:
+            return 0
+
+    def _map_quantized(self):
+        """
+        Maps the compressed copy if it covers every row; otherwise exact search
+        uses the float32 vectors until `sync_quantized()` catches up.
+        """
+        self._quantized = None
+        if self.compression == "none" or not self._rows or self._quantized_rows() < self._rows:
+            return
+        if self.compression == "int8":
+            self._int8_scale = np.load(self.scale_path)
+        dtype = np.int8 if self.compression == "int8" else np.uint8
+        self._quantized = np.memmap(self.quantized_path, dtype=dtype, mode="r",
+                                    shape=(self._rows, self._quantized_row_bytes()))
+
+    def _load_ivf(self):
+        self._ivf = None
+        if not self._use_ivf() or not os.path.exists(self.ivf_path):
+            return
+        with np.load(self.ivf_path) as data:
+            centroids = data["centroids"]
+            assign = data["assign"]
+        if centroids.shape[1] != self.dim or len(assign) > self._rows:
+            return
+        if len(assign) < self._rows:
+            # Rows added since the last build join their nearest cluster.
+            extra = self._assign(centroids, self._matrix[len(assign):])
+            assign = np.concatenate([assign, extra])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        self._ivf = (centroids, order, bounds)
+
+    def _use_ivf(self):
+        return self.mode == "ivf" or (self.mode == "auto" and self._rows >= self.ivf_min_rows)
+
+    # ------------------------------------------------------------------ writing
+
+    def upsert(self, docs):
+        """
+        Adds or replaces documents.
+
+        Args:
+            docs (list): Dictionaries with "id", "contentVector" and optionally
+                         "content", "source", "doc_type" and "metadata".
+        """
+        if not docs:
+            return
+        vectors = _normalize_rows([d["contentVector"] for d in docs])
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}.")
+        with self._lock:
+            self.refresh()
+            start = self._rows
+            lines = []
+            for i, d in enumerate(docs):
+                record = {"op": "add", "row": start + i}
+                record.update({field: d.get(field) for field in STORED_FIELDS})
+                lines.append(json.dumps(record) + "\n")
+            # Vectors first, so a reader never sees a row without its vector.
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            if self.compression != "none" and self._quantized_rows() == start:
+                with open(self.quantized_path, "ab") as f:
+                    f.write(self._quantize(vectors).tobytes())
+            with open(self.docs_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+            self.refresh()
+
+    def _compressed_paths(self):
+        # Every variant, so a copy left by an earlier VECTOR_COMPRESSION
+        # setting cannot outlive the rows it was built from.
+        paths = [os.path.join(self.directory, f"vectors-{self.dim}.{kind}") for kind in COMPRESSIONS[1:]]
+        return paths + [self.scale_path]
+
+    def _quantize(self, vectors):
+        """
+        Returns the compressed form of normalized vectors: sign bits packed
+        eight to a byte, or int8 with a per-dimension scale.
+        """
+        if self.compression == "binary":
+            return np.packbits(vectors > 0, axis=1)
+        if self._int8_scale is None:
+            if os.path.exists(self.scale_path):
+                self._int8_scale = np.load(self.scale_path)
+            else:
+                # Fixed by the first rows quantized, with headroom for later
+                # rows; values beyond the range are clipped.
+                max_abs = np.abs(vectors).max(axis=0)
+                self._int8_scale = (127.0 / np.maximum(max_abs * 1.25, 1e-6)).astype(np.float32)
+                np.save(self.scale_path, self._int8_scale)
+        return np.clip(np.rint(vectors * self._int8_scale), -127, 127).astype(np.int8)
+
+    def sync_quantized(self):
+        """
+        Compresses rows stored before compression was enabled, or left behind
+        by an interrupted write.
+        """
+        if self.compression == "none":
+            return
+        with self._lock:
+            self.refresh()
+            done = self._quantized_rows()
+            if done >= self._rows:
+                return
+            if done == 0 and os.path.exists(self.scale_path):
+                os.remove(self.scale_path)
+                self._int8_scale = None
+            # Drop a partial trailing record before appending.
+            with open(self.quantized_path, "ab") as f:
+                f.truncate(done * self._quantized_row_bytes())
+            if done == 0:
+                self._quantize(np.asarray(self._matrix[:min(self._rows, SEARCH_BLOCK_ROWS)]))
+            with open(self.quantized_path, "ab") as f:
+                for start in range(done, self._rows, SEARCH_BLOCK_ROWS):
+                    block = np.asarray(self._matrix[start:min(start + SEARCH_BLOCK_ROWS, self._rows)])
+                    f.write(self._quantize(block).tobytes())
+            self._map_quantized()
+
+    def delete(self, doc_ids):
+        """
+        Removes documents by id. Unknown ids are ignored.
+        """
+        with self._lock:
+            self.refresh()
+            lines = [json.dumps({"op": "delete", "id": i}) + "\n" for i in doc_ids if i in self._row_of]
+            if lines:
+                with open(self.docs_path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                self.refresh()
+
+    def reset(self):
+        """
+        Deletes every document.
+        """
+        with self._lock:
+            for path in (self.docs_path, self.vectors_path, self.ivf_path, *self._compressed_paths()):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._reset_state()
+
+    def compact(self):
+        """
+        Rewrites the store without deleted or replaced rows.
+        """
+        with self._lock:
+            self.refresh()
+            if not self._dead:
+                return
+            live_rows = np.flatnonzero(self._live)
+            tmp_vectors = f"{self.vectors_path}.tmp"
+            tmp_docs = f"{self.docs_path}.tmp"
+            with open(tmp_vectors, "wb") as vf, open(tmp_docs, "w", encoding="utf-8") as df:
+                for start, stop in self._blocks(live_rows):
+                    vf.write(np.ascontiguousarray(self._matrix[live_rows[start:stop]]).tobytes())
+                for new_row, row in enumerate(live_rows.tolist()):
+                    record = self._read_record(row)
+                    record["row"] = new_row
+                    df.write(json.dumps(record) + "\n")
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_docs, self.docs_path)
+            for path in (self.ivf_path, *self._compressed_paths()):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._reset_state()
+            self.refresh()
+            self.sync_quantized()
+
+    @staticmethod
+    def _blocks(rows, block=SEARCH_BLOCK_ROWS):
+        for start in range(0, len(rows), block):
+            yield start, min(start + block, len(rows))
+
+    # ------------------------------------------------------------------ IVF
+
+    @staticmethod
+    def _assign(centroids, vectors):
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS])
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assign
+
+    def build_ivf(self, nlist=None, iterations=10, sample_per_list=64, seed=0):
+        """
+        Clusters the stored vectors with spherical k-means for approximate search.
+
+        Args:
+            nlist (int): Number of clusters; defaults to about sqrt(rows).
+            iterations (int): k-means iterations over the training sample.
+            sample_per_list (int): Training rows per cluster.
+        """
+        with self._lock:
+            self.refresh()
+            if not self._rows:
+                return
+            nlist = nlist or max(1, min(self._rows, int(np.sqrt(self._rows))))
+            rng = np.random.default_rng(seed)
+            sample_size = min(self._rows, nlist * sample_per_list)
+            sample = np.asarray(self._matrix[np.sort(rng.choice(self._rows, sample_size, replace=False))])
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = ~np.bincount(labels, minlength=nlist).astype(bool)
+                sums[empty] = centroids[empty]
+                centroids = _normalize_rows(sums)
+            assign = self._assign(centroids, self._matrix)
+            tmp_path = f"{self.ivf_path}.tmp.npz"
+            np.savez(tmp_path, centroids=centroids, assign=assign)
+            os.replace(tmp_path, self.ivf_path)
+            self._load_ivf()
+
+    def maybe_build_ivf(self):
+        """
+        Builds or rebuilds the IVF index when the mode calls for it and more
+        than a tenth of the rows were added since the last build.
+        """
+        with self._lock:
+            self.refresh()
+            if not self._use_ivf():
+                return
+            built_rows = 0
+            if os.path.exists(self.ivf_path):
+                with np.load(self.ivf_path) as data:
+                    built_rows = len(data["assign"])
+            if self._rows > built_rows * 1.1:
+                self.build_ivf()
+
+    # ------------------------------------------------------------------ search
+
+    def _filter_mask(self, filters):
+        mask = self._live
+        for field, value in sorted((filters or {}).items()):
+            if field not in self._field_arrays:
+                raise ValueError(f"Cannot filter on '{field}'; filterable fields are {list(FILTERABLE_FIELDS)}.")
+            if value not in self._field_values[field]:
+                # Only stored values are cached, so clients cannot grow the cache.
+                return np.zeros_like(self._live)
+            key = (field, value)
+            if key not in self._filter_masks:
+                self._filter_masks[key] = self._field_arrays[field] == value
+            mask = mask & self._filter_masks[key]
+        return mask
+
+    def _exact_search(self, queries, k, mask):
+        return self._scan(queries, k, mask, lambda rows: queries @ np.asarray(self._matrix[rows]).T)
+
+    def _rescored_search(self, queries, k, mask):
+        """
+        Picks candidates by scanning the compressed vectors, then rescores
+        them with the full-precision ones.
+        """
+        if self.compression == "binary":
+            packed = np.packbits(queries > 0, axis=1)
+
+            def score_rows(rows):
+                block = np.asarray(self._quantized[rows])
+                # Fewer differing sign bits (Hamming distance) ranks higher.
+                return -np.stack([_popcount(block ^ q).sum(axis=1, dtype=np.int32) for q in packed]).astype(np.float32)
+        else:
+            scaled = queries / self._int8_scale
+
+            def score_rows(rows):
+                return scaled @ np.asarray(self._quantized[rows], dtype=np.float32).T
+
+        candidates = self._scan(queries, max(k, int(np.ceil(k * self.oversampling))), mask, score_rows)
+        results = []
+        for query, hits in zip(queries, candidates):
+            rows = np.sort(np.fromiter((row for row, _ in hits), dtype=np.int64))
+            if not len(rows):
+                results.append([])
+                continue
+            scores = np.asarray(self._matrix[rows]) @ query
+            top = _top_k(scores, k)
+            results.append(list(zip(rows[top].tolist(), scores[top].tolist())))
+        return results
+
+    def _scan(self, queries, k, mask, score_rows):
+        """
+        Scores every row for a batch of queries, a block of rows at a time,
+        keeping the `k` best per query.
+
+        Args:
+            score_rows (callable): Maps an array of row numbers to a
+                                   (queries x rows) score matrix.
+        """
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self._rows, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self._rows)
+            block_mask = mask[start:stop]
+            if not block_mask.any():
+                continue
+            rows = np.flatnonzero(block_mask) + start
+            scores = score_rows(rows)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = _top_k(scores, k)
+            results.append(list(zip(rows[order].tolist(), scores[order].tolist())))
+        return results
+
+    def _ivf_search(self, query, k, mask):
+        centroids, order, bounds = self._ivf
+        probes = _top_k(centroids @ query, min(self.nprobe, len(centroids)))
+        candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probes])
+        candidates = np.sort(candidates[mask[candidates]])
+        if len(candidates) < k:
+            return None
+        scores = np.asarray(self._matrix[candidates]) @ query
+        top = _top_k(scores, k)
+        return list(zip(candidates[top].tolist(), scores[top].tolist()))
+
+    def search_many(self, vectors, k=3, filters=None, exhaustive=False):
+        """
+        Finds the nearest documents for a batch of query vectors.
+
+        Args:
+            vectors (list): Query embeddings.
+            k (int): Results per query.
+            filters (dict): Equality filters on `source` and `doc_type`.
+            exhaustive (bool): Score every row at full precision, bypassing the
+                               IVF index and compressed vectors.
+
+        Returns:
+            list: For each query, a list of (row, cosine similarity), best first.
+        """
+        queries = _normalize_rows(vectors)
+        with self._lock:
+            self.refresh()
+            if not self._rows:
+                return [[] for _ in queries]
+            mask = self._filter_mask(filters)
+            if exhaustive:
+                return self._exact_search(queries, k, mask)
+            if self._ivf is None:
+                if self._quantized is not None:
+                    return self._rescored_search(queries, k, mask)
+                return self._exact_search(queries, k, mask)
+            results = []
+            for query in queries:
+                hits = self._ivf_search(query, k, mask)
+                # Too few candidates in the probed clusters: fall back to exact.
+                results.append(hits if hits is not None else self._exact_search(query[None, :], k, mask)[0])
+            return results
+
+    def search(self, vector, k=3, filters=None, select=None, exhaustive=False):
+        """
+        Finds the nearest documents to one query vector.
+
+        Returns:
+            list: Hits shaped like Azure AI Search results, with the cosine
+                  similarity as "@search.score".
+        """
+        with self._lock:
+            hits = self.search_many([vector], k, filters, exhaustive)[0]
+            return self.documents(hits, select)
+
+    def _read_record(self, row):
+        with open(self.docs_path, "rb") as f:
+            f.seek(self._offsets[row])
+            return json.loads(f.readline())
+
+    def documents(self, hits, select=None):
+        """
+        Looks up the stored fields for (row, score) pairs.
+        """
+        if not hits:
+            return []
+        fields = [f.strip() for f in select.split(",")] if select else list(STORED_FIELDS)
+        results = []
+        with self._lock, open(self.docs_path, "rb") as f:
+            for row, score in hits:
+                f.seek(self._offsets[row])
+                record = json.loads(f.readline())
+                hit = {field: record.get(field) for field in fields if field in STORED_FIELDS}
+                hit["@search.score"] = score
+                results.append(hit)
+        return results
+
+    def documents_by_id(self, hits, select=None):
+        """
+        Like `documents`, for (doc_id, score) pairs. Unknown ids are skipped.
+        """
+        with self._lock:
+            self.refresh()
+            rows = [(self._row_of[doc_id], score) for doc_id, score in hits if doc_id in self._row_of]
+            return self.documents(rows, select)
+
+    def count(self):
+        with self._lock:
+            self.refresh()
+            return len(self._row_of)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": self._rows,
+                "live": len(self._row_of),
+                "dead": len(self._dead),
+                "mode": "ivf" if self._ivf is not None else "exact",
+                "ivf_lists": len(self._ivf[0]) if self._ivf is not None else 0,
+                "compression": self.compression if self._quantized is not None else "none",
+                "scan_bytes_per_vector": self._quantized_row_bytes() if self._quantized is not None else self.dim * 4,
+            }
+
+
+class LocalStoreWriter:
+    """
+    Buffers index actions for a LocalVectorStore with the same interface as
+    search_uploader.BulkUploader, so the indexer can use either.
+
+    When a BM25Index is given, chunk content is tokenized with
+    `TextPreprocessor.search_tokens` as it is written, and the new postings are
+    merged into the lexical index on `close()`.
+    """
+
+    def __init__(self, store, batch_size=1000, lexical=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.lexical = lexical
+        self.failed = {}
+        self.stats = {"succeeded": 0, "failed": 0, "requests": 0, "retried_docs": 0, "batches": 0}
+        self._upserts = []
+        self._deletes = []
+        self._started = time.perf_counter()
+
+    def add(self, doc, action="mergeOrUpload"):
+        if action == "delete":
+            self._deletes.append(doc["id"])
+        else:
+            self._upserts.append(doc)
+        if len(self._upserts) + len(self._deletes) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, docs, action="mergeOrUpload"):
+        for doc in docs:
+            self.add(doc, action)
+
+    def delete_many(self, doc_ids):
+        for doc_id in doc_ids:
+            self.add({"id": doc_id}, action="delete")
+
+    def _write_upserts(self, docs):
+        self.store.upsert(docs)
+        if self.lexical is not None:
+            self.lexical.add_many(
+                (d["id"], TextPreprocessor.search_tokens(d.get("content") or ""),
+                 {field: d.get(field) for field in FILTERABLE_FIELDS})
+                for d in docs
+            )
+
+    def _write_deletes(self, doc_ids):
+        self.store.delete(doc_ids)
+        if self.lexical is not None:
+            self.lexical.delete(doc_ids)
+
+    def flush(self):
+        for items, apply in ((self._upserts, self._write_upserts), (self._deletes, self._write_deletes)):
+            if not items:
+                continue
+            try:
+                apply(items)
+                self.stats["succeeded"] += len(items)
+            except Exception as e:
+                print(f"Failed to write {len(items)} documents to the local store: {e}")
+                for item in items:
+                    self.failed[item["id"] if isinstance(item, dict) else item] = str(e)
+                self.stats["failed"] += len(items)
+            self.stats["requests"] += 1
+            self.stats["batches"] += 1
+        self._upserts, self._deletes = [], []
+
+    def pending_batches(self):
+        # Writes are synchronous; nothing is ever queued.
+        return 0
+
+    def close(self):
+        """
+        Writes buffered actions, compacts the store if most of it is dead rows,
+        merges new BM25 postings, refreshes the compressed and IVF data if
+        needed and returns the final stats.
+        """
+        self.flush()
+        if self.lexical is not None and (self.stats["succeeded"] or self.stats["failed"]):
+            self.lexical.build()
+        self.store.sync_quantized()
+        store_stats = self.store.stats()
+        if store_stats["dead"] > store_stats["live"]:
+            self.store.compact()
+        self.store.maybe_build_ivf()
+        return self.report()
+
+    def report(self):
+        stats = dict(self.stats)
+        elapsed = time.perf_counter() - self._started
+        stats["elapsed_s"] = elapsed
+        stats["docs_per_sec"] = stats["succeeded"] / elapsed if elapsed > 0 else 0.0
+        return stats